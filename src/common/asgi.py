@@ -0,0 +1,32 @@
+class Lifespan:
+    """
+    Обертка ASGI-приложения Django, которая отвечает на lifespan-события
+    сервера (сам Django их не поддерживает). on_startup и on_shutdown -
+    корутинные функции без аргументов; они выполняются в event loop сервера,
+    том же, где потом обрабатываются запросы.
+    """
+
+    def __init__(self, app, on_startup=(), on_shutdown=()):
+        self.app = app
+        self.on_startup = list(on_startup)
+        self.on_shutdown = list(on_shutdown)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "lifespan":
+            return await self.app(scope, receive, send)
+
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    for hook in self.on_startup:
+                        await hook()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for hook in self.on_shutdown:
+                    await hook()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
@@ -0,0 +1,102 @@
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+_MISSING = object()
+
+
+class LayeredCache(BaseCache):
+    """
+    Per-process LRU (LocMemCache) in front of a shared cache alias.
+
+    LOCATION is the alias of the shared cache. Reads go to the local layer
+    first and fill it from the shared one; writes, deletes and counters go
+    to the shared cache and then refresh the local copy. Another process
+    can see a stale local value for at most LOCAL_TIMEOUT seconds, so data
+    that must be consistent across processes (sessions) should use the
+    shared alias directly. Keys are built by the underlying backends.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._shared_alias = location
+        self.local_timeout = options.get("LOCAL_TIMEOUT", 5)
+        self._local = LocMemCache(
+            f"layered:{location}",
+            {
+                "TIMEOUT": self.local_timeout,
+                "OPTIONS": {
+                    "MAX_ENTRIES": options.get("LOCAL_MAX_ENTRIES", 1000),
+                    "CULL_FREQUENCY": options.get("LOCAL_CULL_FREQUENCY", 10),
+                },
+            },
+        )
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _local_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return self.local_timeout
+        return min(timeout, self.local_timeout)
+
+    def _remember(self, key, value, timeout, version):
+        local_timeout = self._local_timeout(timeout)
+        if local_timeout > 0:
+            self._local.set(key, value, local_timeout, version=version)
+        else:
+            self._local.delete(key, version=version)
+
+    def get(self, key, default=None, version=None):
+        value = self._local.get(key, _MISSING, version=version)
+        if value is not _MISSING:
+            return value
+
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            return default
+        self._local.set(key, value, version=version)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, self._timeout(timeout), version=version)
+        self._remember(key, value, timeout, version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, self._timeout(timeout), version=version)
+        if added:
+            self._remember(key, value, timeout, version)
+        else:
+            self._local.delete(key, version=version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._local.delete(key, version=version)
+        return self.shared.touch(key, self._timeout(timeout), version=version)
+
+    def delete(self, key, version=None):
+        self._local.delete(key, version=version)
+        return self.shared.delete(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._local.delete(key, version=version)
+        value = self.shared.incr(key, delta, version=version)
+        self._local.set(key, value, version=version)
+        return value
+
+    def has_key(self, key, version=None):
+        return self._local.has_key(key, version=version) or self.shared.has_key(
+            key, version=version
+        )
+
+    def clear(self):
+        self._local.clear()
+        self.shared.clear()
+
+    def _timeout(self, timeout):
+        # The default timeout is this cache's TIMEOUT, not the shared one's
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
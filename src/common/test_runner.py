@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+LOCMEM_BACKEND = "django.core.cache.backends.locmem.LocMemCache"
+
+
+class LocMemCacheTestRunner(DiscoverRunner):
+    """
+    Тесты не читают и не очищают кеш на диске (src/cache), общий с
+    запущенным приложением: алиасы CACHES с файловым бэкендом заменяются на
+    LocMemCache. Остальные (LayeredCache поверх них) остаются как есть.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        caches = {
+            alias: (
+                {"BACKEND": LOCMEM_BACKEND, "LOCATION": f"test-{alias}"}
+                if config["BACKEND"].endswith("FileBasedCache")
+                else config
+            )
+            for alias, config in settings.CACHES.items()
+        }
+        self._caches_override = override_settings(CACHES=caches)
+        self._caches_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches_override.disable()
+        super().teardown_test_environment(**kwargs)
@@ -11,6 +11,16 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.dev")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from common.asgi import Lifespan  # noqa: E402
+from core.utils.ton import ton_balances  # noqa: E402
+
+# AsyncClient toncenter живет столько же, сколько event loop сервера
+application = Lifespan(
+    django_application,
+    on_startup=[ton_balances.astart],
+    on_shutdown=[ton_balances.aclose],
+)
@@ -8,12 +8,8 @@ SECRET_KEY: str = "django-insecure-hn^ppv^_puys)su29!vf@3_w9d(6c6_phprp03-x*eru$
 ALLOWED_HOSTS: list[str] = ["*", "localhost", "127.0.0.1"]
 
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
-}
+# Сессия целиком в подписанной cookie: ни записей в БД, ни общего кеша
+SESSION_ENGINE: str = "django.contrib.sessions.backends.signed_cookies"
 
 STATIC_URL = "/static/"
 
@@ -1,6 +1,5 @@
 from config.settings.base import *
 
-
 DEBUG: bool = False
 
 SECRET_KEY: str = "django-insecure-!@#%$^&*()_+1234567890-=qwertyuiopasdfghjklzxcvbnm"
@@ -8,11 +7,8 @@ SECRET_KEY: str = "django-insecure-!@#%$^&*()_+1234567890-=qwertyuiopasdfghjklzx
 ALLOWED_HOSTS: list[str] = ["*", "localhost"]
 
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
-}
+# Сессии читаются из кеша, в БД пишутся только изменения; в отличие от
+# signed_cookies их можно отозвать на сервере
+SESSION_ENGINE: str = "django.contrib.sessions.backends.cached_db"
 
 STATIC_URL: str = "/static/"
@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-18 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="UsedCaptchaNonce",
+            fields=[
+                (
+                    "nonce",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("expires_at", models.DateTimeField(db_index=True)),
+            ],
+            options={
+                "verbose_name": "Used captcha nonce",
+                "verbose_name_plural": "Used captcha nonces",
+            },
+        ),
+    ]
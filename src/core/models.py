@@ -1,3 +1,19 @@
 from django.db import models
 
-# Create your models here.
+
+class UsedCaptchaNonce(models.Model):
+    """
+    Nonce уже предъявленного токена капчи. Первичный ключ делает отметку
+    атомарной: из одновременных проверок одного токена INSERT пройдет у одной,
+    в любом процессе и на любой базе.
+    """
+
+    nonce = models.CharField(max_length=64, primary_key=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = "Used captcha nonce"
+        verbose_name_plural = "Used captcha nonces"
+
+    def __str__(self):
+        return self.nonce
@@ -1,3 +1,288 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from common.asgi import Lifespan
+from core.models import UsedCaptchaNonce
+from core.utils.captcha import ReplayGuard, check_captcha, sign_captcha
+from core.utils.ton import TonBalanceLookup, TonCenterError
+
+ADDRESS = "EQAAAQIDBAUGBwgJCgsMDQ4PEBESExQVFhcYGRobHB0eHx2j"
+
+
+class FakeTonCenter(ThreadingHTTPServer):
+    """Локальный toncenter: getAddressBalance с задержкой и счетчиком вызовов"""
+
+    daemon_threads = True
+    request_queue_size = 64
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeTonCenterHandler)
+        self.balances = {}
+        self.delay = 0.0
+        self.status = 200
+        self.requests = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class FakeTonCenterHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        address = parse_qs(url.query).get("address", [""])[0]
+        with self.server.lock:
+            self.server.requests.append((url.path, address, self.client_address))
+        time.sleep(self.server.delay)
+
+        body = json.dumps(
+            {"ok": True, "result": str(self.server.balances.get(address, 0))}
+        ).encode()
+        self.send_response(self.server.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TonBalanceLookupTests(SimpleTestCase):
+    def setUp(self):
+        self.toncenter = FakeTonCenter()
+        threading.Thread(target=self.toncenter.serve_forever, daemon=True).start()
+        self.addCleanup(self.toncenter.server_close)
+        self.addCleanup(self.toncenter.shutdown)
+        self.toncenter.balances = {ADDRESS: 2_500_000_000, "other": 7}
+        self.lookup = TonBalanceLookup(base_url=self.toncenter.url, ttl=60)
+        self.addCleanup(self.lookup.close)
+
+    def test_balance_is_cached(self):
+        self.assertEqual(self.lookup.get_balance(ADDRESS), 2_500_000_000)
+        self.assertEqual(self.lookup.get_balance(ADDRESS), 2_500_000_000)
+        self.assertEqual(len(self.toncenter.requests), 1)
+        self.assertEqual(
+            self.toncenter.requests[0][:2], ("/getAddressBalance", ADDRESS)
+        )
+
+    def test_cache_expires(self):
+        self.lookup.ttl = 0.05
+        self.lookup.get_balance(ADDRESS)
+        time.sleep(0.1)
+        self.toncenter.balances[ADDRESS] = 1
+        self.assertEqual(self.lookup.get_balance(ADDRESS), 1)
+        self.assertEqual(len(self.toncenter.requests), 2)
+
+    def test_concurrent_lookups_are_coalesced(self):
+        self.toncenter.delay = 0.2
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(self.lookup.get_balance(ADDRESS))
+            )
+            for _ in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [2_500_000_000] * 10)
+        self.assertEqual(len(self.toncenter.requests), 1)
+
+    def test_connection_is_reused(self):
+        self.lookup.get_balance(ADDRESS)
+        self.lookup.get_balance("other")
+        clients = {client for _, _, client in self.toncenter.requests}
+        self.assertEqual(len(clients), 1)
+
+    def test_errors_are_not_cached(self):
+        self.toncenter.status = 500
+        with self.assertRaises(TonCenterError):
+            self.lookup.get_balance(ADDRESS)
+
+        self.toncenter.status = 200
+        self.assertEqual(self.lookup.get_balance(ADDRESS), 2_500_000_000)
+        self.assertEqual(len(self.toncenter.requests), 2)
+
+    async def test_async_lookups_are_coalesced(self):
+        await self.lookup.astart()
+        self.toncenter.delay = 0.2
+        results = await asyncio.gather(
+            *(self.lookup.aget_balance(ADDRESS) for _ in range(10))
+        )
+        await self.lookup.aclose()
+
+        self.assertEqual(results, [2_500_000_000] * 10)
+        self.assertEqual(len(self.toncenter.requests), 1)
+
+    async def test_async_lookups_use_event_loop_client(self):
+        await self.lookup.astart()
+        self.toncenter.delay = 0.3
+        addresses = [f"address-{i}" for i in range(40)]
+        started = time.monotonic()
+        await asyncio.gather(*(self.lookup.aget_balance(a) for a in addresses))
+        elapsed = time.monotonic() - started
+        await self.lookup.aget_balance(addresses[0])
+        await self.lookup.aclose()
+
+        # Синхронный клиент и потоки sync_to_async не используются
+        self.assertIsNone(self.lookup._client)
+        self.assertEqual(len(self.toncenter.requests), 40)
+        # Все запросы идут одновременно, а не партиями по размеру пула потоков
+        self.assertLess(elapsed, 0.3 * 3)
+
+    async def test_cancelled_waiter_does_not_cancel_lookup(self):
+        await self.lookup.astart()
+        self.toncenter.delay = 0.2
+        first = asyncio.ensure_future(self.lookup.aget_balance(ADDRESS))
+        second = asyncio.ensure_future(self.lookup.aget_balance(ADDRESS))
+        await asyncio.sleep(0.05)
+        first.cancel()
+
+        self.assertEqual(await second, 2_500_000_000)
+        await self.lookup.aclose()
+        self.assertEqual(len(self.toncenter.requests), 1)
+
+    async def test_async_errors_are_not_cached(self):
+        await self.lookup.astart()
+        self.toncenter.status = 500
+        with self.assertRaises(TonCenterError):
+            await self.lookup.aget_balance(ADDRESS)
+
+        self.toncenter.status = 200
+        self.assertEqual(await self.lookup.aget_balance(ADDRESS), 2_500_000_000)
+        await self.lookup.aclose()
+        self.assertEqual(len(self.toncenter.requests), 2)
+
+    async def test_async_lookup_outside_server_loop_uses_sync_client(self):
+        # Как async-view под WSGI: loop на один запрос, astart() не вызывался
+        self.assertEqual(await self.lookup.aget_balance(ADDRESS), 2_500_000_000)
+        self.assertIsNotNone(self.lookup._client)
+        self.assertIsNone(self.lookup._async_client)
+
+    def test_lifespan_opens_and_closes_async_client(self):
+        app = Lifespan(
+            mock.AsyncMock(),
+            on_startup=[self.lookup.astart],
+            on_shutdown=[self.lookup.aclose],
+        )
+
+        async def serve():
+            messages = asyncio.Queue()
+            sent = []
+
+            async def send(message):
+                sent.append(message["type"])
+
+            await messages.put({"type": "lifespan.startup"})
+            server = asyncio.ensure_future(
+                app({"type": "lifespan"}, messages.get, send)
+            )
+            await asyncio.sleep(0)
+            balances = [await self.lookup.aget_balance(a) for a in (ADDRESS, "other")]
+            client = self.lookup._async_client
+            await messages.put({"type": "lifespan.shutdown"})
+            await server
+            return sent, balances, client
+
+        sent, balances, client = async_to_sync(serve)()
+        self.assertEqual(
+            sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+        )
+        self.assertEqual(balances, [2_500_000_000, 7])
+        self.assertIsNotNone(client)
+        self.assertTrue(client.is_closed)
+        self.assertIsNone(self.lookup._client)
+        self.assertEqual(len({c for _, _, c in self.toncenter.requests}), 1)
+
+    def test_wallet_balance_view_reuses_connection(self):
+        # Под WSGI каждый вызов async-view идет в своем loop
+        self.lookup.ttl = 0
+        url = reverse("core:wallet_balance")
+        with mock.patch("core.views.ton_balances", self.lookup):
+            self.client.get(url, {"address": ADDRESS})
+            self.client.get(url, {"address": ADDRESS})
+
+        self.assertEqual(len(self.toncenter.requests), 2)
+        self.assertEqual(len({c for _, _, c in self.toncenter.requests}), 1)
+
+    def test_wallet_balance_view(self):
+        url = reverse("core:wallet_balance")
+        with mock.patch("core.views.ton_balances", self.lookup):
+            response = self.client.get(url, {"address": ADDRESS})
+            self.assertEqual(
+                response.json(),
+                {
+                    "balance": "2.50 TON",
+                    "userFriendlyAddress": ADDRESS,
+                    "shortAddress": "EQAA...Hx2j",
+                },
+            )
+            self.client.get(url, {"address": ADDRESS})
+        self.assertEqual(len(self.toncenter.requests), 1)
+
+
+class CaptchaReplayTests(TransactionTestCase):
+    def test_token_is_accepted_once(self):
+        token = sign_captcha(7, nonce="nonce-1")
+        self.assertTrue(check_captcha(token, "7"))
+        self.assertFalse(check_captcha(token, "7"))
+
+    def test_wrong_answer_uses_up_token(self):
+        token = sign_captcha(7, nonce="nonce-1")
+        self.assertFalse(check_captcha(token, "8"))
+        self.assertFalse(check_captcha(token, "7"))
+
+    def test_used_nonce_is_stored_in_database(self):
+        check_captcha(sign_captcha(7, nonce="nonce-1"), "7")
+        self.assertTrue(UsedCaptchaNonce.objects.filter(nonce="nonce-1").exists())
+        # Другой процесс видит ту же таблицу, а не свою память
+        self.assertFalse(ReplayGuard().use("nonce-1"))
+        self.assertTrue(ReplayGuard().use("nonce-2"))
+
+    def test_expired_nonces_are_purged(self):
+        UsedCaptchaNonce.objects.create(
+            nonce="old", expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        ReplayGuard().use("nonce-1")
+        self.assertEqual(
+            list(UsedCaptchaNonce.objects.values_list("nonce", flat=True)),
+            ["nonce-1"],
+        )
+
+    def test_concurrent_checks_accept_token_once(self):
+        token = sign_captcha(7, nonce="nonce-1")
+        results = []
+        barrier = threading.Barrier(10)
+
+        def check():
+            try:
+                barrier.wait()
+                results.append(check_captcha(token, 7))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=check) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(results), [False] * 9 + [True])
@@ -8,6 +8,7 @@ from core.views import (
     DepositView,
     tonconnect_manifest,
     WalletTonService,
+    captcha_image,
 )
 
 app_name: str = "core"
@@ -20,4 +21,9 @@ urlpatterns = [
     path("deposit/", DepositView.as_view(), name="deposit"),
     path("tonconnect-manifest.json", tonconnect_manifest, name="tonconnect_manifest"),
     path("api/wallet-balance/", WalletTonService.as_view(), name="wallet_balance"),
+    path(
+        "captcha/<slug:challenge_id>/<int:index>.png",
+        captcha_image,
+        name="captcha_image",
+    ),
 ]
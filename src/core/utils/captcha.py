@@ -1,7 +1,29 @@
+import os
 import random
+import secrets
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+from functools import cached_property, lru_cache
 from PIL import Image, ImageDraw, ImageFont
 import io
-import base64
+
+from django.conf import settings
+from django.core import signing
+from django.db import IntegrityError, transaction
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from core.models import UsedCaptchaNonce
+
+CAPTCHA_TOKEN_SALT = "core.captcha"
+CAPTCHA_CHALLENGE_SALT = "core.captcha.challenge"
+
+# Шаг, с которым выбирается положение цифры на плитке: меньше различных
+# плиток - чаще попадание в кеш
+TILE_OFFSET_STEP = 3
 
 
 class CaptchaGenerator:
@@ -13,6 +35,9 @@ class CaptchaGenerator:
         self.line_color = "#555555"
         self.ellipse_width = 2
         self.line_width = 1
+        self.tile = lru_cache(maxsize=settings.CAPTCHA_TILE_CACHE_SIZE)(
+            self._render_tile
+        )
 
     @staticmethod
     def _rounded_rect(img, radius):
@@ -77,13 +102,18 @@ class CaptchaGenerator:
                     points, outline=self.line_color, fill=None, width=self.line_width
                 )
 
-    def _get_font(self):
+    @cached_property
+    def font(self):
         try:
             return ImageFont.truetype("arial.ttf", int(self.size * 0.6))
         except (IOError, OSError):
             return ImageFont.load_default()
 
-    def _get_random_text_position(self, text_bbox):
+    def _text_bbox(self, text):
+        draw = ImageDraw.Draw(Image.new("L", (self.size, self.size)))
+        return draw.textbbox((0, 0), text, font=self.font)
+
+    def _get_random_text_position(self, text_bbox, rng):
         text_width = text_bbox[2] - text_bbox[0]
         text_height = text_bbox[3] - text_bbox[1]
         margin = 3
@@ -94,16 +124,17 @@ class CaptchaGenerator:
         if max_x < mix_x:
             x = (self.size - text_width) // 2
         else:
-            x = random.randint(mix_x, max_x)
+            x = rng.randrange(mix_x, max_x + 1, TILE_OFFSET_STEP)
 
         if max_y < mix_y:
             y = (self.size - text_height) // 2
         else:
-            y = random.randint(mix_y, max_y)
+            y = rng.randrange(mix_y, max_y + 1, TILE_OFFSET_STEP)
 
         return x, y
 
-    def _create_number_image(self, number, pattern):
+    def _render_tile(self, number, pattern, position):
+        """Плитка с цифрой в PNG с палитрой; кешируется через self.tile"""
         img = Image.new("RGBA", (self.size, self.size), self.bg_color)
         draw = ImageDraw.Draw(img)
 
@@ -111,56 +142,229 @@ class CaptchaGenerator:
         img = self._rounded_rect(img, self.corner_radius)
 
         draw = ImageDraw.Draw(img)
-        font = self._get_font()
         text = str(number)
-        bbox = draw.textbbox((0, 0), text, font=font)
-
-        x, y = self._get_random_text_position(bbox)
+        x, y = position
 
-        draw.text((x + 1, y + 1), text, font=font, fill="#555")
-        draw.text((x, y), text, font=font, fill="#000")
+        draw.text((x + 1, y + 1), text, font=self.font, fill="#555")
+        draw.text((x, y), text, font=self.font, fill="#000")
 
         buffer = io.BytesIO()
-        img.save(buffer, format="PNG")
-        return base64.b64encode(buffer.getvalue()).decode("utf-8")
+        img.quantize(colors=16, method=Image.Quantize.FASTOCTREE).save(
+            buffer, format="PNG", optimize=True
+        )
+        return buffer.getvalue()
 
     @staticmethod
-    def _generate_math_operation():
+    def _generate_math_operation(rng):
         operations = ["+", "-", "x"]
-        operation = random.choice(operations)
+        operation = rng.choice(operations)
 
         if operation == "+":
-            num_1 = random.randint(1, 9)
-            num_2 = random.randint(1, 9)
+            num_1 = rng.randint(1, 9)
+            num_2 = rng.randint(1, 9)
             result = num_1 + num_2
         elif operation == "-":
-            num_1 = random.randint(2, 9)
-            num_2 = random.randint(1, num_1)
+            num_1 = rng.randint(2, 9)
+            num_2 = rng.randint(1, num_1)
             result = num_1 - num_2
         else:
-            num_1 = random.randint(2, 5)
-            num_2 = random.randint(2, 4)
+            num_1 = rng.randint(2, 5)
+            num_2 = rng.randint(2, 4)
             result = num_1 * num_2
 
         return num_1, num_2, operation, result
 
-    def _get_different_patterns(self):
-        pattern_1 = random.choice(self.patterns)
-        pattern_2 = random.choice([p for p in self.patterns if p != pattern_1])
+    def _get_different_patterns(self, rng):
+        pattern_1 = rng.choice(self.patterns)
+        pattern_2 = rng.choice([p for p in self.patterns if p != pattern_1])
 
         return pattern_1, pattern_2
 
-    def generate(self):
-        num_1, num_2, operation, result = self._generate_math_operation()
-
-        pattern_1, pattern_2 = self._get_different_patterns()
-
-        img1_b64 = self._create_number_image(num_1, pattern_1)
-        img2_b64 = self._create_number_image(num_2, pattern_2)
+    def challenge(self, challenge_id):
+        """
+        Капча, однозначно заданная своим id через HMAC с SECRET_KEY: по id ее
+        плитки отдаются из любого процесса без хранения, а сам id ничего не
+        говорит об ответе
+        """
+        rng = random.Random(salted_hmac(CAPTCHA_CHALLENGE_SALT, challenge_id).digest())
+        num_1, num_2, operation, result = self._generate_math_operation(rng)
+        pattern_1, pattern_2 = self._get_different_patterns(rng)
 
+        tiles = [
+            (
+                number,
+                pattern,
+                self._get_random_text_position(self._text_bbox(str(number)), rng),
+            )
+            for number, pattern in ((num_1, pattern_1), (num_2, pattern_2))
+        ]
         return {
-            "img1": f"data:image/png;base64,{img1_b64}",
-            "img2": f"data:image/png;base64,{img2_b64}",
+            "id": challenge_id,
+            "tiles": tiles,
             "operation": operation,
             "result": result,
         }
+
+    def generate(self):
+        return self.challenge(secrets.token_urlsafe(12))
+
+
+captcha_generator = CaptchaGenerator()
+
+
+class CaptchaReservoir:
+    """
+    Запас готовых капч, который пополняет фоновый поток: не больше
+    CAPTCHA_RESERVOIR_SIZE штук и не быстрее CAPTCHA_REFILL_RATE в секунду.
+    Запрос забирает готовую капчу и рисует ее сам, только если запас пуст.
+    """
+
+    def __init__(self, generator=None):
+        self.generator = generator or captcha_generator
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    @staticmethod
+    def _size():
+        return settings.CAPTCHA_RESERVOIR_SIZE
+
+    def _worker_alive(self):
+        thread = self._thread
+        return thread is not None and self._pid == os.getpid() and thread.is_alive()
+
+    def _ensure_worker(self):
+        if self._size() <= 0 or self._worker_alive():
+            return
+
+        with self._lock:
+            if self._worker_alive():
+                return
+            if self._pid != os.getpid():
+                # После fork поток родителя не переносится, а его запас у
+                # всех дочерних процессов был бы одинаковым
+                self._items.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._refill, name="captcha-reservoir", daemon=True
+            )
+            self._thread.start()
+
+    def _refill(self):
+        while True:
+            self._wakeup.clear()
+            while len(self._items) < self._size():
+                captcha = self.generator.generate()
+                for tile in captcha["tiles"]:
+                    self.generator.tile(*tile)
+                self._items.append(captcha)
+                if settings.CAPTCHA_REFILL_RATE > 0:
+                    time.sleep(1 / settings.CAPTCHA_REFILL_RATE)
+            self._wakeup.wait()
+
+    def pop(self):
+        self._ensure_worker()
+        try:
+            captcha = self._items.popleft()
+        except IndexError:
+            captcha = None
+        self._wakeup.set()
+
+        if captcha is None:
+            captcha = self.generator.generate()
+        return captcha
+
+    def __len__(self):
+        return len(self._items)
+
+
+captcha_reservoir = CaptchaReservoir()
+
+
+class ReplayGuard:
+    """
+    Nonce уже проверенных токенов капчи в таблице UsedCaptchaNonce, общей
+    для всех процессов. Запись живет CAPTCHA_TTL - не меньше, чем сам токен;
+    истекшие записи удаляются не чаще раза в CAPTCHA_TTL на процесс.
+    """
+
+    def __init__(self):
+        self._purged_at = None
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        if self._purged_at is not None and now - self._purged_at < settings.CAPTCHA_TTL:
+            return
+        self._purged_at = now
+        UsedCaptchaNonce.objects.filter(expires_at__lte=timezone.now()).delete()
+
+    def use(self, nonce):
+        """Отметить nonce; False, если его уже предъявляли"""
+        self._purge_expired()
+        try:
+            with transaction.atomic():
+                UsedCaptchaNonce.objects.create(
+                    nonce=nonce,
+                    expires_at=timezone.now() + timedelta(seconds=settings.CAPTCHA_TTL),
+                )
+        except IntegrityError:
+            return False
+        return True
+
+
+captcha_replay_guard = ReplayGuard()
+
+
+def _answer_hash(nonce, answer):
+    return salted_hmac(CAPTCHA_TOKEN_SALT, f"{nonce}:{answer}").hexdigest()[:32]
+
+
+def sign_captcha(result, nonce=None):
+    """Подписанный токен с хешем ответа вместо записи ответа в сессию"""
+    nonce = nonce or secrets.token_urlsafe(12)
+    return signing.dumps(
+        [nonce, _answer_hash(nonce, result), int(time.time())],
+        salt=CAPTCHA_TOKEN_SALT,
+    )
+
+
+def check_captcha(token, answer):
+    """
+    Проверить ответ по токену. Токен принимается один раз, даже с неверным
+    ответом, иначе ответ можно было бы подобрать перебором.
+    """
+    try:
+        nonce, answer_hash, _ = signing.loads(
+            token or "", salt=CAPTCHA_TOKEN_SALT, max_age=settings.CAPTCHA_TTL
+        )
+    except (signing.BadSignature, TypeError, ValueError):
+        return False
+
+    if not captcha_replay_guard.use(nonce):
+        return False
+
+    try:
+        answer = int(answer)
+    except (TypeError, ValueError):
+        return False
+    return constant_time_compare(_answer_hash(nonce, answer), answer_hash)
+
+
+def issue_captcha():
+    """Капча из запаса для страницы: ссылки на плитки, знак операции и токен"""
+    captcha = captcha_reservoir.pop()
+    return {
+        "img1": reverse("core:captcha_image", args=[captcha["id"], 1]),
+        "img2": reverse("core:captcha_image", args=[captcha["id"], 2]),
+        "operation": captcha["operation"],
+        "token": sign_captcha(captcha["result"], nonce=captcha["id"]),
+    }
+
+
+def captcha_tile(challenge_id, index):
+    """PNG плитки index (1 или 2) капчи challenge_id"""
+    return captcha_generator.tile(
+        *captcha_generator.challenge(challenge_id)["tiles"][index - 1]
+    )
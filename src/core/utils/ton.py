@@ -0,0 +1,194 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+
+class TonCenterError(Exception):
+    pass
+
+
+class TonBalanceLookup:
+    """
+    Балансы TON-адресов из toncenter для одного процесса.
+
+    Синхронные вызовы идут через один httpx.Client на процесс. Под ASGI
+    astart() (из lifespan сервера, см. config.asgi) открывает httpx.AsyncClient
+    в event loop сервера, и async-вызовы из этого loop идут через него, без
+    потоков sync_to_async. Под WSGI каждый async-запрос Django выполняет в
+    новом loop, поэтому там aget_balance уходит в общий синхронный клиент.
+    Оба клиента держат соединения открытыми (без нового TCP+TLS на запрос).
+    Ответы кешируются на TON_BALANCE_TTL секунд, а одновременные запросы
+    одного адреса ждут один вызов toncenter. Ошибки не кешируются.
+    """
+
+    def __init__(self, base_url=None, ttl=None, max_entries=None):
+        self.base_url = base_url
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._balances = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._client = None
+        self._pid = None
+        # Открываются в astart() и живут, пока работает loop сервера
+        self._loop = None
+        self._async_client = None
+        self._async_in_flight = {}
+
+    @property
+    def client(self):
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    # Соединения родителя после fork дочернему процессу не годятся
+                    self._client = httpx.Client(
+                        base_url=self.base_url or settings.TONCENTER_API_URL,
+                        timeout=settings.TONCENTER_TIMEOUT,
+                    )
+                    self._pid = os.getpid()
+        return self._client
+
+    def _ttl(self):
+        return settings.TON_BALANCE_TTL if self.ttl is None else self.ttl
+
+    def _max_entries(self):
+        if self.max_entries is None:
+            return settings.TON_BALANCE_CACHE_SIZE
+        return self.max_entries
+
+    def cached(self, address):
+        """Баланс в nanoton из кеша или None"""
+        with self._lock:
+            entry = self._balances.get(address)
+            if entry is None:
+                return None
+            expires_at, balance = entry
+            if expires_at <= time.monotonic():
+                del self._balances[address]
+                return None
+            self._balances.move_to_end(address)
+            return balance
+
+    def _remember(self, address, balance):
+        with self._lock:
+            self._balances[address] = (time.monotonic() + self._ttl(), balance)
+            self._balances.move_to_end(address)
+            while len(self._balances) > self._max_entries():
+                self._balances.popitem(last=False)
+
+    @staticmethod
+    def _parse(response):
+        try:
+            response.raise_for_status()
+            data = response.json()
+            if not data["ok"]:
+                raise TonCenterError(data.get("error", "toncenter returned ok=false"))
+            return int(data["result"])
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            raise TonCenterError(str(e)) from e
+
+    def _fetch(self, address):
+        try:
+            response = self.client.get(
+                "/getAddressBalance", params={"address": address}
+            )
+        except httpx.HTTPError as e:
+            raise TonCenterError(str(e)) from e
+        return self._parse(response)
+
+    async def _afetch(self, address):
+        try:
+            response = await self._async_client.get(
+                "/getAddressBalance", params={"address": address}
+            )
+        except httpx.HTTPError as e:
+            raise TonCenterError(str(e)) from e
+        balance = self._parse(response)
+        self._remember(address, balance)
+        return balance
+
+    def get_balance(self, address):
+        """
+        Баланс адреса в nanoton. Первый поток, не нашедший адрес в кеше,
+        идет в toncenter; остальные ждут его результат (или его ошибку).
+        """
+        balance = self.cached(address)
+        if balance is not None:
+            return balance
+
+        with self._lock:
+            future = self._in_flight.get(address)
+            leader = future is None
+            if leader:
+                future = self._in_flight[address] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            balance = self._fetch(address)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            self._remember(address, balance)
+            future.set_result(balance)
+            return balance
+        finally:
+            with self._lock:
+                self._in_flight.pop(address, None)
+
+    async def aget_balance(self, address):
+        """
+        То же для async-кода. В loop сервера запрос в toncenter выполняется
+        отдельной задачей, и все корутины ждут ее через shield: отмена одной
+        из них не прерывает запрос для остальных.
+        """
+        balance = self.cached(address)
+        if balance is not None:
+            return balance
+
+        if self._loop is not asyncio.get_running_loop():
+            return await sync_to_async(self.get_balance, thread_sensitive=False)(
+                address
+            )
+
+        task = self._async_in_flight.get(address)
+        if task is None:
+            task = self._async_in_flight[address] = asyncio.ensure_future(
+                self._afetch(address)
+            )
+            task.add_done_callback(lambda _: self._async_in_flight.pop(address, None))
+        return await asyncio.shield(task)
+
+    async def astart(self):
+        """Открыть AsyncClient в текущем (долгоживущем) event loop"""
+        await self.aclose()
+        self._async_client = httpx.AsyncClient(
+            base_url=self.base_url or settings.TONCENTER_API_URL,
+            timeout=settings.TONCENTER_TIMEOUT,
+        )
+        self._loop = asyncio.get_running_loop()
+
+    async def aclose(self):
+        client, self._async_client, self._loop = self._async_client, None, None
+        self._async_in_flight.clear()
+        if client is not None:
+            await client.aclose()
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+            self._client = None
+            self._balances.clear()
+
+
+ton_balances = TonBalanceLookup()
@@ -1,21 +1,25 @@
-from decimal import Decimal
+from decimal import ROUND_DOWN, Decimal
+from functools import lru_cache
 
 from django.shortcuts import redirect, render
+from django.urls import reverse
 from django.views.generic import TemplateView
 
 from common.mixins import TitleMixin
-from core.utils.captcha import CaptchaGenerator
+from core.utils.captcha import captcha_tile, check_captcha, issue_captcha
+from core.utils.ton import TonCenterError, ton_balances
 
-from exchange.models import Token, ExchangeOrder, Pool
-from django.db import models
+from exchange.models import Token, ExchangeOrder
+from exchange.services.registry import pool_registry
+from exchange.services.routing import find_best_route
+from exchange.services.stream import streaming_supported
 from django.views import View
 from django.utils.decorators import method_decorator
-from pytoniq_core import Address
-import httpx
+from pytoniq_core import Address, AddressError
 from http import HTTPStatus
 from django.conf import settings
 
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 
 
@@ -38,10 +42,20 @@ def tonconnect_manifest(request):
     return response
 
 
+def captcha_image(request, challenge_id, index):
+    if index not in (1, 2):
+        raise Http404
+
+    response = HttpResponse(captcha_tile(challenge_id, index), content_type="image/png")
+    # Картинки капчи по id не меняются
+    response["Cache-Control"] = f"private, max-age={settings.CAPTCHA_TTL}, immutable"
+    return response
+
+
 @method_decorator(csrf_exempt, name="dispatch")
 class WalletTonService(View):
 
-    def get(self, request) -> JsonResponse:
+    async def get(self, request) -> JsonResponse:
         address = request.GET["address"]
         if not address:
             return JsonResponse(
@@ -50,7 +64,7 @@ class WalletTonService(View):
 
         try:
             address_data = self._process_address(address)
-            balance = self._get_balance(address_data["user_friendly"])
+            balance = await self._get_balance(address_data["user_friendly"])
 
             return JsonResponse(
                 {
@@ -60,7 +74,7 @@ class WalletTonService(View):
                 }
             )
 
-        except ValueError:
+        except (ValueError, AddressError):
             return JsonResponse(
                 {
                     "balance": "0.00 TON",
@@ -70,7 +84,9 @@ class WalletTonService(View):
             )
 
     @staticmethod
+    @lru_cache(maxsize=settings.TON_ADDRESS_CACHE_SIZE)
     def _process_address(address: str) -> dict:
+        # Разбор адреса не зависит ни от чего, кроме строки: кешируется без срока
         addr_obj = Address(address)
         user_friendly = addr_obj.to_str(
             is_user_friendly=True, is_bounceable=True, is_url_safe=True
@@ -96,46 +112,32 @@ class WalletTonService(View):
             return f"{balance_ton:.2f} TON"
 
     @staticmethod
-    def _get_balance(user_friendly_address: str) -> str:
+    async def _get_balance(user_friendly_address: str) -> str:
         try:
-            url = f"https://toncenter.com/api/v2/getAddressBalance?address={user_friendly_address}"
-
-            with httpx.Client(timeout=10.0) as client:
-                response = client.get(url)
-                response.raise_for_status()
-                data = response.json()
-
-            if data["ok"]:
-                balance_nano = int(data["result"])
-                return WalletTonService._format_balance(balance_nano)
-            else:
-                return "0$"
-
-        except (httpx.RequestError, KeyError, ValueError):
+            balance_nano = await ton_balances.aget_balance(user_friendly_address)
+        except TonCenterError:
             return "0$"
 
+        return WalletTonService._format_balance(balance_nano)
+
 
 class IndexView(TitleMixin, TemplateView):
     template_name: str = "index.html"
     title: str = "Online cryptocurrency exchange - CryptoChicken"
 
-    def dispatch(self, request, *args, **kwargs):
-        self.captcha = CaptchaGenerator()
-        return super().dispatch(request, *args, **kwargs)
-
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        captcha_data = self.captcha.generate()
-
-        self.request.session["captcha_answer"] = captcha_data["result"]
-
+        # Queryset ленивый: при попадании в кеш фрагмента token_selector
+        # запроса к токенам нет
         tokens = (
             Token.objects.filter(is_active=True)
             .select_related("network")
             .order_by("name")
         )
 
-        context.update({"captcha": captcha_data, "tokens": tokens})
+        context.update({"captcha": issue_captcha(), "tokens": tokens})
+        if streaming_supported(self.request):
+            context["pool_stream_url"] = reverse("exchange:pool_stream")
         return context
 
     def post(self, request, *args, **kwargs):
@@ -145,9 +147,7 @@ class IndexView(TitleMixin, TemplateView):
         return self._handle_form_submission(request)
 
     def _handle_ajax_captcha(self, request):
-        captcha_data = self.captcha.generate()
-        request.session["captcha_answer"] = captcha_data["result"]
-        return JsonResponse(captcha_data)
+        return JsonResponse(issue_captcha())
 
     def _handle_form_submission(self, request):
         validation_error = self._validate_form(request)
@@ -165,13 +165,9 @@ class IndexView(TitleMixin, TemplateView):
         if not all([request.POST.get("check_rule"), request.POST.get("add_rules")]):
             return "Необходимо согласиться с условиями"
 
-        user_answer = request.POST.get("number")
-        correct_answer = request.session.get("captcha_answer")
-
-        try:
-            if not user_answer or int(user_answer) != correct_answer:
-                raise ValueError()
-        except (ValueError, TypeError):
+        if not check_captcha(
+            request.POST.get("captcha_token"), request.POST.get("number")
+        ):
             return "Неверный ответ на капчу"
 
         required_fields = [
@@ -200,14 +196,14 @@ class IndexView(TitleMixin, TemplateView):
             id=form_data["receive_token_id"], is_active=True
         )
 
-        pool = self._find_pool(give_token, receive_token)
-        if not pool:
+        give_amount = Decimal(str(form_data["give_amount"]))
+        route = self._find_route(give_token, receive_token, give_amount)
+        if not route:
             raise ValueError(
                 f"Пул для пары {give_token.short_name}/{receive_token.short_name} не найден"
             )
 
-        give_amount = Decimal(str(form_data["give_amount"]))
-        receive_amount = Decimal(str(form_data["receive_amount"]))
+        receive_amount = route.amount_out.quantize(Decimal("0.01"), ROUND_DOWN)
         exchange_rate = (
             receive_amount / give_amount if give_amount > 0 else Decimal("0")
         )
@@ -219,29 +215,20 @@ class IndexView(TitleMixin, TemplateView):
             receive_token=receive_token,
             receive_amount=receive_amount,
             exchange_rate=exchange_rate,
-            fee_percentage=pool.fee_percentage,
-            pool=pool,
+            fee_percentage=route.fee_percentage,
+            pool=route.pool,
+            route=route.as_list() if len(route.hops) > 1 else [],
             status="pending",
         )
 
     def _find_pool(self, give_token, receive_token):
-        return Pool.objects.filter(
-            models.Q(token1=give_token, token2=receive_token)
-            | models.Q(token1=receive_token, token2=give_token),
-            is_active=True,
-        ).first()
+        return pool_registry.get_pool(give_token, receive_token)
 
-    def _render_with_error(self, error_message):
-        captcha_data = self.captcha.generate()
-        self.request.session["captcha_answer"] = captcha_data["result"]
+    def _find_route(self, give_token, receive_token, give_amount):
+        return find_best_route(give_token, receive_token, give_amount)
 
-        tokens = (
-            Token.objects.filter(is_active=True)
-            .select_related("network")
-            .order_by("name")
-        )
-
-        context = {"captcha": captcha_data, "tokens": tokens, "error": error_message}
+    def _render_with_error(self, error_message):
+        context = self.get_context_data(error=error_message)
         return render(self.request, self.template_name, context)
 
 
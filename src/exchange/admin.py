@@ -1,12 +1,52 @@
-from django.contrib import admin
-from django.utils.html import format_html
+import uuid
+
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.utils import unquote
+from django.contrib.admin.views.main import SEARCH_VAR
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.utils.html import format_html, format_html_join
 from django.utils.safestring import mark_safe
-from django.db.models import Q
-from django.urls import reverse
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.shortcuts import get_object_or_404, redirect
+from django.urls import path, reverse
+from django.utils.http import urlencode
 from unfold.admin import ModelAdmin
 from decimal import Decimal
 
-from .models import Network, Token, Pool, ExchangeOrder
+from .models import (
+    Network,
+    Token,
+    Pool,
+    PoolStats,
+    PoolVersionConflict,
+    ExchangeOrder,
+    ArchivedOrder,
+    ExportJob,
+)
+from .pagination import EstimatedCountPaginator, KeysetChangeList, estimate_count
+from .services.depth import pool_depth
+from .services.export import csv_chunks, gzip_chunks, order_rows
+from .services.orders import TransitionConflict, order_history, transition_orders
+from .services.registry import pool_registry
+from .services.settlement import SETTLEABLE_STATUSES, settle_orders
+
+
+class RelatedOnlyListFilter(admin.RelatedOnlyFieldListFilter):
+    """RelatedOnlyFieldListFilter, подписи которого строятся без запроса на вариант"""
+
+    def field_choices(self, field, request, model_admin):
+        related = model_admin.get_queryset(request).order_by()
+        choices = field.related_model._default_manager.filter(
+            pk__in=related.values_list(f"{self.field_path}__pk", flat=True)
+        ).select_related()
+
+        ordering = self.field_admin_ordering(field, request, model_admin)
+        if ordering:
+            choices = choices.order_by(*ordering)
+        return [(obj.pk, str(obj)) for obj in choices]
 
 
 class TokenInline(admin.TabularInline):
@@ -55,7 +95,24 @@ class NetworkAdmin(ModelAdmin):
     inlines = [TokenInline]
 
     def get_queryset(self, request):
-        return super().get_queryset(request).prefetch_related("tokens")
+        tokens = (
+            Token.objects.filter(network=OuterRef("pk"))
+            .order_by()
+            .values("network")
+            .annotate(
+                total=Count("pk"),
+                active=Count("pk", filter=Q(is_active=True)),
+            )
+        )
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                _tokens_count=Coalesce(Subquery(tokens.values("total")), 0),
+                _active_tokens_count=Coalesce(Subquery(tokens.values("active")), 0),
+                _pools_count=Coalesce(F("stats__pools_count"), 0),
+            )
+        )
 
     def network_type_display(self, obj):
         if obj.is_testnet:
@@ -63,6 +120,7 @@ class NetworkAdmin(ModelAdmin):
         return format_html('<span style="color: #4caf50;">Mainnet</span>')
 
     network_type_display.short_description = "Type"
+    network_type_display.admin_order_field = "is_testnet"
 
     def status_display(self, obj):
         return format_html(
@@ -72,12 +130,10 @@ class NetworkAdmin(ModelAdmin):
         )
 
     status_display.short_description = "Status"
+    status_display.admin_order_field = "is_active"
 
     def tokens_count(self, obj):
-        if not obj.pk:
-            return "0"
-
-        count = obj.tokens.count()
+        count = getattr(obj, "_tokens_count", 0)
         if count > 0:
             url = (
                 reverse("admin:exchange_token_changelist")
@@ -87,31 +143,21 @@ class NetworkAdmin(ModelAdmin):
         return "0"
 
     tokens_count.short_description = "Tokens"
+    tokens_count.admin_order_field = "_tokens_count"
 
     def pools_count(self, obj):
-        if not obj.pk:
-            return "0"
-
-        pools_count = (
-            Pool.objects.filter(Q(token1__network=obj) | Q(token2__network=obj))
-            .distinct()
-            .count()
-        )
-        return str(pools_count)
+        return str(getattr(obj, "_pools_count", 0))
 
     pools_count.short_description = "Pools"
+    pools_count.admin_order_field = "_pools_count"
 
     def get_network_stats(self, obj):
         if not obj.pk:
             return "Save to see analytics"
 
-        tokens = obj.tokens.count()
-        active_tokens = obj.tokens.filter(is_active=True).count()
-        pools_count = (
-            Pool.objects.filter(Q(token1__network=obj) | Q(token2__network=obj))
-            .distinct()
-            .count()
-        )
+        tokens = getattr(obj, "_tokens_count", 0)
+        active_tokens = getattr(obj, "_active_tokens_count", 0)
+        pools_count = self.pools_count(obj)
 
         return format_html(
             "<strong>Network Analytics:</strong><br>"
@@ -166,7 +212,12 @@ class TokenAdmin(ModelAdmin):
     )
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related("network")
+        return (
+            super()
+            .get_queryset(request)
+            .select_related("network")
+            .annotate(_pools_count=Coalesce(F("stats__pools_count"), 0))
+        )
 
     def network_link(self, obj):
         if not obj.network:
@@ -176,6 +227,7 @@ class TokenAdmin(ModelAdmin):
         return format_html('<a href="{}">{}</a>', url, obj.network.short_name)
 
     network_link.short_description = "Network"
+    network_link.admin_order_field = "network__short_name"
 
     def status_display(self, obj):
         return format_html(
@@ -185,15 +237,13 @@ class TokenAdmin(ModelAdmin):
         )
 
     status_display.short_description = "Status"
+    status_display.admin_order_field = "is_active"
 
     def pools_count(self, obj):
-        if not obj.pk:
-            return "0"
-
-        count = Pool.objects.filter(Q(token1=obj) | Q(token2=obj)).count()
-        return str(count)
+        return str(getattr(obj, "_pools_count", 0))
 
     pools_count.short_description = "Pools"
+    pools_count.admin_order_field = "_pools_count"
 
     def image_preview(self, obj):
         if obj.image and hasattr(obj.image, "url"):
@@ -209,8 +259,7 @@ class TokenAdmin(ModelAdmin):
         if not obj.pk:
             return "Save to see analytics"
 
-        pools = Pool.objects.filter(Q(token1=obj) | Q(token2=obj))
-        active_pools = pools.filter(is_active=True)
+        active_pools = list(Pool.objects.for_token(obj).filter(is_active=True))
 
         total_liquidity = sum(
             pool.token1_amount + pool.token2_amount
@@ -229,26 +278,56 @@ class TokenAdmin(ModelAdmin):
             "Active Pools: {}<br>"
             "Total Liquidity: ${:,.0f}<br>"
             "Token Health: {}",
-            pools.count(),
-            active_pools.count(),
+            self.pools_count(obj),
+            len(active_pools),
             total_liquidity,
-            "Good" if active_pools.count() > 0 else "Needs Pools",
+            "Good" if active_pools else "Needs Pools",
         )
 
         if pool_list:
             result += format_html(
                 "<br><br><strong>Active Pools:</strong><br>{}", "<br>".join(pool_list)
             )
-            if active_pools.count() > 3:
-                result += f"<br>... and {active_pools.count() - 3} more"
+            if len(active_pools) > 3:
+                result += f"<br>... and {len(active_pools) - 3} more"
 
         return result
 
     get_token_analytics.short_description = "Token Analytics"
 
 
+class PoolAdminForm(forms.ModelForm):
+    """
+    Форма пула помнит версию, с которой ее открыли: если пул с тех пор
+    изменился (например, расчет сдвинул резервы), правка отклоняется, а не
+    перезаписывает новые резервы старыми
+    """
+
+    # Не "version": нередактируемое поле модели нельзя указывать в fieldsets
+    loaded_version = forms.IntegerField(widget=forms.HiddenInput, required=False)
+
+    class Meta:
+        model = Pool
+        fields = "__all__"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["loaded_version"].initial = self.instance.version
+
+    def clean(self):
+        cleaned_data = super().clean()
+        stale = cleaned_data.get("loaded_version") != self.instance.version
+        if stale and not self.instance._state.adding:
+            raise forms.ValidationError(
+                "The pool was changed after this form was opened "
+                "(for example, by a settlement). Reload the page and try again."
+            )
+        return cleaned_data
+
+
 @admin.register(Pool)
 class PoolAdmin(ModelAdmin):
+    form = PoolAdminForm
     list_display = (
         "name",
         "token_pair_display",
@@ -257,6 +336,7 @@ class PoolAdmin(ModelAdmin):
         "fee_percentage",
         "status_display",
         "liquidity_info",
+        "orders_count",
     )
     list_display_links = ("name", "token_pair_display")
     search_fields = (
@@ -268,8 +348,8 @@ class PoolAdmin(ModelAdmin):
     )
     list_filter = (
         "is_active",
-        ("token1__network", admin.RelatedOnlyFieldListFilter),
-        ("token2__network", admin.RelatedOnlyFieldListFilter),
+        ("token1__network", RelatedOnlyListFilter),
+        ("token2__network", RelatedOnlyListFilter),
         "fee_percentage",
     )
     ordering = ("name",)
@@ -282,7 +362,7 @@ class PoolAdmin(ModelAdmin):
     )
 
     fieldsets = (
-        ("Basic Information", {"fields": ("name",)}),
+        ("Basic Information", {"fields": ("name", "loaded_version")}),
         (
             "Token Configuration",
             {
@@ -311,9 +391,28 @@ class PoolAdmin(ModelAdmin):
         return (
             super()
             .get_queryset(request)
-            .select_related("token1", "token2", "token1__network", "token2__network")
+            .select_related(
+                "token1", "token2", "token1__network", "token2__network", "stats"
+            )
+            .annotate(
+                _liquidity=F("token1_amount") + F("token2_amount"),
+                _orders_count=Coalesce(F("stats__orders_total"), 0),
+            )
         )
 
+    def changeform_view(self, request, object_id=None, form_url="", extra_context=None):
+        # Расчет мог сдвинуть резервы уже после проверки формы: UPDATE по
+        # версии не прошел, транзакция формы откатилась
+        try:
+            return super().changeform_view(request, object_id, form_url, extra_context)
+        except PoolVersionConflict:
+            self.message_user(
+                request,
+                "The pool was changed while saving. Reload the page and try again.",
+                level=messages.ERROR,
+            )
+            return redirect(request.path)
+
     def token_pair_display(self, obj):
         if not (obj.token1 and obj.token2):
             return "Tokens not set"
@@ -329,6 +428,7 @@ class PoolAdmin(ModelAdmin):
         )
 
     token_pair_display.short_description = "Token Pair"
+    token_pair_display.admin_order_field = "pair_key"
 
     def reserves_display(self, obj):
         if not (
@@ -351,6 +451,7 @@ class PoolAdmin(ModelAdmin):
         )
 
     reserves_display.short_description = "Reserves"
+    reserves_display.admin_order_field = "token1_amount"
 
     def exchange_rate_display(self, obj):
         if not (
@@ -383,6 +484,7 @@ class PoolAdmin(ModelAdmin):
         )
 
     status_display.short_description = "Status"
+    status_display.admin_order_field = "is_active"
 
     def liquidity_info(self, obj):
         if obj.token1_amount is None or obj.token2_amount is None:
@@ -403,6 +505,19 @@ class PoolAdmin(ModelAdmin):
             return format_html("${}", formatted_value)
 
     liquidity_info.short_description = "Liquidity"
+    liquidity_info.admin_order_field = "_liquidity"
+
+    def orders_count(self, obj):
+        count = getattr(obj, "_orders_count", 0)
+        if count > 0:
+            url = reverse("admin:exchange_exchangeorder_changelist") + (
+                f"?pool__id__exact={obj.id}"
+            )
+            return format_html('<a href="{}">{}</a>', url, count)
+        return "0"
+
+    orders_count.short_description = "Orders"
+    orders_count.admin_order_field = "_orders_count"
 
     def get_pool_analytics(self, obj):
         if not obj.pk:
@@ -449,32 +564,67 @@ class PoolAdmin(ModelAdmin):
         ):
             return "Set token amounts to see trading analytics"
 
-        # Sample swap calculations
-        test_amounts = [Decimal("1"), Decimal("10"), Decimal("100")]
-        results = []
-
-        for amount in test_amounts:
-            output = obj.get_output_amount(obj.token1, amount)
-            rate = output / amount if amount > 0 else Decimal("0")
-            results.append(
-                f"Swap {amount} {obj.token1.short_name} → {output:.4f} {obj.token2.short_name}"
+        # Depth curve in both directions
+        curve_rows = []
+        for curve in pool_depth(obj, points=8):
+            curve_rows.append(
+                format_html(
+                    "<tr><th colspan='4'>{} → {}</th></tr>",
+                    curve["input_token"],
+                    curve["output_token"],
+                )
+            )
+            curve_rows.append(
+                format_html_join(
+                    "",
+                    "<tr><td>{}</td><td>{}</td><td>{}</td><td>{}%</td></tr>",
+                    (
+                        (
+                            "{:,.4f}".format(amount),
+                            "{:,.4f}".format(output),
+                            "{:.6f}".format(rate),
+                            "{:.2f}".format(impact),
+                        )
+                        for amount, output, rate, impact in zip(
+                            curve["amounts"],
+                            curve["outputs"],
+                            curve["rates"],
+                            curve["price_impact"],
+                        )
+                    ),
+                )
             )
 
-        # Count orders using this pool
-        orders_count = ExchangeOrder.objects.filter(pool=obj).count()
-        pending_orders = ExchangeOrder.objects.filter(
-            pool=obj, status="pending"
-        ).count()
+        # Order counters maintained by exchange.services.stats
+        stats = getattr(obj, "stats", None) or PoolStats(pool=obj)
 
-        results_html = "<br>".join(results[:3])
         return format_html(
             "<strong>Trading Analytics:</strong><br>"
             "Total Orders: {}<br>"
             "Pending Orders: {}<br>"
-            "<br><strong>Sample Swaps:</strong><br>{}",
-            orders_count,
-            pending_orders,
-            mark_safe(results_html),
+            "Processing Orders: {}<br>"
+            "Completed Orders: {}<br>"
+            "Cancelled / Failed: {} / {}<br>"
+            "Volume {} → {}: {} {}<br>"
+            "Volume {} → {}: {} {}<br>"
+            "<br><strong>Depth Curve:</strong><br>"
+            "<table><tr><th>In</th><th>Out</th><th>Rate</th><th>Impact</th></tr>"
+            "{}</table>",
+            stats.orders_total,
+            stats.orders_pending,
+            stats.orders_processing,
+            stats.orders_completed,
+            stats.orders_cancelled,
+            stats.orders_failed,
+            obj.token1.short_name,
+            obj.token2.short_name,
+            "{:,.2f}".format(stats.volume_token1_in),
+            obj.token1.short_name,
+            obj.token2.short_name,
+            obj.token1.short_name,
+            "{:,.2f}".format(stats.volume_token2_in),
+            obj.token2.short_name,
+            mark_safe("".join(curve_rows)),
         )
 
     get_trading_analytics.short_description = "Trading Analytics"
@@ -483,12 +633,14 @@ class PoolAdmin(ModelAdmin):
 
     def activate_pools(self, request, queryset):
         updated = queryset.update(is_active=True)
+        pool_registry.invalidate()
         self.message_user(request, f"{updated} pools were activated.")
 
     activate_pools.short_description = "Activate selected pools"
 
     def deactivate_pools(self, request, queryset):
         updated = queryset.update(is_active=False)
+        pool_registry.invalidate()
         self.message_user(request, f"{updated} pools were deactivated.")
 
     deactivate_pools.short_description = "Deactivate selected pools"
@@ -517,20 +669,24 @@ class ExchangeOrderAdmin(ModelAdmin):
     )
     list_filter = (
         "status",
-        ("give_token", admin.RelatedOnlyFieldListFilter),
-        ("receive_token", admin.RelatedOnlyFieldListFilter),
-        ("pool", admin.RelatedOnlyFieldListFilter),
+        ("give_token", RelatedOnlyListFilter),
+        ("receive_token", RelatedOnlyListFilter),
+        ("pool", RelatedOnlyListFilter),
         "created_at",
         "updated_at",
     )
     ordering = ("-created_at",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = settings.EXCHANGE_ADMIN_FULL_RESULT_COUNT
     readonly_fields = (
         "id",
         "order_short_number",
+        "route",
         "created_at",
         "updated_at",
         "get_order_analytics",
         "get_financial_analytics",
+        "get_status_history",
     )
 
     fieldsets = (
@@ -543,6 +699,7 @@ class ExchangeOrderAdmin(ModelAdmin):
                     ("give_token", "give_amount"),
                     ("receive_token", "receive_amount"),
                     "pool",
+                    "route",
                 )
             },
         ),
@@ -555,6 +712,7 @@ class ExchangeOrderAdmin(ModelAdmin):
                 "classes": ("collapse",),
             },
         ),
+        ("Status History", {"fields": ("get_status_history",)}),
         (
             "Metadata",
             {"fields": ("created_at", "updated_at"), "classes": ("collapse",)},
@@ -574,10 +732,65 @@ class ExchangeOrderAdmin(ModelAdmin):
             )
         )
 
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_readonly_fields(self, request, obj=None):
+        # Статус существующей заявки меняется только действиями списка
+        if obj is not None:
+            return (*self.readonly_fields, "status")
+        return self.readonly_fields
+
+    # Куда archive_orders переносит старые заявки этого списка
+    archive_model = ArchivedOrder
+
+    def changelist_view(self, request, extra_context=None):
+        search = request.GET.get(SEARCH_VAR, "").strip()
+        if request.method == "GET" and search and self.archive_model is not None:
+            self._notify_archived_matches(request, search)
+        return super().changelist_view(request, extra_context)
+
+    def _notify_archived_matches(self, request, search):
+        archive_admin = self.admin_site.get_model_admin(self.archive_model)
+        queryset, _ = archive_admin.get_search_results(
+            request, self.archive_model.objects.all(), search
+        )
+        count, exact = estimate_count(queryset, settings.EXCHANGE_ADMIN_COUNT_LIMIT)
+        if not count:
+            return
+
+        opts = self.archive_model._meta
+        url = reverse(f"admin:{opts.app_label}_{opts.model_name}_changelist")
+        self.message_user(
+            request,
+            format_html(
+                '{}{} archived orders match "{}": <a href="{}?{}">open the archive</a>',
+                count,
+                "" if exact else "+",
+                search,
+                url,
+                urlencode({SEARCH_VAR: search}),
+            ),
+            level=messages.INFO,
+        )
+
+    def change_view(self, request, object_id, form_url="", extra_context=None):
+        # Старые ссылки на заявку ведут в архив, если ее туда перенесли
+        archivable = self.archive_model is not None
+        if archivable and self.get_object(request, unquote(object_id)) is None:
+            archive_admin = self.admin_site.get_model_admin(self.archive_model)
+            if archive_admin.get_object(request, unquote(object_id)) is not None:
+                opts = self.archive_model._meta
+                return redirect(
+                    f"admin:{opts.app_label}_{opts.model_name}_change", object_id
+                )
+        return super().change_view(request, object_id, form_url, extra_context)
+
     def order_number_display(self, obj):
         return format_html("<strong>#{}</strong>", obj.order_short_number)
 
     order_number_display.short_description = "Order #"
+    order_number_display.admin_order_field = "id"
 
     def status_display(self, obj):
         status_colors = {
@@ -596,11 +809,13 @@ class ExchangeOrderAdmin(ModelAdmin):
         )
 
     status_display.short_description = "Status"
+    status_display.admin_order_field = "status"
 
     def user_email(self, obj):
         return obj.email
 
     user_email.short_description = "Email"
+    user_email.admin_order_field = "email"
 
     def exchange_summary_display(self, obj):
         give_formatted = "{:,.0f}".format(obj.give_amount)
@@ -631,6 +846,7 @@ class ExchangeOrderAdmin(ModelAdmin):
         return format_html("{}%", obj.fee_percentage)
 
     fee_display.short_description = "Fee"
+    fee_display.admin_order_field = "fee_percentage"
 
     def pool_link(self, obj):
         if not obj.pool:
@@ -640,6 +856,7 @@ class ExchangeOrderAdmin(ModelAdmin):
         return format_html('<a href="{}">{}</a>', url, obj.pool.name)
 
     pool_link.short_description = "Pool"
+    pool_link.admin_order_field = "pool__name"
 
     def get_order_analytics(self, obj):
         if not obj.pk:
@@ -717,81 +934,325 @@ class ExchangeOrderAdmin(ModelAdmin):
 
     get_financial_analytics.short_description = "Financial Analytics"
 
+    def get_status_history(self, obj):
+        if not obj.pk:
+            return "No status changes yet"
+
+        events = order_history(obj.pk)
+        if not events:
+            return "No status changes yet"
+
+        return format_html_join(
+            mark_safe("<br>"),
+            "{} &nbsp; {} → {} &nbsp; {}",
+            (
+                (
+                    event.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+                    event.get_from_status_display(),
+                    event.get_to_status_display(),
+                    event.actor or event.note or "system",
+                )
+                for event in events
+            ),
+        )
+
+    get_status_history.short_description = "Status History"
+
     actions = [
         "mark_as_processing",
         "mark_as_completed",
         "mark_as_cancelled",
         "mark_as_failed",
         "export_selected_orders",
+        "export_selected_orders_gzip",
     ]
 
+    def _transition(self, request, queryset, status):
+        try:
+            updated, skipped = transition_orders(queryset, status, actor=request.user)
+        except TransitionConflict as e:
+            self.message_user(
+                request,
+                f"Orders changed while being updated, nothing was changed: {e}. "
+                "Reload the page and try again.",
+                level=messages.ERROR,
+            )
+            return
+
+        self.message_user(request, f"{updated} orders marked as {status}.")
+        if skipped:
+            self.message_user(
+                request,
+                f"{skipped} orders were skipped: they cannot move to {status}.",
+                level=messages.WARNING,
+            )
+
     def mark_as_processing(self, request, queryset):
-        updated = queryset.update(status="processing")
-        self.message_user(request, f"{updated} orders marked as processing.")
+        self._transition(request, queryset, "processing")
 
     mark_as_processing.short_description = "Mark selected orders as processing"
 
     def mark_as_completed(self, request, queryset):
-        updated = queryset.update(status="completed")
-        self.message_user(request, f"{updated} orders marked as completed.")
+        # Заявки завершаются пачками по пулам; settle_batch сам перечитывает
+        # нужные поля под блокировкой
+        orders = (
+            queryset.filter(status__in=SETTLEABLE_STATUSES)
+            .select_related(None)
+            .only("id", "pool_id")
+        )
+        settled, errors = settle_orders(orders, actor=request.user)
+        self.message_user(request, f"{settled} orders marked as completed.")
+
+        for order, error in errors:
+            self.message_user(
+                request,
+                f"Order #{order.order_short_number} was not settled: {error}",
+                level=messages.WARNING,
+            )
 
     mark_as_completed.short_description = "Mark selected orders as completed"
 
     def mark_as_cancelled(self, request, queryset):
-        updated = queryset.update(status="cancelled")
-        self.message_user(request, f"{updated} orders marked as cancelled.")
+        self._transition(request, queryset, "cancelled")
 
     mark_as_cancelled.short_description = "Mark selected orders as cancelled"
 
     def mark_as_failed(self, request, queryset):
-        updated = queryset.update(status="failed")
-        self.message_user(request, f"{updated} orders marked as failed.")
+        self._transition(request, queryset, "failed")
 
     mark_as_failed.short_description = "Mark selected orders as failed"
 
-    def export_selected_orders(self, request, queryset):
-        import csv
-        from django.http import HttpResponse
-
-        response = HttpResponse(content_type="text/csv")
-        response["Content-Disposition"] = 'attachment; filename="exchange_orders.csv"'
-
-        writer = csv.writer(response)
-        writer.writerow(
-            [
-                "Order ID",
-                "Status",
-                "Email",
-                "Wallet",
-                "Give Token",
-                "Give Amount",
-                "Receive Token",
-                "Receive Amount",
-                "Exchange Rate",
-                "Fee %",
-                "Created At",
-                "Transaction Hash",
-            ]
-        )
-
-        for order in queryset:
-            writer.writerow(
-                [
-                    order.order_short_number,
-                    order.get_status_display(),
-                    order.email,
-                    order.give_token.short_name,
-                    order.give_amount,
-                    order.receive_token.short_name,
-                    order.receive_amount,
-                    order.exchange_rate,
-                    order.fee_percentage,
-                    order.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-                    order.transaction_hash or "N/A",
-                ]
-            )
+    def _export_response(self, queryset, compress):
+        chunks = csv_chunks(order_rows(queryset.select_related(None)))
+        filename = "exchange_orders.csv"
+        if compress:
+            chunks = gzip_chunks(chunks)
+            filename += ".gz"
 
-        self.message_user(request, f"Exported {queryset.count()} orders to CSV.")
+        response = StreamingHttpResponse(
+            chunks,
+            content_type="application/gzip" if compress else "text/csv",
+        )
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
         return response
 
+    def export_selected_orders(self, request, queryset):
+        return self._export_response(queryset, compress=False)
+
     export_selected_orders.short_description = "Export selected orders to CSV"
+
+    def export_selected_orders_gzip(self, request, queryset):
+        return self._export_response(queryset, compress=True)
+
+    export_selected_orders_gzip.short_description = (
+        "Export selected orders to CSV (gzip)"
+    )
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(ExchangeOrderAdmin):
+    """
+    Архив только для просмотра. Поиск - по точному email или id заявки,
+    чтобы не сканировать архив целиком.
+    """
+
+    archive_model = None
+    list_filter = ("status", ("pool", RelatedOnlyListFilter), "created_at")
+    search_fields = ("email",)
+    search_help_text = "Exact email or order ID"
+    readonly_fields = (*ExchangeOrderAdmin.readonly_fields, "archived_at")
+    fieldsets = (
+        *ExchangeOrderAdmin.fieldsets[:-1],
+        (
+            "Metadata",
+            {
+                "fields": ("created_at", "updated_at", "archived_at"),
+                "classes": ("collapse",),
+            },
+        ),
+    )
+    actions = ["export_selected_orders", "export_selected_orders_gzip"]
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+
+        lookup = Q(email=search_term)
+        try:
+            lookup |= Q(pk=uuid.UUID(search_term))
+        except ValueError:
+            pass
+        return queryset.filter(lookup), False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(ModelAdmin):
+    list_display = (
+        "job_display",
+        "date_range_display",
+        "order_status",
+        "pool",
+        "status_display",
+        "progress_display",
+        "download_link",
+        "created_at",
+    )
+    list_filter = ("status", "order_status", "created_at")
+    ordering = ("-created_at",)
+    readonly_fields = (
+        "id",
+        "status",
+        "requested_by",
+        "progress_display",
+        "rows_written",
+        "bytes_written",
+        "download_link",
+        "error",
+        "heartbeat_at",
+        "finished_at",
+        "created_at",
+        "updated_at",
+    )
+
+    fieldsets = (
+        ("Orders", {"fields": (("date_from", "date_to"), "order_status", "pool")}),
+        (
+            "Progress",
+            {
+                "fields": (
+                    "status",
+                    "progress_display",
+                    ("rows_written", "bytes_written"),
+                    "download_link",
+                    "error",
+                )
+            },
+        ),
+        (
+            "Metadata",
+            {
+                "fields": (
+                    "id",
+                    "requested_by",
+                    "heartbeat_at",
+                    "finished_at",
+                    "created_at",
+                    "updated_at",
+                ),
+                "classes": ("collapse",),
+            },
+        ),
+    )
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("pool")
+
+    def get_readonly_fields(self, request, obj=None):
+        # Фильтры уже запущенного задания не меняются: курсор относится к ним
+        if obj is not None:
+            return (
+                *self.readonly_fields,
+                "date_from",
+                "date_to",
+                "order_status",
+                "pool",
+            )
+        return self.readonly_fields
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.requested_by = request.user
+        super().save_model(request, obj, form, change)
+
+    def get_urls(self):
+        return [
+            path(
+                "<uuid:pk>/download/",
+                self.admin_site.admin_view(self.download_view),
+                name="exchange_exportjob_download",
+            ),
+            *super().get_urls(),
+        ]
+
+    def download_view(self, request, pk):
+        job = get_object_or_404(ExportJob, pk=pk, status="completed")
+        if not self.has_view_permission(request, job):
+            raise Http404
+        if not job.file or not job.file.storage.exists(job.file.name):
+            raise Http404("Export file is missing")
+
+        return FileResponse(
+            job.file.open("rb"),
+            as_attachment=True,
+            filename=f"exchange_orders_{job.date_from}_{job.date_to}.csv.gz",
+            content_type="application/gzip",
+        )
+
+    def job_display(self, obj):
+        return format_html("<strong>#{}</strong>", str(obj.id)[:8].upper())
+
+    job_display.short_description = "Job #"
+    job_display.admin_order_field = "created_at"
+
+    def date_range_display(self, obj):
+        return f"{obj.date_from} – {obj.date_to}"
+
+    date_range_display.short_description = "Dates"
+    date_range_display.admin_order_field = "date_from"
+
+    def status_display(self, obj):
+        status_colors = {
+            "pending": "#ff9800",
+            "running": "#2196f3",
+            "completed": "#4caf50",
+            "failed": "#f44336",
+        }
+        return format_html(
+            '<span style="color: {}; font-weight: bold;">{}</span>',
+            status_colors.get(obj.status, "#000000"),
+            obj.get_status_display(),
+        )
+
+    status_display.short_description = "Status"
+    status_display.admin_order_field = "status"
+
+    def progress_display(self, obj):
+        progress = obj.progress
+        if progress is None:
+            return "Not started"
+        return "{:.1f}% ({:,} / {:,} orders)".format(
+            progress, obj.rows_written, obj.total_rows
+        )
+
+    progress_display.short_description = "Progress"
+
+    def download_link(self, obj):
+        if obj.status != "completed":
+            return "-"
+
+        url = reverse("admin:exchange_exportjob_download", args=[obj.pk])
+        size = "{:,.1f} KB".format(obj.bytes_written / 1024)
+        return format_html('<a href="{}">Download</a> ({})', url, size)
+
+    download_link.short_description = "File"
+
+    actions = ["retry_jobs"]
+
+    def retry_jobs(self, request, queryset):
+        updated = queryset.filter(status="failed").update(status="pending", error="")
+        self.message_user(
+            request,
+            f"{updated} export jobs queued again; they resume from the last chunk.",
+        )
+
+    retry_jobs.short_description = "Retry selected failed jobs"
@@ -0,0 +1,11 @@
+from django.conf import settings
+
+from exchange.services.catalog import catalog_version
+
+
+def catalog(request):
+    # Функция, а не значение: шаблон вызовет ее, только если дойдет до {% cache %}
+    return {
+        "catalog_version": catalog_version,
+        "catalog_fragment_ttl": settings.EXCHANGE_CATALOG_FRAGMENT_TTL,
+    }
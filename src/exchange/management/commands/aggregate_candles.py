@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from exchange.services.history import aggregate_candles, compact_history
+
+
+class Command(BaseCommand):
+    help = "Roll pool reserve snapshots up into 1m/1h/1d candles and compact history"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--no-compact",
+            action="store_true",
+            help="Keep raw snapshots and old minute candles",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Repeat every N seconds instead of running once",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            written = aggregate_candles()
+            summary = ", ".join(f"{k}: {v}" for k, v in written.items())
+            self.stdout.write(f"Candles written ({summary})")
+
+            if not options["no_compact"]:
+                snapshots, candles = compact_history()
+                self.stdout.write(
+                    f"Compacted {snapshots} snapshots, {candles} minute candles"
+                )
+
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
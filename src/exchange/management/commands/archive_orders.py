@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from exchange.services.archive import archive_orders
+
+
+class Command(BaseCommand):
+    help = (
+        "Move completed, cancelled and failed orders older than the retention "
+        "window into the archive table"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=settings.EXCHANGE_ORDER_RETENTION_DAYS,
+            help="Keep terminal orders this many days in the hot table",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.EXCHANGE_ARCHIVE_BATCH_SIZE,
+            help="Orders moved per transaction",
+        )
+        parser.add_argument(
+            "--max-batches", type=int, default=None, help="Stop after this many"
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=None,
+            help="Keep running and archive every N seconds instead of exiting",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            archived = archive_orders(
+                retention_days=options["retention_days"],
+                batch_size=options["batch_size"],
+                max_batches=options["max_batches"],
+            )
+            self.stdout.write(f"Archived {archived} orders")
+
+            if options["interval"] is None:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,75 @@
+import timeit
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from exchange.models import Network, Pool, Token
+from exchange.services.amm import from_base_units, to_base_units
+
+
+class Command(BaseCommand):
+    help = "Compare the Decimal Pool.get_output_amount path with the integer AMM engine"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--number", type=int, default=100_000)
+        parser.add_argument("--decimals", type=int, default=9)
+
+    def handle(self, *args, **options):
+        number = options["number"]
+        decimals = options["decimals"]
+
+        network = Network(name="Bench", short_name="BENCH")
+        token1 = Token(name="Tether", short_name="USDT", network=network, decimals=6)
+        token2 = Token(
+            name="Toncoin", short_name="TON", network=network, decimals=decimals
+        )
+        pool = Pool(
+            name="USDT/TON",
+            token1=token1,
+            token2=token2,
+            token1_amount=Decimal("3000000.00"),
+            token2_amount=Decimal("1000000.00"),
+            fee_percentage=Decimal("1.3"),
+        )
+
+        amount = Decimal("1000.55")
+        state = pool.amm_state
+        units = to_base_units(amount, token1.decimals)
+
+        benchmarks = (
+            (
+                "Decimal Pool.get_output_amount",
+                lambda: pool.get_output_amount(token1, amount),
+            ),
+            (
+                "Integer engine (base units)",
+                lambda: state.get_output_amount(token1.pk, units),
+            ),
+            (
+                "Integer engine (with conversion)",
+                lambda: from_base_units(
+                    state.get_output_amount(
+                        token1.pk, to_base_units(amount, token1.decimals)
+                    ),
+                    token2.decimals,
+                ),
+            ),
+        )
+
+        self.stdout.write(
+            f"Swap {amount} {token1.short_name} -> {token2.short_name}, {number} iterations"
+        )
+        self.stdout.write(f"  Decimal result: {pool.get_output_amount(token1, amount)}")
+        self.stdout.write(
+            "  Integer result: "
+            f"{from_base_units(state.get_output_amount(token1.pk, units), token2.decimals)}"
+        )
+
+        baseline = None
+        for name, func in benchmarks:
+            seconds = min(timeit.repeat(func, number=number, repeat=3))
+            per_call = seconds / number * 1e9
+            baseline = baseline or per_call
+            self.stdout.write(
+                f"  {name:<34} {per_call:>8.0f} ns/call  x{baseline / per_call:.1f}"
+            )
@@ -0,0 +1,249 @@
+import random
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from exchange.models import ExchangeOrder, Network, Pool, Token
+from exchange.services.settlement import settleable_orders
+
+# Индексы ExchangeOrder до 0010_exchangeorder_workload_indexes
+LEGACY_INDEXES = [
+    models.Index(fields=["status"], name="exchange_ex_status_a4e84c_idx"),
+    models.Index(fields=["email"], name="exchange_ex_email_0c64a4_idx"),
+    models.Index(fields=["created_at"], name="exchange_ex_created_5846d5_idx"),
+]
+
+ORDER_COLUMNS = [
+    "id",
+    "created_at",
+    "updated_at",
+    "email",
+    "give_token",
+    "give_amount",
+    "receive_token",
+    "receive_amount",
+    "status",
+    "pool",
+]
+
+STATUS_WEIGHTS = {
+    "completed": 90,
+    "cancelled": 4,
+    "failed": 2,
+    "pending": 3,
+    "processing": 1,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare query plans and timings of the ExchangeOrder workload with the "
+        "legacy single-column indexes and the current composite/partial ones. "
+        "Runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=2_000_000)
+        parser.add_argument("--pools", type=int, default=20)
+        parser.add_argument("--customers", type=int, default=50_000)
+        parser.add_argument("--days", type=int, default=365)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--plans", action="store_true", help="Print the full query plans"
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        random.seed(options["seed"])
+
+        # SQLite не меняет индексы внутри транзакции с включенной проверкой FK
+        connection.disable_constraint_checking()
+        try:
+            self._run()
+        finally:
+            connection.enable_constraint_checking()
+
+    def _run(self):
+        options = self.options
+        with transaction.atomic():
+            pools = self._create_pools(options["pools"])
+            started = time.perf_counter()
+            self._create_orders(pools)
+            self.stdout.write(
+                f"Inserted {options['orders']} orders in "
+                f"{time.perf_counter() - started:.1f}s"
+            )
+
+            workloads = self._workloads(pools)
+            with connection.schema_editor() as editor:
+                for index in ExchangeOrder._meta.indexes:
+                    editor.remove_index(ExchangeOrder, index)
+                for index in LEGACY_INDEXES:
+                    editor.add_index(ExchangeOrder, index)
+            before = self._measure("legacy indexes", workloads)
+
+            with connection.schema_editor() as editor:
+                for index in LEGACY_INDEXES:
+                    editor.remove_index(ExchangeOrder, index)
+                for index in ExchangeOrder._meta.indexes:
+                    editor.add_index(ExchangeOrder, index)
+            after = self._measure("workload indexes", workloads)
+
+            self.stdout.write("\nSummary (best of %d runs):" % options["repeat"])
+            for name in workloads:
+                speedup = before[name] / after[name] if after[name] else float("inf")
+                self.stdout.write(
+                    f"  {name:<28} {before[name] * 1000:>10.2f} ms "
+                    f"-> {after[name] * 1000:>10.2f} ms  (x{speedup:.1f})"
+                )
+
+            transaction.set_rollback(True)
+
+    def _create_pools(self, count):
+        network = Network.objects.create(name="Bench", short_name="BENCH")
+        tokens = [
+            Token.objects.create(
+                name=f"Bench token {i}", short_name=f"BT{i}", network=network
+            )
+            for i in range(count + 1)
+        ]
+        return [
+            Pool.objects.create(
+                name=f"BT{i}/BT{i + 1}",
+                token1=tokens[i],
+                token2=tokens[i + 1],
+                token1_amount=Decimal("1000000"),
+                token2_amount=Decimal("1000000"),
+            )
+            for i in range(count)
+        ]
+
+    def _create_orders(self, pools):
+        """
+        Заявки вставляются напрямую в таблицу: bulk_create перезаписал бы
+        created_at (auto_now_add) и строил бы по экземпляру модели на строку
+        """
+        opts = ExchangeOrder._meta
+        ops = connection.ops
+        constants = {
+            "exchange_rate": Decimal("1.00"),
+            "fee_percentage": Decimal("0.30"),
+            "route": [],
+            "transaction_hash": None,
+        }
+        fields = [opts.get_field(name) for name in ORDER_COLUMNS + list(constants)]
+        sql = "INSERT INTO %s (%s) VALUES (%s)" % (
+            ops.quote_name(opts.db_table),
+            ", ".join(ops.quote_name(field.column) for field in fields),
+            ", ".join(["%s"] * len(fields)),
+        )
+        constant_values = [
+            opts.get_field(name).get_db_prep_save(value, connection)
+            for name, value in constants.items()
+        ]
+
+        # Ключи пулов и токенов в представлении БД (UUID на SQLite - строка)
+        pool_keys = [
+            [
+                opts.get_field(name).get_db_prep_value(value, connection)
+                for name, value in (
+                    ("give_token", pool.token1_id),
+                    ("receive_token", pool.token2_id),
+                    ("pool", pool.pk),
+                )
+            ]
+            for pool in pools
+        ]
+
+        now = timezone.now()
+        span = int(timedelta(days=self.options["days"]).total_seconds())
+        statuses = random.choices(
+            list(STATUS_WEIGHTS),
+            weights=list(STATUS_WEIGHTS.values()),
+            k=self.options["orders"],
+        )
+
+        batch = []
+        with connection.cursor() as cursor:
+            for status in statuses:
+                give_token, receive_token, pool = random.choice(pool_keys)
+                created_at = ops.adapt_datetimefield_value(
+                    now - timedelta(seconds=random.randrange(span))
+                )
+                batch.append(
+                    [
+                        opts.pk.get_db_prep_value(uuid.uuid4(), connection),
+                        created_at,
+                        created_at,
+                        f"user{random.randrange(self.options['customers'])}@example.com",
+                        give_token,
+                        ops.adapt_decimalfield_value(
+                            Decimal(random.randrange(1, 100_000)), 15, 2
+                        ),
+                        receive_token,
+                        ops.adapt_decimalfield_value(
+                            Decimal(random.randrange(1, 100_000)), 15, 2
+                        ),
+                        status,
+                        pool,
+                        *constant_values,
+                    ]
+                )
+                if len(batch) >= self.options["batch_size"]:
+                    cursor.executemany(sql, batch)
+                    batch = []
+            if batch:
+                cursor.executemany(sql, batch)
+
+    def _workloads(self, pools):
+        orders = ExchangeOrder.objects.all()
+        oldest = orders.order_by("created_at").values_list("created_at", "id")[
+            self.options["orders"] // 2
+        ]
+        return {
+            "admin: status + date": orders.filter(status="failed").order_by(
+                "-created_at"
+            )[:100],
+            "admin: keyset page": orders.filter(
+                Q(created_at__lt=oldest[0]) | Q(created_at=oldest[0], id__lt=oldest[1])
+            ).order_by("-created_at", "-id")[:101],
+            "pool analytics": orders.filter(pool=pools[0])
+            .values("status")
+            .annotate(count=Count("id"))
+            .order_by(),
+            "customer order history": orders.filter(
+                email="user42@example.com"
+            ).order_by("-created_at")[:20],
+            "settlement queue scan": settleable_orders()
+            .order_by("created_at")
+            .only("id", "pool_id", "created_at")[:4000],
+        }
+
+    def _measure(self, label, workloads):
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {ExchangeOrder._meta.db_table}")
+
+        self.stdout.write(f"\n== {label} ==")
+        timings = {}
+        for name, queryset in workloads.items():
+            plan = queryset.explain()
+            runs = []
+            for _ in range(self.options["repeat"]):
+                started = time.perf_counter()
+                list(queryset.all())
+                runs.append(time.perf_counter() - started)
+            timings[name] = min(runs)
+
+            self.stdout.write(f"{name}: {timings[name] * 1000:.2f} ms")
+            lines = plan.splitlines()
+            for line in lines if self.options["plans"] else lines[:3]:
+                self.stdout.write(f"    {line}")
+        return timings
@@ -0,0 +1,162 @@
+import json
+import statistics
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from exchange.models import Network, Pool, Token
+
+SESSION_ENGINES = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure homepage and calculate-exchange throughput for a logged-in "
+        "client under each session backend. Creates a bench user, network, "
+        "tokens and pool and deletes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=400)
+        parser.add_argument("--threads", type=int, default=4)
+        parser.add_argument(
+            "--engines",
+            nargs="+",
+            choices=list(SESSION_ENGINES),
+            default=list(SESSION_ENGINES),
+        )
+        parser.add_argument(
+            "--save-every-request",
+            action="store_true",
+            help="Write the session on every response (SESSION_SAVE_EVERY_REQUEST)",
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.session_keys = set()
+        self.user, self.network, tokens = self._create_fixtures()
+        payload = json.dumps(
+            {
+                "give_token_id": str(tokens[0].pk),
+                "receive_token_id": str(tokens[1].pk),
+                "amount": "100",
+            }
+        )
+        endpoints = {
+            "homepage": lambda client: client.get(reverse("core:index")),
+            "calculate-exchange": lambda client: client.post(
+                reverse("exchange:calculate_exchange_api"),
+                payload,
+                content_type="application/json",
+            ),
+        }
+
+        results = {}
+        try:
+            for engine in options["engines"]:
+                with override_settings(
+                    SESSION_ENGINE=SESSION_ENGINES[engine],
+                    SESSION_SAVE_EVERY_REQUEST=options["save_every_request"],
+                ):
+                    for name, request in endpoints.items():
+                        results[engine, name] = self._measure(request)
+                        rps, p95 = results[engine, name]
+                        self.stdout.write(
+                            f"{engine:<16} {name:<20} {rps:>8.1f} req/s  "
+                            f"p95 {p95 * 1000:>7.2f} ms"
+                        )
+        finally:
+            self._cleanup()
+
+        baseline = options["engines"][0]
+        self.stdout.write(f"\nThroughput relative to {baseline}:")
+        for engine in options["engines"]:
+            for name in endpoints:
+                ratio = results[engine, name][0] / results[baseline, name][0]
+                self.stdout.write(f"  {engine:<16} {name:<20} x{ratio:.2f}")
+
+    def _create_fixtures(self):
+        suffix = uuid.uuid4().hex[:8]
+        user = get_user_model().objects.create_user(
+            email=f"bench-{suffix}@example.com",
+            username=f"bench-{suffix}",
+            password=uuid.uuid4().hex,
+        )
+        network = Network.objects.create(name=f"Bench {suffix}", short_name="BENCH")
+        tokens = [
+            Token.objects.create(name=f"Bench {name}", short_name=name, network=network)
+            for name in ("BUSD", "BTON")
+        ]
+        Pool.objects.create(
+            name="BUSD/BTON",
+            token1=tokens[0],
+            token2=tokens[1],
+            token1_amount=Decimal("3000000.00"),
+            token2_amount=Decimal("1000000.00"),
+        )
+        return user, network, tokens
+
+    def _client(self):
+        client = Client()
+        client.force_login(self.user)
+        self.session_keys.add(client.cookies[settings.SESSION_COOKIE_NAME].value)
+        return client
+
+    def _measure(self, request):
+        threads = self.options["threads"]
+        per_thread = max(self.options["requests"] // threads, 1)
+        clients = [self._client() for _ in range(threads)]
+        for client in clients:
+            request(client)
+
+        latencies = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(threads + 1)
+
+        def worker(client):
+            timings = []
+            try:
+                barrier.wait()
+                for _ in range(per_thread):
+                    started = time.perf_counter()
+                    response = request(client)
+                    timings.append(time.perf_counter() - started)
+                    if response.status_code != 200:
+                        raise RuntimeError(f"HTTP {response.status_code}")
+            finally:
+                connection.close()
+                with lock:
+                    latencies.extend(timings)
+
+        workers = [
+            threading.Thread(target=worker, args=(client,)) for client in clients
+        ]
+        for thread in workers:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else 0
+        return len(latencies) / elapsed, p95
+
+    def _cleanup(self):
+        # Сеть удаляет каскадом токены, пул и их статистику
+        self.network.delete()
+        self.user.delete()
+        Session.objects.filter(session_key__in=self.session_keys).delete()
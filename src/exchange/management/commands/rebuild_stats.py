@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from exchange.services.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = "Recount pool, token and network stats counters from scratch"
+
+    def handle(self, *args, **options):
+        rebuild_stats()
+        self.stdout.write("Stats rebuilt")
@@ -0,0 +1,34 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from exchange.services.export_jobs import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued order export jobs, resuming interrupted ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=settings.EXCHANGE_EXPORT_JOB_CHUNK_SIZE,
+            help="Orders written per committed chunk",
+        )
+        parser.add_argument("--poll-interval", type=float, default=5.0)
+        parser.add_argument(
+            "--once", action="store_true", help="Run the queued jobs and exit"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            completed, failed = run_pending_jobs(options["chunk_size"])
+            if completed or failed:
+                self.stdout.write(
+                    f"Export jobs: {completed} completed, {failed} failed"
+                )
+
+            if options["once"]:
+                break
+            time.sleep(options["poll_interval"])
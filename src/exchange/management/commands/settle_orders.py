@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from exchange.services.settlement_worker import SettlementWorker
+
+
+class Command(BaseCommand):
+    help = "Settle pending exchange orders in per-pool batches with flow netting"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.EXCHANGE_SETTLEMENT_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--max-latency",
+            type=float,
+            default=settings.EXCHANGE_SETTLEMENT_MAX_LATENCY,
+            help="Seconds an order may wait for its batch to fill up",
+        )
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+        parser.add_argument(
+            "--once", action="store_true", help="Run a single pass and exit"
+        )
+
+    def handle(self, *args, **options):
+        worker = SettlementWorker(
+            batch_size=options["batch_size"], max_latency=options["max_latency"]
+        )
+
+        if options["once"]:
+            self._report(worker.run_once())
+            return
+
+        total = worker.run(
+            poll_interval=options["poll_interval"],
+            report=self._report,
+        )
+        self._report(total)
+
+    def _report(self, stats, total=None):
+        self.stdout.write(f"Settled {stats}")
+        if total is not None:
+            self.stdout.write(f"  total: {total}")
@@ -0,0 +1,12 @@
+from django.db import models
+
+
+class PoolManager(models.Manager):
+    def for_pair(self, token_a, token_b):
+        return self.filter(pair_key=self.model.build_pair_key(token_a, token_b))
+
+    def for_token(self, token):
+        return self.filter(models.Q(token1=token) | models.Q(token2=token))
+
+    def active(self):
+        return self.filter(is_active=True)
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 01:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exchange", "0003_alter_exchangeorder_options_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="exchangeorder",
+            name="route",
+            field=models.JSONField(
+                blank=True,
+                default=list,
+                help_text="Swap legs for orders routed through several pools",
+                verbose_name="Route",
+            ),
+        ),
+    ]
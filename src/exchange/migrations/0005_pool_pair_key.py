@@ -0,0 +1,60 @@
+from django.db import migrations, models
+
+
+def backfill_pair_keys(apps, schema_editor):
+    Pool = apps.get_model("exchange", "Pool")
+
+    seen = {}
+    for pool in Pool.objects.order_by("created_at").only("id", "token1", "token2"):
+        pair_key = ":".join(sorted((str(pool.token1_id), str(pool.token2_id))))
+        if pair_key in seen:
+            raise RuntimeError(
+                f"Pools {seen[pair_key]} and {pool.id} trade the same token pair; "
+                "merge or delete one of them before migrating"
+            )
+        seen[pair_key] = pool.id
+        Pool.objects.filter(pk=pool.pk).update(pair_key=pair_key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exchange", "0004_exchangeorder_route"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pool",
+            name="pair_key",
+            field=models.CharField(
+                editable=False,
+                help_text="Token ids of the pair in canonical order",
+                max_length=73,
+                null=True,
+                verbose_name="Pair key",
+            ),
+        ),
+        migrations.RunPython(backfill_pair_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="pool",
+            name="pair_key",
+            field=models.CharField(
+                editable=False,
+                help_text="Token ids of the pair in canonical order",
+                max_length=73,
+                verbose_name="Pair key",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="pool",
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name="pool",
+            constraint=models.UniqueConstraint(
+                fields=("pair_key",),
+                name="unique_pool_pair_key",
+                violation_error_message="A pool for this token pair already exists",
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 01:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exchange", "0005_pool_pair_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pool",
+            name="version",
+            field=models.PositiveBigIntegerField(
+                default=0,
+                editable=False,
+                help_text="Bumped on every reserve update by settlement",
+                verbose_name="Version",
+            ),
+        ),
+    ]
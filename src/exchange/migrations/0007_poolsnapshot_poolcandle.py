@@ -0,0 +1,156 @@
+# Generated by Django 5.2 on 2026-10-18 01:42
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exchange", "0006_pool_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PoolCandle",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "interval",
+                    models.CharField(
+                        choices=[("1m", "1 minute"), ("1h", "1 hour"), ("1d", "1 day")],
+                        max_length=2,
+                        verbose_name="Interval",
+                    ),
+                ),
+                ("bucket_start", models.DateTimeField(verbose_name="Bucket start")),
+                (
+                    "open",
+                    models.DecimalField(
+                        decimal_places=12, max_digits=30, verbose_name="Open"
+                    ),
+                ),
+                (
+                    "high",
+                    models.DecimalField(
+                        decimal_places=12, max_digits=30, verbose_name="High"
+                    ),
+                ),
+                (
+                    "low",
+                    models.DecimalField(
+                        decimal_places=12, max_digits=30, verbose_name="Low"
+                    ),
+                ),
+                (
+                    "close",
+                    models.DecimalField(
+                        decimal_places=12, max_digits=30, verbose_name="Close"
+                    ),
+                ),
+                (
+                    "snapshots_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Snapshots count"
+                    ),
+                ),
+                (
+                    "pool",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="candles",
+                        to="exchange.pool",
+                        verbose_name="Pool",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Pool Candle",
+                "verbose_name_plural": "Pool Candles",
+                "ordering": ["-bucket_start"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("pool", "interval", "bucket_start"),
+                        name="unique_pool_candle_bucket",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="PoolSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "token1_amount",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=15, verbose_name="Token A reserve"
+                    ),
+                ),
+                (
+                    "token2_amount",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=15, verbose_name="Token B reserve"
+                    ),
+                ),
+                (
+                    "rate",
+                    models.DecimalField(
+                        decimal_places=12,
+                        help_text="Token B per 1 token A",
+                        max_digits=30,
+                        verbose_name="Rate",
+                    ),
+                ),
+                (
+                    "version",
+                    models.PositiveBigIntegerField(verbose_name="Pool version"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="Created at"
+                    ),
+                ),
+                (
+                    "pool",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="snapshots",
+                        to="exchange.pool",
+                        verbose_name="Pool",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Pool Snapshot",
+                "verbose_name_plural": "Pool Snapshots",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["pool", "created_at"],
+                        name="exchange_po_pool_id_5817cb_idx",
+                    ),
+                    models.Index(
+                        fields=["created_at"], name="exchange_po_created_55b09c_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,173 @@
+# Generated by Django 5.2 on 2026-10-18 01:45
+
+import django.db.models.deletion
+from decimal import Decimal
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def backfill_stats(apps, schema_editor):
+    Network = apps.get_model("exchange", "Network")
+    Token = apps.get_model("exchange", "Token")
+    Pool = apps.get_model("exchange", "Pool")
+    ExchangeOrder = apps.get_model("exchange", "ExchangeOrder")
+    NetworkStats = apps.get_model("exchange", "NetworkStats")
+    TokenStats = apps.get_model("exchange", "TokenStats")
+    PoolStats = apps.get_model("exchange", "PoolStats")
+
+    tokens = Counter()
+    networks = Counter()
+    pools = {}
+    for pool in Pool.objects.select_related("token1", "token2"):
+        tokens.update({pool.token1_id, pool.token2_id})
+        networks.update({pool.token1.network_id, pool.token2.network_id})
+        pools[pool.pk] = (pool.token1_id, PoolStats(pool_id=pool.pk))
+
+    for order in ExchangeOrder.objects.only(
+        "pool_id", "status", "give_token_id", "give_amount"
+    ):
+        token1_id, stats = pools[order.pool_id]
+        stats.orders_total += 1
+        field = f"orders_{order.status}"
+        setattr(stats, field, getattr(stats, field) + 1)
+        if order.status == "completed":
+            field = (
+                "volume_token1_in"
+                if order.give_token_id == token1_id
+                else "volume_token2_in"
+            )
+            setattr(stats, field, getattr(stats, field) + order.give_amount)
+
+    NetworkStats.objects.bulk_create(
+        NetworkStats(network_id=pk, pools_count=networks[pk])
+        for pk in Network.objects.values_list("pk", flat=True)
+    )
+    TokenStats.objects.bulk_create(
+        TokenStats(token_id=pk, pools_count=tokens[pk])
+        for pk in Token.objects.values_list("pk", flat=True)
+    )
+    PoolStats.objects.bulk_create(stats for _, stats in pools.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exchange", "0007_poolsnapshot_poolcandle"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NetworkStats",
+            fields=[
+                (
+                    "network",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="exchange.network",
+                        verbose_name="Network",
+                    ),
+                ),
+                (
+                    "pools_count",
+                    models.BigIntegerField(default=0, verbose_name="Pools"),
+                ),
+            ],
+            options={
+                "verbose_name": "Network Stats",
+                "verbose_name_plural": "Network Stats",
+            },
+        ),
+        migrations.CreateModel(
+            name="PoolStats",
+            fields=[
+                (
+                    "pool",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="exchange.pool",
+                        verbose_name="Pool",
+                    ),
+                ),
+                (
+                    "orders_total",
+                    models.BigIntegerField(default=0, verbose_name="Orders"),
+                ),
+                (
+                    "orders_pending",
+                    models.BigIntegerField(default=0, verbose_name="Pending"),
+                ),
+                (
+                    "orders_processing",
+                    models.BigIntegerField(default=0, verbose_name="Processing"),
+                ),
+                (
+                    "orders_completed",
+                    models.BigIntegerField(default=0, verbose_name="Completed"),
+                ),
+                (
+                    "orders_cancelled",
+                    models.BigIntegerField(default=0, verbose_name="Cancelled"),
+                ),
+                (
+                    "orders_failed",
+                    models.BigIntegerField(default=0, verbose_name="Failed"),
+                ),
+                (
+                    "volume_token1_in",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0"),
+                        help_text="Token A given in completed orders (A → B)",
+                        max_digits=30,
+                        verbose_name="Token A volume",
+                    ),
+                ),
+                (
+                    "volume_token2_in",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0"),
+                        help_text="Token B given in completed orders (B → A)",
+                        max_digits=30,
+                        verbose_name="Token B volume",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Pool Stats",
+                "verbose_name_plural": "Pool Stats",
+            },
+        ),
+        migrations.CreateModel(
+            name="TokenStats",
+            fields=[
+                (
+                    "token",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="exchange.token",
+                        verbose_name="Token",
+                    ),
+                ),
+                (
+                    "pools_count",
+                    models.BigIntegerField(default=0, verbose_name="Pools"),
+                ),
+            ],
+            options={
+                "verbose_name": "Token Stats",
+                "verbose_name_plural": "Token Stats",
+            },
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
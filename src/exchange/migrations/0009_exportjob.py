@@ -0,0 +1,150 @@
+# Generated by Django 5.2 on 2026-10-18 01:50
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exchange", "0008_pool_token_network_stats"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExportJob",
+            fields=[
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Created at"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Updated at"),
+                ),
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("date_from", models.DateField(verbose_name="From date")),
+                ("date_to", models.DateField(verbose_name="To date")),
+                (
+                    "order_status",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("pending", "Pending"),
+                            ("processing", "Processing"),
+                            ("completed", "Completed"),
+                            ("cancelled", "Cancelled"),
+                            ("failed", "Failed"),
+                        ],
+                        help_text="Leave empty to export orders in any status",
+                        max_length=20,
+                        verbose_name="Order status",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("running", "Running"),
+                            ("completed", "Completed"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                        verbose_name="Status",
+                    ),
+                ),
+                (
+                    "file",
+                    models.FileField(
+                        blank=True,
+                        editable=False,
+                        upload_to="exports/",
+                        verbose_name="File",
+                    ),
+                ),
+                (
+                    "total_rows",
+                    models.PositiveBigIntegerField(
+                        editable=False, null=True, verbose_name="Total rows"
+                    ),
+                ),
+                (
+                    "rows_written",
+                    models.PositiveBigIntegerField(
+                        default=0, editable=False, verbose_name="Rows written"
+                    ),
+                ),
+                (
+                    "bytes_written",
+                    models.PositiveBigIntegerField(
+                        default=0, editable=False, verbose_name="Bytes written"
+                    ),
+                ),
+                ("cursor_created_at", models.DateTimeField(editable=False, null=True)),
+                ("cursor_id", models.UUIDField(editable=False, null=True)),
+                (
+                    "error",
+                    models.TextField(blank=True, editable=False, verbose_name="Error"),
+                ),
+                (
+                    "heartbeat_at",
+                    models.DateTimeField(
+                        editable=False, null=True, verbose_name="Last heartbeat"
+                    ),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(
+                        editable=False, null=True, verbose_name="Finished at"
+                    ),
+                ),
+                (
+                    "pool",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="export_jobs",
+                        to="exchange.pool",
+                        verbose_name="Pool",
+                    ),
+                ),
+                (
+                    "requested_by",
+                    models.ForeignKey(
+                        blank=True,
+                        editable=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="export_jobs",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Requested by",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Export Job",
+                "verbose_name_plural": "Export Jobs",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "created_at"],
+                        name="exchange_ex_status_89792a_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2 on 2026-10-18 01:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exchange", "0009_exportjob"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="exchangeorder",
+            name="exchange_ex_status_a4e84c_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="exchangeorder",
+            name="exchange_ex_email_0c64a4_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="exchangeorder",
+            name="exchange_ex_created_5846d5_idx",
+        ),
+        migrations.AddIndex(
+            model_name="exchangeorder",
+            index=models.Index(
+                fields=["status", "created_at"], name="exchange_order_status_created"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="exchangeorder",
+            index=models.Index(
+                fields=["pool", "status"], name="exchange_order_pool_status"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="exchangeorder",
+            index=models.Index(
+                fields=["email", "created_at"], name="exchange_order_email_created"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="exchangeorder",
+            index=models.Index(
+                fields=["created_at", "id"], name="exchange_order_created_id"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="exchangeorder",
+            index=models.Index(
+                condition=models.Q(("status__in", ["pending", "processing"])),
+                fields=["created_at"],
+                name="exchange_order_open_created",
+            ),
+        ),
+    ]
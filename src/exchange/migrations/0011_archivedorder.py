@@ -0,0 +1,160 @@
+# Generated by Django 5.2 on 2026-10-18 02:01
+
+import django.core.validators
+import django.db.models.deletion
+import django.db.models.functions.datetime
+import uuid
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exchange", "0010_exchangeorder_workload_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedOrder",
+            fields=[
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Created at"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Updated at"),
+                ),
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("email", models.EmailField(max_length=100, verbose_name="User Email")),
+                (
+                    "give_amount",
+                    models.DecimalField(
+                        decimal_places=2,
+                        max_digits=15,
+                        validators=[
+                            django.core.validators.MinValueValidator(Decimal("0"))
+                        ],
+                        verbose_name="Amount of Token Given",
+                    ),
+                ),
+                (
+                    "receive_amount",
+                    models.DecimalField(
+                        decimal_places=2,
+                        max_digits=15,
+                        validators=[
+                            django.core.validators.MinValueValidator(Decimal("0"))
+                        ],
+                        verbose_name="Amount of Token Received",
+                    ),
+                ),
+                (
+                    "exchange_rate",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=15, verbose_name="Exchange Rate"
+                    ),
+                ),
+                (
+                    "fee_percentage",
+                    models.DecimalField(
+                        decimal_places=2,
+                        max_digits=5,
+                        verbose_name="Fee Percentage (%)",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("processing", "Processing"),
+                            ("completed", "Completed"),
+                            ("cancelled", "Cancelled"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                        verbose_name="Order Status",
+                    ),
+                ),
+                (
+                    "route",
+                    models.JSONField(
+                        blank=True,
+                        default=list,
+                        help_text="Swap legs for orders routed through several pools",
+                        verbose_name="Route",
+                    ),
+                ),
+                (
+                    "transaction_hash",
+                    models.CharField(
+                        blank=True,
+                        max_length=255,
+                        null=True,
+                        verbose_name="Transaction Hash",
+                    ),
+                ),
+                (
+                    "archived_at",
+                    models.DateTimeField(
+                        db_default=django.db.models.functions.datetime.Now(),
+                        editable=False,
+                        verbose_name="Archived at",
+                    ),
+                ),
+                (
+                    "give_token",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_orders_as_give_token",
+                        to="exchange.token",
+                        verbose_name="Token Given",
+                    ),
+                ),
+                (
+                    "pool",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_orders",
+                        to="exchange.pool",
+                        verbose_name="Exchange Pool",
+                    ),
+                ),
+                (
+                    "receive_token",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_orders_as_receive_token",
+                        to="exchange.token",
+                        verbose_name="Token Received",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Archived Order",
+                "verbose_name_plural": "Archived Orders",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["created_at", "id"], name="exchange_archived_created_id"
+                    ),
+                    models.Index(
+                        fields=["email", "created_at"], name="exchange_archived_email"
+                    ),
+                ],
+            },
+        ),
+    ]
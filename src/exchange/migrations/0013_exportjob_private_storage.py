@@ -0,0 +1,42 @@
+# Generated by Django 5.2 on 2026-10-18 02:31
+
+import os
+import shutil
+
+import exchange.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+def move_exports(apps, schema_editor):
+    """Перенести уже готовые выгрузки из MEDIA_ROOT в закрытое хранилище"""
+    source = os.path.join(settings.MEDIA_ROOT, "exports")
+    if not os.path.isdir(source):
+        return
+
+    target = os.path.join(settings.EXCHANGE_EXPORT_ROOT, "exports")
+    os.makedirs(target, exist_ok=True)
+    for name in os.listdir(source):
+        shutil.move(os.path.join(source, name), os.path.join(target, name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exchange", "0012_orderevent"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="exportjob",
+            name="file",
+            field=models.FileField(
+                blank=True,
+                editable=False,
+                storage=exchange.models.export_storage,
+                upload_to="exports/",
+                verbose_name="File",
+            ),
+        ),
+        migrations.RunPython(move_exports, migrations.RunPython.noop),
+    ]
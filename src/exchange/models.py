@@ -1,9 +1,17 @@
+from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.core.files.storage import FileSystemStorage
+from django.db import models, router, transaction
+from django.db.models.functions import Now
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from decimal import Decimal
+from functools import cached_property
 import uuid
 
+from exchange.managers import PoolManager
+from exchange.services.amm import PoolState
+
 
 class TimestampMixin(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created at")
@@ -13,7 +21,24 @@ class TimestampMixin(models.Model):
         abstract = True
 
 
-class Network(TimestampMixin):
+class AtomicSaveMixin(models.Model):
+    """
+    save() вместе с post_save-обработчиками в одной транзакции: счетчики
+    статистики (exchange.services.stats) меняются или откатываются вместе с
+    записью, даже если вызывающий код работает в autocommit. delete() Django
+    и так выполняет с post_delete внутри транзакции.
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
+
+class Network(AtomicSaveMixin, TimestampMixin):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=50, unique=True, verbose_name="Network name")
     short_name = models.CharField(
@@ -34,7 +59,7 @@ class Network(TimestampMixin):
         return f"{self.name} ({self.short_name})"
 
 
-class Token(TimestampMixin):
+class Token(AtomicSaveMixin, TimestampMixin):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=100, verbose_name="Token name")
     short_name = models.CharField(max_length=20, verbose_name="Token shortname")
@@ -60,8 +85,19 @@ class Token(TimestampMixin):
     def __str__(self):
         return f"{self.name} ({self.short_name}) - {self.network.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Сеть при загрузке: по ней stats.token_saved видит переход в другую сеть
+        instance._loaded_network_id = instance.__dict__.get("network_id")
+        return instance
 
-class Pool(TimestampMixin):
+
+class PoolVersionConflict(Exception):
+    """Пул изменился (например, расчетом) после того, как его загрузили"""
+
+
+class Pool(AtomicSaveMixin, TimestampMixin):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=100, verbose_name="Pool name")
 
@@ -103,15 +139,36 @@ class Pool(TimestampMixin):
 
     is_active = models.BooleanField(default=True, verbose_name="Is active")
 
+    pair_key = models.CharField(
+        max_length=73,
+        editable=False,
+        verbose_name="Pair key",
+        help_text="Token ids of the pair in canonical order",
+    )
+    version = models.PositiveBigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Version",
+        help_text="Bumped on every reserve update by settlement",
+    )
+
+    objects = PoolManager()
+
     class Meta:
         verbose_name = "Pool"
         verbose_name_plural = "Pools"
-        unique_together = ["token1", "token2"]
         ordering = ["-created_at"]
         indexes = [
             models.Index(fields=["is_active"]),
             models.Index(fields=["token1", "token2"]),
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["pair_key"],
+                name="unique_pool_pair_key",
+                violation_error_message="A pool for this token pair already exists",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.token1.short_name}/{self.token2.short_name}"
@@ -120,14 +177,94 @@ class Pool(TimestampMixin):
         if self.token1 == self.token2:
             raise ValidationError("Tokens in the pool cannot be the same")
 
+        if self.token1_id and self.token2_id:
+            pools = Pool.objects.for_pair(self.token1_id, self.token2_id)
+            if pools.exclude(pk=self.pk).exists():
+                raise ValidationError("A pool for this token pair already exists")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_reserves = (
+            instance.__dict__.get("token1_amount"),
+            instance.__dict__.get("token2_amount"),
+        )
+        instance._loaded_tokens = (
+            instance.__dict__.get("token1_id"),
+            instance.__dict__.get("token2_id"),
+        )
+        return instance
+
+    @property
+    def reserves_changed(self):
+        """Изменились ли резервы с момента загрузки из БД (новый пул - да)"""
+        return getattr(self, "_loaded_reserves", None) != (
+            self.token1_amount,
+            self.token2_amount,
+        )
+
     def save(self, *args, **kwargs):
         if not self.name:
             self.generate_pool_name()
-        super().save(*args, **kwargs)
+
+        self.pair_key = self.build_pair_key(self.token1_id, self.token2_id)
+        loaded_version = self.version
+        if not self._state.adding:
+            # UPDATE пройдет, только если версия в БД все еще loaded_version
+            # (см. _do_update), как CAS в apply_pool_delta
+            self._expected_version = loaded_version
+            self.version += 1
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            extra = {"version"}
+            if {"token1", "token2"} & set(update_fields):
+                extra.add("pair_key")
+            kwargs["update_fields"] = {*update_fields, *extra}
+
+        try:
+            super().save(*args, **kwargs)
+        except PoolVersionConflict:
+            self.version = loaded_version
+            raise
+        finally:
+            self._expected_version = None
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        expected = getattr(self, "_expected_version", None)
+        if expected is None:
+            return super()._do_update(
+                base_qs, using, pk_val, values, update_fields, forced_update
+            )
+
+        updated = super()._do_update(
+            base_qs.filter(version=expected),
+            using,
+            pk_val,
+            values,
+            update_fields,
+            forced_update,
+        )
+        if not updated and base_qs.filter(pk=pk_val).exists():
+            raise PoolVersionConflict(
+                f"Pool {pk_val} was changed after it was loaded (version {expected})"
+            )
+        return updated
+
+    @staticmethod
+    def build_pair_key(token_a, token_b):
+        """Ключ пары, не зависящий от порядка токенов: "<min id>:<max id>" """
+        ids = sorted(str(getattr(token, "pk", token)) for token in (token_a, token_b))
+        return ":".join(ids)
 
     def generate_pool_name(self):
         self.name = f"{self.token1.symbol}/{self.token2.symbol}"
 
+    @cached_property
+    def amm_state(self):
+        """Снимок резервов в целых единицах для exchange.services.amm"""
+        return PoolState.from_pool(self)
+
     @property
     def exchange_rate_token1_to_token2(self):
         """Курс: сколько token2 за 1 token1"""
@@ -188,8 +325,45 @@ class Pool(TimestampMixin):
         # 98, 700 ≈ 318.5
         # TON
 
+    def get_input_amount(self, output_token, output_amount):
+        """
+        Рассчитать количество входного токена, нужное для получения output_amount
+        Обратная формула к get_output_amount
+        """
+        output_amount = Decimal(str(output_amount))
+
+        if output_token == self.token2:
+            input_reserve = self.token1_amount
+            output_reserve = self.token2_amount
+        elif output_token == self.token1:
+            input_reserve = self.token2_amount
+            output_reserve = self.token1_amount
+        else:
+            raise ValueError("Токен не принадлежит этому пулу")
+
+        if input_reserve <= 0 or output_reserve <= 0:
+            return Decimal("0")
+
+        if output_amount >= output_reserve:
+            raise ValueError("Недостаточно ликвидности в пуле")
+
+        fee_multiplier = Decimal("100") - self.fee_percentage
+        numerator = input_reserve * Decimal("100") * output_amount
+        denominator = (output_reserve - output_amount) * fee_multiplier
+
+        if denominator <= 0:
+            return Decimal("0")
+
+        return numerator / denominator
+
+
+# Незавершенные заявки: очередь воркера расчетов и частичный индекс по ней
+OPEN_ORDER_STATUSES = ("pending", "processing")
+
+
+class OrderBase(TimestampMixin):
+    """Общие поля рабочей (ExchangeOrder) и архивной (ArchivedOrder) заявки"""
 
-class ExchangeOrder(TimestampMixin):
     STATUS_CHOICES = [
         ("pending", "Pending"),
         ("processing", "Processing"),
@@ -202,25 +376,12 @@ class ExchangeOrder(TimestampMixin):
 
     email = models.EmailField(max_length=100, verbose_name="User Email")
 
-    give_token = models.ForeignKey(
-        "Token",
-        on_delete=models.CASCADE,
-        related_name="orders_as_give_token",
-        verbose_name="Token Given",
-    )
     give_amount = models.DecimalField(
         max_digits=15,
         decimal_places=2,
         validators=[MinValueValidator(Decimal("0"))],
         verbose_name="Amount of Token Given",
     )
-
-    receive_token = models.ForeignKey(
-        "Token",
-        on_delete=models.CASCADE,
-        related_name="orders_as_receive_token",
-        verbose_name="Token Received",
-    )
     receive_amount = models.DecimalField(
         max_digits=15,
         decimal_places=2,
@@ -246,6 +407,41 @@ class ExchangeOrder(TimestampMixin):
         verbose_name="Order Status",
     )
 
+    route = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name="Route",
+        help_text="Swap legs for orders routed through several pools",
+    )
+
+    transaction_hash = models.CharField(
+        max_length=255, blank=True, null=True, verbose_name="Transaction Hash"
+    )
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f"Order #{str(self.id)[:8]} - {self.give_amount} {self.give_token.short_name} → {self.receive_amount} {self.receive_token.short_name}"
+
+    @property
+    def order_short_number(self):
+        return str(self.id)[:8].upper()
+
+
+class ExchangeOrder(AtomicSaveMixin, OrderBase):
+    give_token = models.ForeignKey(
+        "Token",
+        on_delete=models.CASCADE,
+        related_name="orders_as_give_token",
+        verbose_name="Token Given",
+    )
+    receive_token = models.ForeignKey(
+        "Token",
+        on_delete=models.CASCADE,
+        related_name="orders_as_receive_token",
+        verbose_name="Token Received",
+    )
     pool = models.ForeignKey(
         "Pool",
         on_delete=models.CASCADE,
@@ -253,23 +449,386 @@ class ExchangeOrder(TimestampMixin):
         verbose_name="Exchange Pool",
     )
 
-    transaction_hash = models.CharField(
-        max_length=255, blank=True, null=True, verbose_name="Transaction Hash"
-    )
-
     class Meta:
         verbose_name = "Exchange Order"
         verbose_name_plural = "Exchange Orders"
         ordering = ["-created_at"]
         indexes = [
-            models.Index(fields=["status"]),
-            models.Index(fields=["email"]),
+            # Админка: фильтр по статусу с сортировкой по дате
+            models.Index(
+                fields=["status", "created_at"], name="exchange_order_status_created"
+            ),
+            # Аналитика пула по статусам
+            models.Index(fields=["pool", "status"], name="exchange_order_pool_status"),
+            # Заявки клиента, новые сверху
+            models.Index(
+                fields=["email", "created_at"], name="exchange_order_email_created"
+            ),
+            # Keyset-пагинация списка заявок
+            models.Index(fields=["created_at", "id"], name="exchange_order_created_id"),
+            # Очередь воркера расчетов: только незавершенные заявки
+            models.Index(
+                fields=["created_at"],
+                condition=models.Q(status__in=OPEN_ORDER_STATUSES),
+                name="exchange_order_open_created",
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_stats_state = instance.stats_state
+        return instance
+
+    @property
+    def stats_state(self):
+        """Поля, от которых зависят счетчики PoolStats"""
+        return (
+            self.__dict__.get("pool_id"),
+            self.__dict__.get("status"),
+            self.__dict__.get("give_token_id"),
+            self.__dict__.get("give_amount"),
+        )
+
+
+class ArchivedOrder(OrderBase):
+    """
+    Завершенные заявки старше EXCHANGE_ORDER_RETENTION_DAYS, перенесенные из
+    ExchangeOrder командой archive_orders. Строки только читаются; индексов
+    минимум - архив листают по дате и ищут по email.
+    """
+
+    give_token = models.ForeignKey(
+        "Token",
+        on_delete=models.CASCADE,
+        related_name="archived_orders_as_give_token",
+        db_index=False,
+        verbose_name="Token Given",
+    )
+    receive_token = models.ForeignKey(
+        "Token",
+        on_delete=models.CASCADE,
+        related_name="archived_orders_as_receive_token",
+        db_index=False,
+        verbose_name="Token Received",
+    )
+    pool = models.ForeignKey(
+        "Pool",
+        on_delete=models.CASCADE,
+        related_name="archived_orders",
+        verbose_name="Exchange Pool",
+    )
+    archived_at = models.DateTimeField(
+        db_default=Now(), editable=False, verbose_name="Archived at"
+    )
+
+    class Meta:
+        verbose_name = "Archived Order"
+        verbose_name_plural = "Archived Orders"
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["created_at", "id"], name="exchange_archived_created_id"
+            ),
+            models.Index(
+                fields=["email", "created_at"], name="exchange_archived_email"
+            ),
+        ]
+
+
+class OrderEvent(models.Model):
+    """
+    Журнал смен статуса заявок; строки только добавляются. Ссылка на заявку -
+    просто id, чтобы история переживала перенос заявки в архив.
+    """
+
+    order_id = models.UUIDField(verbose_name="Order ID")
+    from_status = models.CharField(
+        max_length=20, choices=OrderBase.STATUS_CHOICES, verbose_name="From status"
+    )
+    to_status = models.CharField(
+        max_length=20, choices=OrderBase.STATUS_CHOICES, verbose_name="To status"
+    )
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="order_events",
+        verbose_name="Changed by",
+    )
+    note = models.CharField(max_length=255, blank=True, verbose_name="Note")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Created at")
+
+    class Meta:
+        verbose_name = "Order Event"
+        verbose_name_plural = "Order Events"
+        ordering = ["created_at", "id"]
+        indexes = [
+            models.Index(fields=["order_id", "created_at"]),
+        ]
+
+    def __str__(self):
+        return (
+            f"{str(self.order_id)[:8].upper()}: {self.from_status} → {self.to_status}"
+        )
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Order events are append-only")
+        super().save(*args, **kwargs)
+
+
+class PoolSnapshot(models.Model):
+    """Резервы пула после каждого изменения; строки только добавляются"""
+
+    pool = models.ForeignKey(
+        Pool, on_delete=models.CASCADE, related_name="snapshots", verbose_name="Pool"
+    )
+    token1_amount = models.DecimalField(
+        max_digits=15, decimal_places=2, verbose_name="Token A reserve"
+    )
+    token2_amount = models.DecimalField(
+        max_digits=15, decimal_places=2, verbose_name="Token B reserve"
+    )
+    rate = models.DecimalField(
+        max_digits=30,
+        decimal_places=12,
+        verbose_name="Rate",
+        help_text="Token B per 1 token A",
+    )
+    version = models.PositiveBigIntegerField(verbose_name="Pool version")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Created at")
+
+    class Meta:
+        verbose_name = "Pool Snapshot"
+        verbose_name_plural = "Pool Snapshots"
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["pool", "created_at"]),
             models.Index(fields=["created_at"]),
         ]
 
     def __str__(self):
-        return f"Order #{str(self.id)[:8]} - {self.give_amount} {self.give_token.short_name} → {self.receive_amount} {self.receive_token.short_name}"
+        return f"{self.pool_id} @ {self.created_at:%Y-%m-%d %H:%M:%S}: {self.rate}"
+
+
+class PoolCandle(models.Model):
+    INTERVAL_CHOICES = [
+        ("1m", "1 minute"),
+        ("1h", "1 hour"),
+        ("1d", "1 day"),
+    ]
+
+    pool = models.ForeignKey(
+        Pool, on_delete=models.CASCADE, related_name="candles", verbose_name="Pool"
+    )
+    interval = models.CharField(
+        max_length=2, choices=INTERVAL_CHOICES, verbose_name="Interval"
+    )
+    bucket_start = models.DateTimeField(verbose_name="Bucket start")
+    open = models.DecimalField(max_digits=30, decimal_places=12, verbose_name="Open")
+    high = models.DecimalField(max_digits=30, decimal_places=12, verbose_name="High")
+    low = models.DecimalField(max_digits=30, decimal_places=12, verbose_name="Low")
+    close = models.DecimalField(max_digits=30, decimal_places=12, verbose_name="Close")
+    snapshots_count = models.PositiveIntegerField(
+        default=0, verbose_name="Snapshots count"
+    )
+
+    class Meta:
+        verbose_name = "Pool Candle"
+        verbose_name_plural = "Pool Candles"
+        ordering = ["-bucket_start"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["pool", "interval", "bucket_start"],
+                name="unique_pool_candle_bucket",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.pool_id} {self.interval} {self.bucket_start:%Y-%m-%d %H:%M}"
+
+
+class PoolStats(models.Model):
+    """Счетчики заявок пула; обновляются в той же транзакции, что и заявки"""
+
+    pool = models.OneToOneField(
+        Pool,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+        verbose_name="Pool",
+    )
+    orders_total = models.BigIntegerField(default=0, verbose_name="Orders")
+    orders_pending = models.BigIntegerField(default=0, verbose_name="Pending")
+    orders_processing = models.BigIntegerField(default=0, verbose_name="Processing")
+    orders_completed = models.BigIntegerField(default=0, verbose_name="Completed")
+    orders_cancelled = models.BigIntegerField(default=0, verbose_name="Cancelled")
+    orders_failed = models.BigIntegerField(default=0, verbose_name="Failed")
+    volume_token1_in = models.DecimalField(
+        max_digits=30,
+        decimal_places=2,
+        default=Decimal("0"),
+        verbose_name="Token A volume",
+        help_text="Token A given in completed orders (A → B)",
+    )
+    volume_token2_in = models.DecimalField(
+        max_digits=30,
+        decimal_places=2,
+        default=Decimal("0"),
+        verbose_name="Token B volume",
+        help_text="Token B given in completed orders (B → A)",
+    )
+
+    class Meta:
+        verbose_name = "Pool Stats"
+        verbose_name_plural = "Pool Stats"
+
+    def __str__(self):
+        return f"Stats for {self.pool_id}"
+
+
+class TokenStats(models.Model):
+    token = models.OneToOneField(
+        Token,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+        verbose_name="Token",
+    )
+    pools_count = models.BigIntegerField(default=0, verbose_name="Pools")
+
+    class Meta:
+        verbose_name = "Token Stats"
+        verbose_name_plural = "Token Stats"
+
+    def __str__(self):
+        return f"Stats for {self.token_id}"
+
+
+class NetworkStats(models.Model):
+    network = models.OneToOneField(
+        Network,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+        verbose_name="Network",
+    )
+    pools_count = models.BigIntegerField(default=0, verbose_name="Pools")
+
+    class Meta:
+        verbose_name = "Network Stats"
+        verbose_name_plural = "Network Stats"
+
+    def __str__(self):
+        return f"Stats for {self.network_id}"
+
+
+class ExportStorage(FileSystemStorage):
+    """Файлы выгрузок без публичного адреса: скачиваются только через админку"""
+
+    def url(self, name):
+        raise ValueError("Export files are not accessible via a URL")
+
+
+def export_storage():
+    return ExportStorage(location=settings.EXCHANGE_EXPORT_ROOT)
+
+
+class ExportJob(TimestampMixin):
+    """
+    Фоновая выгрузка заявок в gzip CSV. Файл пишется кусками: каждый кусок -
+    отдельный gzip member, после записи которого в строке задания фиксируются
+    курсор (created_at, id) последней заявки и размер файла. Упавшее задание
+    продолжается с последнего зафиксированного куска.
+    """
+
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    date_from = models.DateField(verbose_name="From date")
+    date_to = models.DateField(verbose_name="To date")
+    order_status = models.CharField(
+        max_length=20,
+        choices=ExchangeOrder.STATUS_CHOICES,
+        blank=True,
+        verbose_name="Order status",
+        help_text="Leave empty to export orders in any status",
+    )
+    pool = models.ForeignKey(
+        Pool,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="export_jobs",
+        verbose_name="Pool",
+    )
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="export_jobs",
+        verbose_name="Requested by",
+    )
+
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default="pending", verbose_name="Status"
+    )
+    file = models.FileField(
+        upload_to="exports/",
+        storage=export_storage,
+        blank=True,
+        editable=False,
+        verbose_name="File",
+    )
+    total_rows = models.PositiveBigIntegerField(
+        null=True, editable=False, verbose_name="Total rows"
+    )
+    rows_written = models.PositiveBigIntegerField(
+        default=0, editable=False, verbose_name="Rows written"
+    )
+    bytes_written = models.PositiveBigIntegerField(
+        default=0, editable=False, verbose_name="Bytes written"
+    )
+    cursor_created_at = models.DateTimeField(null=True, editable=False)
+    cursor_id = models.UUIDField(null=True, editable=False)
+    error = models.TextField(blank=True, editable=False, verbose_name="Error")
+    heartbeat_at = models.DateTimeField(
+        null=True, editable=False, verbose_name="Last heartbeat"
+    )
+    finished_at = models.DateTimeField(
+        null=True, editable=False, verbose_name="Finished at"
+    )
+
+    class Meta:
+        verbose_name = "Export Job"
+        verbose_name_plural = "Export Jobs"
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"Export {self.date_from} - {self.date_to} ({self.status})"
+
+    def clean(self):
+        if self.date_from and self.date_to and self.date_from > self.date_to:
+            raise ValidationError("Start date must not be after end date")
 
     @property
-    def order_short_number(self):
-        return str(self.id)[:8].upper()
+    def progress(self):
+        """Доля выгруженных строк в процентах (None, пока не посчитан итог)"""
+        if self.total_rows is None:
+            return None
+        if self.total_rows == 0:
+            return 100.0
+        return min(self.rows_written / self.total_rows * 100, 100.0)
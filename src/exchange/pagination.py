@@ -0,0 +1,190 @@
+import base64
+import json
+import uuid
+
+from django.conf import settings
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from unfold.views import ChangeList
+
+CURSOR_VAR = "cursor"
+
+
+def estimate_count(queryset, limit):
+    """
+    Число строк без полного COUNT(*): точное, если строк не больше limit,
+    иначе оценка планировщика (PostgreSQL) или сам limit.
+    Возвращает (число, точное ли оно).
+    """
+    queryset = queryset.order_by()
+    counted = queryset[: limit + 1].count()
+    if counted <= limit:
+        return counted, True
+
+    connection = connections[queryset.db]
+    if connection.vendor == "postgresql":
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return max(int(plan[0]["Plan"]["Plan Rows"]), counted), False
+
+    return limit, False
+
+
+def encode_cursor(direction, created_at, pk):
+    raw = f"{direction}|{created_at.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(value):
+    try:
+        raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)).decode()
+        direction, created_at, pk = raw.split("|")
+        created_at = parse_datetime(created_at)
+        if direction not in ("next", "prev") or created_at is None:
+            raise ValueError
+        return direction, created_at, uuid.UUID(pk)
+    except ValueError as e:
+        raise IncorrectLookupParameters(f"Invalid cursor {value!r}") from e
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator с оценкой числа строк вместо COUNT(*) по всей выборке"""
+
+    template_name = "exchange/admin/pagination.html"
+
+    @cached_property
+    def count(self):
+        count, self.count_exact = estimate_count(
+            self.object_list, settings.EXCHANGE_ADMIN_COUNT_LIMIT
+        )
+        return count
+
+    def get_elided_page_range(self, number=1, *, on_each_side=3, on_ends=2):
+        if not self.count_exact:
+            # Номер последней страницы неизвестен: показываем только соседние
+            return range(max(number - on_each_side, 1), number + on_each_side + 1)
+        return super().get_elided_page_range(
+            number, on_each_side=on_each_side, on_ends=on_ends
+        )
+
+    def validate_number(self, number):
+        if not self.count_exact:
+            return max(int(number), 1)
+        return super().validate_number(number)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if self.count_exact:
+            return super().page(number)
+
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        return self._get_page(self.object_list[bottom:top], number, self)
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Список админки, который при сортировке по умолчанию (keyset_field, pk)
+    листает страницы курсором вместо OFFSET: любая страница - один запрос по
+    индексу с LIMIT. При другой сортировке остается обычная постраничная
+    навигация, но с оценкой числа строк.
+    """
+
+    keyset_field = "created_at"
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Ссылки фильтров и сортировки начинают список с первой страницы
+        if CURSOR_VAR not in (new_params or {}):
+            remove = [*(remove or []), CURSOR_VAR]
+        return super().get_query_string(new_params, remove)
+
+    def _keyset_descending(self):
+        ordering = []
+        for field in self.queryset.query.order_by:
+            field = {"id": "pk", "-id": "-pk"}.get(field, field)
+            if field not in ordering:
+                ordering.append(field)
+
+        if ordering == [f"-{self.keyset_field}", "-pk"]:
+            return True
+        if ordering == [self.keyset_field, "pk"]:
+            return False
+        return None
+
+    def get_results(self, request):
+        descending = self._keyset_descending()
+        self.keyset = descending is not None
+        if not self.keyset:
+            return super().get_results(request)
+
+        cursor = request.GET.get(CURSOR_VAR)
+        direction = None
+        queryset = self.queryset
+        if cursor:
+            direction, created_at, pk = decode_cursor(cursor)
+            after = Q(**{f"{self.keyset_field}__gt": created_at}) | Q(
+                **{self.keyset_field: created_at, "pk__gt": pk}
+            )
+            before = Q(**{f"{self.keyset_field}__lt": created_at}) | Q(
+                **{self.keyset_field: created_at, "pk__lt": pk}
+            )
+            forward = direction == "next"
+            queryset = queryset.filter(before if forward == descending else after)
+            if not forward:
+                queryset = queryset.reverse()
+
+        rows = list(queryset[: self.list_per_page + 1])
+        has_more = len(rows) > self.list_per_page
+        rows = rows[: self.list_per_page]
+        if direction == "prev":
+            rows.reverse()
+
+        has_next = has_more if direction != "prev" else True
+        has_prev = direction == "next" or (direction == "prev" and has_more)
+
+        self.paginator = self.model_admin.get_paginator(
+            request, self.queryset, self.list_per_page
+        )
+        self.result_count = self.paginator.count
+        self.full_result_count = (
+            estimate_count(self.root_queryset, settings.EXCHANGE_ADMIN_COUNT_LIMIT)[0]
+            if self.model_admin.show_full_result_count
+            else None
+        )
+        self.show_full_result_count = self.model_admin.show_full_result_count
+        self.show_admin_actions = bool(rows) or bool(cursor)
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = has_next or has_prev
+
+        self.first_page_url = self.get_query_string() if cursor else None
+        self.prev_page_url = (
+            self.get_query_string(
+                {CURSOR_VAR: encode_cursor("prev", *self._position(rows[0]))}
+            )
+            if has_prev and rows
+            else None
+        )
+        self.next_page_url = (
+            self.get_query_string(
+                {CURSOR_VAR: encode_cursor("next", *self._position(rows[-1]))}
+            )
+            if has_next and rows
+            else None
+        )
+
+    def _position(self, obj):
+        return getattr(obj, self.keyset_field), obj.pk
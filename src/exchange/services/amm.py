@@ -0,0 +1,88 @@
+from dataclasses import dataclass
+from decimal import ROUND_FLOOR, Decimal
+
+# fee_percentage хранится с тремя знаками после запятой: 100% = 100000
+FEE_SCALE = 100_000
+
+
+def to_base_units(amount, decimals):
+    """Сумма в минимальных единицах токена, округление вниз"""
+    return int(Decimal(str(amount)).scaleb(decimals).to_integral_value(ROUND_FLOOR))
+
+
+def from_base_units(units, decimals):
+    return Decimal(units).scaleb(-decimals)
+
+
+def to_fee_units(fee_percentage):
+    return int(Decimal(str(fee_percentage)).scaleb(3).to_integral_value(ROUND_FLOOR))
+
+
+def get_amount_out(amount_in, reserve_in, reserve_out, fee):
+    """
+    Выход пула в минимальных единицах (формула Pool.get_output_amount),
+    округление вниз - пул никогда не отдает больше, чем позволяет инвариант
+    """
+    if amount_in <= 0 or reserve_in <= 0 or reserve_out <= 0:
+        return 0
+
+    amount_in_with_fee = amount_in * (FEE_SCALE - fee)
+    numerator = amount_in_with_fee * reserve_out
+    denominator = reserve_in * FEE_SCALE + amount_in_with_fee
+    return numerator // denominator
+
+
+def get_amount_in(amount_out, reserve_in, reserve_out, fee):
+    """
+    Вход, нужный для получения amount_out (формула Pool.get_input_amount),
+    округление вверх - пользователь не может заплатить меньше нужного
+    """
+    if amount_out <= 0 or reserve_in <= 0 or reserve_out <= 0:
+        return 0
+
+    if amount_out >= reserve_out:
+        raise ValueError("Недостаточно ликвидности в пуле")
+
+    numerator = reserve_in * FEE_SCALE * amount_out
+    denominator = (reserve_out - amount_out) * (FEE_SCALE - fee)
+    return -(-numerator // denominator)
+
+
+@dataclass(frozen=True)
+class PoolState:
+    """Резервы и комиссия пула в целых минимальных единицах токенов"""
+
+    token1_id: object
+    token2_id: object
+    reserve1: int
+    reserve2: int
+    decimals1: int
+    decimals2: int
+    fee: int
+
+    @classmethod
+    def from_pool(cls, pool):
+        return cls(
+            token1_id=pool.token1_id,
+            token2_id=pool.token2_id,
+            reserve1=to_base_units(pool.token1_amount, pool.token1.decimals),
+            reserve2=to_base_units(pool.token2_amount, pool.token2.decimals),
+            decimals1=pool.token1.decimals,
+            decimals2=pool.token2.decimals,
+            fee=to_fee_units(pool.fee_percentage),
+        )
+
+    def _reserves(self, input_token_id):
+        if input_token_id == self.token1_id:
+            return self.reserve1, self.reserve2
+        if input_token_id == self.token2_id:
+            return self.reserve2, self.reserve1
+        raise ValueError("Токен не принадлежит этому пулу")
+
+    def get_output_amount(self, input_token_id, amount_in):
+        reserve_in, reserve_out = self._reserves(input_token_id)
+        return get_amount_out(amount_in, reserve_in, reserve_out, self.fee)
+
+    def get_input_amount(self, output_token_id, amount_out):
+        reserve_out, reserve_in = self._reserves(output_token_id)
+        return get_amount_in(amount_out, reserve_in, reserve_out, self.fee)
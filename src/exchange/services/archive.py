@@ -0,0 +1,107 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from exchange.models import OPEN_ORDER_STATUSES, ArchivedOrder, ExchangeOrder
+
+# Рабочая таблица идет первой: свежие заявки ищут чаще
+ORDER_MODELS = (ExchangeOrder, ArchivedOrder)
+
+ARCHIVE_STATUSES = tuple(
+    status
+    for status, _ in ExchangeOrder.STATUS_CHOICES
+    if status not in OPEN_ORDER_STATUSES
+)
+
+# Колонки, общие для рабочей и архивной таблиц
+_FIELDS = ExchangeOrder._meta.concrete_fields
+
+
+def archive_cutoff(retention_days=None):
+    if retention_days is None:
+        retention_days = settings.EXCHANGE_ORDER_RETENTION_DAYS
+    return timezone.now() - timedelta(days=retention_days)
+
+
+def archivable_orders(cutoff):
+    return ExchangeOrder.objects.filter(
+        status__in=ARCHIVE_STATUSES, created_at__lt=cutoff
+    )
+
+
+def archive_batch(cutoff, batch_size=None):
+    """
+    Перенести в архив до batch_size самых старых завершенных заявок, созданных
+    раньше cutoff: INSERT ... SELECT и DELETE в одной транзакции. Удаление идет
+    мимо сигналов, поэтому счетчики PoolStats продолжают учитывать архивные
+    заявки. Возвращает число перенесенных заявок.
+    """
+    batch_size = batch_size or settings.EXCHANGE_ARCHIVE_BATCH_SIZE
+    quote = connection.ops.quote_name
+
+    with transaction.atomic():
+        ids = list(
+            archivable_orders(cutoff)
+            .select_for_update(skip_locked=True)
+            .order_by("created_at")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+
+        select_sql, params = (
+            ExchangeOrder.objects.filter(pk__in=ids)
+            .order_by()
+            .values_list(*[field.attname for field in _FIELDS])
+            .query.sql_with_params()
+        )
+        columns = ", ".join(quote(field.column) for field in _FIELDS)
+        pk = ExchangeOrder._meta.pk
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {quote(ArchivedOrder._meta.db_table)} ({columns}) "
+                f"{select_sql}",
+                params,
+            )
+            cursor.execute(
+                f"DELETE FROM {quote(ExchangeOrder._meta.db_table)} "
+                f"WHERE {quote(pk.column)} IN ({', '.join(['%s'] * len(ids))})",
+                [pk.get_db_prep_value(order_id, connection) for order_id in ids],
+            )
+
+    return len(ids)
+
+
+def archive_orders(retention_days=None, batch_size=None, max_batches=None):
+    """
+    Переносить заявки пачками, пока есть что переносить (или max_batches
+    пачек). Каждая пачка - отдельная транзакция, блокировки держатся недолго.
+    Возвращает общее число перенесенных заявок.
+    """
+    cutoff = archive_cutoff(retention_days)
+    archived = batches = 0
+
+    while max_batches is None or batches < max_batches:
+        moved = archive_batch(cutoff, batch_size)
+        if not moved:
+            break
+        archived += moved
+        batches += 1
+
+    return archived
+
+
+def find_order(pk):
+    """Заявка по id из рабочей таблицы или архива; None, если ее нет нигде"""
+    for model in ORDER_MODELS:
+        order = (
+            model.objects.select_related("give_token", "receive_token", "pool")
+            .filter(pk=pk)
+            .first()
+        )
+        if order is not None:
+            return order
+    return None
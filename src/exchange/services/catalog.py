@@ -0,0 +1,26 @@
+import time
+
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = "exchange:catalog_version"
+
+
+def catalog_version():
+    """
+    Версия каталога токенов и сетей - часть ключа кешированных фрагментов
+    главной страницы. Начальное значение - время, чтобы после очистки кеша
+    версия не совпала с прежней.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, int(time.time()), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """Сдвинуть версию: фрагменты со старой версией больше не читаются"""
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOG_VERSION_KEY, int(time.time()), timeout=None)
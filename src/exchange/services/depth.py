@@ -0,0 +1,75 @@
+import math
+
+from exchange.services.amm import get_amount_out
+
+
+def default_sizes(reserve, points=20, low=0.0001, high=0.5):
+    """Геометрическая сетка размеров сделки от low до high доли резерва"""
+    reserve = float(reserve)
+    if reserve <= 0 or points < 1:
+        return []
+
+    if points == 1:
+        return [reserve * low]
+
+    step = math.log(high / low) / (points - 1)
+    return [reserve * low * math.exp(step * i) for i in range(points)]
+
+
+def depth_curve(pool, input_token, amounts):
+    """
+    Выход и эффективный курс пула сразу для массива входных сумм.
+
+    Состояние пула (целые резервы и комиссия) берется из Pool.amm_state один
+    раз, а по массиву проходит одно выражение целочисленного движка
+    exchange.services.amm, поэтому сотни точек считаются без Decimal на каждую.
+    """
+    state = pool.amm_state
+    if input_token == pool.token1:
+        reserve_in, reserve_out = state.reserve1, state.reserve2
+        decimals_in, decimals_out = state.decimals1, state.decimals2
+    elif input_token == pool.token2:
+        reserve_in, reserve_out = state.reserve2, state.reserve1
+        decimals_in, decimals_out = state.decimals2, state.decimals1
+    else:
+        raise ValueError("Токен не принадлежит этому пулу")
+
+    scale_in = 10**decimals_in
+    scale_out = 10**decimals_out
+    amounts = [float(amount) for amount in amounts]
+    fee = state.fee
+    outputs = [
+        get_amount_out(int(a * scale_in), reserve_in, reserve_out, fee) / scale_out
+        for a in amounts
+    ]
+
+    spot_rate = (
+        (reserve_out / scale_out) / (reserve_in / scale_in) if reserve_in > 0 else 0.0
+    )
+    rates = [o / a if a > 0 else 0.0 for a, o in zip(amounts, outputs)]
+    impacts = [(1 - r / spot_rate) * 100 if spot_rate > 0 else 0.0 for r in rates]
+
+    output_token = pool.token2 if input_token == pool.token1 else pool.token1
+    return {
+        "input_token": input_token.short_name,
+        "input_token_id": str(input_token.pk),
+        "output_token": output_token.short_name,
+        "output_token_id": str(output_token.pk),
+        "spot_rate": spot_rate,
+        "amounts": amounts,
+        "outputs": outputs,
+        "rates": rates,
+        "price_impact": impacts,
+    }
+
+
+def pool_depth(pool, amounts=None, points=20):
+    """Кривые глубины пула в обе стороны"""
+    curves = []
+    for input_token, reserve in (
+        (pool.token1, pool.token1_amount),
+        (pool.token2, pool.token2_amount),
+    ):
+        sizes = amounts if amounts is not None else default_sizes(reserve, points)
+        curves.append(depth_curve(pool, input_token, sizes))
+    return curves
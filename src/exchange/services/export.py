@@ -0,0 +1,83 @@
+import csv
+import zlib
+
+from django.conf import settings
+
+from exchange.models import ExchangeOrder
+
+# (заголовок, поле values_list, преобразование значения)
+ORDER_EXPORT_COLUMNS = (
+    ("Order ID", "id", lambda value: str(value)[:8].upper()),
+    ("Status", "status", dict(ExchangeOrder.STATUS_CHOICES).get),
+    ("Email", "email", None),
+    ("Give Token", "give_token__short_name", None),
+    ("Give Amount", "give_amount", None),
+    ("Receive Token", "receive_token__short_name", None),
+    ("Receive Amount", "receive_amount", None),
+    ("Exchange Rate", "exchange_rate", None),
+    ("Fee %", "fee_percentage", None),
+    ("Created At", "created_at", lambda value: value.strftime("%Y-%m-%d %H:%M:%S")),
+    ("Transaction Hash", "transaction_hash", lambda value: value or "N/A"),
+)
+
+
+ORDER_EXPORT_FIELDS = [field for _, field, _ in ORDER_EXPORT_COLUMNS]
+
+
+class _Echo:
+    """Файлоподобный объект для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+_writer = csv.writer(_Echo())
+
+
+def export_row(row):
+    """Строка values_list(*ORDER_EXPORT_FIELDS) в значения колонок CSV"""
+    return [
+        convert(value) if convert else value
+        for (_, _, convert), value in zip(ORDER_EXPORT_COLUMNS, row)
+    ]
+
+
+def order_rows(queryset, chunk_size=None):
+    """Строки CSV по заявкам; из БД читается по chunk_size строк за раз"""
+    chunk_size = chunk_size or settings.EXCHANGE_EXPORT_CHUNK_SIZE
+    for row in queryset.values_list(*ORDER_EXPORT_FIELDS).iterator(
+        chunk_size=chunk_size
+    ):
+        yield export_row(row)
+
+
+def csv_header():
+    return _writer.writerow([header for header, _, _ in ORDER_EXPORT_COLUMNS])
+
+
+def csv_lines(rows):
+    return "".join(_writer.writerow(row) for row in rows)
+
+
+def csv_chunks(rows, lines_per_chunk=500):
+    """Заголовок и строки в CSV, склеенные в куски по lines_per_chunk строк"""
+    yield csv_header()
+
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= lines_per_chunk:
+            yield csv_lines(chunk)
+            chunk = []
+    if chunk:
+        yield csv_lines(chunk)
+
+
+def gzip_chunks(chunks, level=6):
+    """Сжать поток текстовых кусков в gzip, не собирая его в памяти"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
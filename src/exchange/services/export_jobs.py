@@ -0,0 +1,181 @@
+import gzip
+import os
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from exchange.models import ExportJob
+from exchange.services.archive import ORDER_MODELS
+from exchange.services.export import (
+    ORDER_EXPORT_FIELDS,
+    csv_header,
+    csv_lines,
+    export_row,
+)
+
+CREATED_AT = ORDER_EXPORT_FIELDS.index("created_at")
+ORDER_ID = ORDER_EXPORT_FIELDS.index("id")
+
+
+class ExportJobLost(Exception):
+    """Задание забрал другой воркер, пока этот считал его зависшим"""
+
+
+def job_orders(job):
+    """
+    Заявки задания по таблицам (рабочая и архив), каждая в порядке курсора
+    (created_at, id)
+    """
+    start = timezone.make_aware(datetime.combine(job.date_from, time.min))
+    end = timezone.make_aware(
+        datetime.combine(job.date_to + timedelta(days=1), time.min)
+    )
+
+    filters = {"created_at__gte": start, "created_at__lt": end}
+    if job.order_status:
+        filters["status"] = job.order_status
+    if job.pool_id:
+        filters["pool_id"] = job.pool_id
+    return [
+        model.objects.filter(**filters).order_by("created_at", "id")
+        for model in ORDER_MODELS
+    ]
+
+
+def claim_job():
+    """
+    Взять самое старое ожидающее задание или задание, воркер которого не
+    отмечался дольше EXCHANGE_EXPORT_JOB_STALE_AFTER секунд
+    """
+    stale = timezone.now() - timedelta(seconds=settings.EXCHANGE_EXPORT_JOB_STALE_AFTER)
+
+    with transaction.atomic():
+        job = (
+            ExportJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(status="pending") | Q(status="running", heartbeat_at__lt=stale))
+            .order_by("created_at")
+            .first()
+        )
+        if job is None:
+            return None
+
+        job.status = "running"
+        job.error = ""
+        job.heartbeat_at = timezone.now()
+        job.save(update_fields=["status", "error", "heartbeat_at", "updated_at"])
+
+    return job
+
+
+def _commit(job, **fields):
+    """
+    Зафиксировать прогресс, если задание все еще принадлежит этому воркеру
+    (heartbeat_at не менялся с прошлой фиксации)
+    """
+    now = timezone.now()
+    updated = ExportJob.objects.filter(pk=job.pk, heartbeat_at=job.heartbeat_at).update(
+        heartbeat_at=now, updated_at=now, **fields
+    )
+    if not updated:
+        raise ExportJobLost(f"Export job {job.pk} was taken over by another worker")
+
+    job.heartbeat_at = now
+    for field, value in fields.items():
+        setattr(job, field, value)
+
+
+def _next_rows(job, querysets, chunk_size):
+    """
+    Следующие chunk_size строк после курсора: из каждой таблицы берется не
+    больше chunk_size строк по индексу (created_at, id), затем они сливаются
+    """
+    rows = []
+    for orders in querysets:
+        if job.cursor_created_at is not None:
+            later = Q(created_at__gt=job.cursor_created_at)
+            same_time = Q(created_at=job.cursor_created_at, id__gt=job.cursor_id)
+            orders = orders.filter(later | same_time)
+        rows += orders.values_list(*ORDER_EXPORT_FIELDS)[:chunk_size]
+
+    rows.sort(key=lambda row: (row[CREATED_AT], row[ORDER_ID]))
+    return rows[:chunk_size]
+
+
+def run_job(job, chunk_size=None):
+    """
+    Выгрузить задание до конца. Каждый кусок из chunk_size заявок сжимается
+    отдельным gzip member и дописывается в файл; после fsync в задании
+    фиксируются курсор и bytes_written. При продолжении хвост файла после
+    bytes_written (незафиксированный кусок) отрезается.
+    """
+    chunk_size = chunk_size or settings.EXCHANGE_EXPORT_JOB_CHUNK_SIZE
+
+    if not job.file:
+        job.file.name = f"exports/{job.pk}.csv.gz"
+        _commit(job, file=job.file.name)
+
+    path = job.file.path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    querysets = job_orders(job)
+    if job.total_rows is None:
+        _commit(job, total_rows=sum(orders.count() for orders in querysets))
+
+    try:
+        with open(path, "ab") as output:
+            output.truncate(job.bytes_written)
+
+            while True:
+                rows = _next_rows(job, querysets, chunk_size)
+                if not rows and job.bytes_written:
+                    break
+
+                text = csv_lines(export_row(row) for row in rows)
+                if not job.bytes_written:
+                    text = csv_header() + text
+                data = gzip.compress(text.encode())
+
+                output.write(data)
+                output.flush()
+                os.fsync(output.fileno())
+
+                progress = {
+                    "rows_written": job.rows_written + len(rows),
+                    "bytes_written": job.bytes_written + len(data),
+                }
+                if rows:
+                    progress["cursor_created_at"] = rows[-1][CREATED_AT]
+                    progress["cursor_id"] = rows[-1][ORDER_ID]
+                _commit(job, **progress)
+
+                if len(rows) < chunk_size:
+                    break
+
+        _commit(job, status="completed", finished_at=timezone.now())
+    except ExportJobLost:
+        raise
+    except Exception as e:
+        _commit(job, status="failed", error=str(e), finished_at=timezone.now())
+        raise
+
+    return job
+
+
+def run_pending_jobs(chunk_size=None):
+    """Выполнить все доступные задания; возвращает (выполнено, с ошибкой)"""
+    completed = failed = 0
+    while True:
+        job = claim_job()
+        if job is None:
+            return completed, failed
+
+        try:
+            run_job(job, chunk_size)
+            completed += 1
+        except ExportJobLost:
+            continue
+        except Exception:
+            failed += 1
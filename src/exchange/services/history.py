@@ -0,0 +1,187 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from exchange.models import PoolCandle, PoolSnapshot
+
+RATE_QUANTUM = Decimal("0.000000000001")
+
+# Интервал -> (интервал-источник, функция начала корзины)
+INTERVALS = {
+    "1m": (None, lambda dt: dt.replace(second=0, microsecond=0)),
+    "1h": ("1m", lambda dt: dt.replace(minute=0, second=0, microsecond=0)),
+    "1d": ("1h", lambda dt: dt.replace(hour=0, minute=0, second=0, microsecond=0)),
+}
+
+
+def spot_rate(token1_amount, token2_amount):
+    token1_amount = Decimal(str(token1_amount))
+    token2_amount = Decimal(str(token2_amount))
+    if token1_amount <= 0:
+        return Decimal("0")
+    return (token2_amount / token1_amount).quantize(RATE_QUANTUM)
+
+
+def record_snapshot(pool_id, token1_amount, token2_amount, version):
+    return PoolSnapshot.objects.create(
+        pool_id=pool_id,
+        token1_amount=token1_amount,
+        token2_amount=token2_amount,
+        rate=spot_rate(token1_amount, token2_amount),
+        version=version,
+    )
+
+
+def _source_rows(interval, pool_id, since):
+    """Строки (время, open, high, low, close, count) для агрегации интервала"""
+    source, _ = INTERVALS[interval]
+
+    if source is None:
+        rows = PoolSnapshot.objects.filter(pool_id=pool_id)
+        if since is not None:
+            rows = rows.filter(created_at__gte=since)
+        for created_at, rate in (
+            rows.order_by("created_at", "id")
+            .values_list("created_at", "rate")
+            .iterator()
+        ):
+            yield created_at, rate, rate, rate, rate, 1
+        return
+
+    rows = PoolCandle.objects.filter(pool_id=pool_id, interval=source)
+    if since is not None:
+        rows = rows.filter(bucket_start__gte=since)
+    yield from (
+        rows.order_by("bucket_start")
+        .values_list("bucket_start", "open", "high", "low", "close", "snapshots_count")
+        .iterator()
+    )
+
+
+def _aggregate_pool(interval, pool_id, since):
+    _, bucket_of = INTERVALS[interval]
+
+    candles = {}
+    for moment, open_, high, low, close, count in _source_rows(
+        interval, pool_id, since
+    ):
+        bucket = bucket_of(moment)
+        candle = candles.get(bucket)
+        if candle is None:
+            candles[bucket] = PoolCandle(
+                pool_id=pool_id,
+                interval=interval,
+                bucket_start=bucket,
+                open=open_,
+                high=high,
+                low=low,
+                close=close,
+                snapshots_count=count,
+            )
+        else:
+            candle.high = max(candle.high, high)
+            candle.low = min(candle.low, low)
+            candle.close = close
+            candle.snapshots_count += count
+
+    if candles:
+        PoolCandle.objects.bulk_create(
+            candles.values(),
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["pool", "interval", "bucket_start"],
+            update_fields=["open", "high", "low", "close", "snapshots_count"],
+        )
+    return len(candles)
+
+
+def aggregate_candles():
+    """
+    Досчитать свечи 1m из снимков, 1h из 1m и 1d из 1h.
+    Для каждого пула пересчитывается только последняя (возможно, неполная)
+    корзина и все, что появилось после нее. Возвращает {интервал: свечей}.
+    """
+    pool_ids = (
+        PoolSnapshot.objects.order_by().values_list("pool_id", flat=True).distinct()
+    )
+    written = {}
+
+    for interval in INTERVALS:
+        watermarks = dict(
+            PoolCandle.objects.filter(interval=interval)
+            .values("pool_id")
+            .annotate(last=Max("bucket_start"))
+            .values_list("pool_id", "last")
+        )
+        written[interval] = 0
+        for pool_id in pool_ids:
+            with transaction.atomic():
+                written[interval] += _aggregate_pool(
+                    interval, pool_id, watermarks.get(pool_id)
+                )
+
+    return written
+
+
+def compact_history():
+    """
+    Удалить сырые снимки старше EXCHANGE_SNAPSHOT_RETENTION_DAYS и минутные
+    свечи старше EXCHANGE_MINUTE_CANDLE_RETENTION_DAYS: они уже свернуты в
+    свечи следующего уровня. Возвращает (снимков, свечей) удалено.
+    """
+    now = timezone.now()
+
+    snapshot_cutoff = now - timedelta(days=settings.EXCHANGE_SNAPSHOT_RETENTION_DAYS)
+    minute_cutoff = now - timedelta(days=settings.EXCHANGE_MINUTE_CANDLE_RETENTION_DAYS)
+
+    # Не трогаем ничего новее последней агрегированной корзины
+    aggregated = dict(
+        PoolCandle.objects.filter(interval="1m")
+        .values("pool_id")
+        .annotate(last=Max("bucket_start"))
+        .values_list("pool_id", "last")
+    )
+
+    snapshots = 0
+    for pool_id, last in aggregated.items():
+        deleted, _ = PoolSnapshot.objects.filter(
+            pool_id=pool_id, created_at__lt=min(snapshot_cutoff, last)
+        ).delete()
+        snapshots += deleted
+
+    candles, _ = PoolCandle.objects.filter(
+        interval="1m", bucket_start__lt=minute_cutoff
+    ).delete()
+
+    return snapshots, candles
+
+
+def get_candles(pool, interval, limit=200, invert=False):
+    """Готовые свечи пула для графика, от старых к новым"""
+    candles = list(
+        PoolCandle.objects.filter(pool=pool, interval=interval)
+        .order_by("-bucket_start")
+        .values("bucket_start", "open", "high", "low", "close", "snapshots_count")[
+            :limit
+        ]
+    )
+    candles.reverse()
+
+    if invert:
+        for candle in candles:
+            candle["open"], candle["high"], candle["low"], candle["close"] = (
+                _invert(candle["open"]),
+                _invert(candle["low"]),
+                _invert(candle["high"]),
+                _invert(candle["close"]),
+            )
+
+    return candles
+
+
+def _invert(rate):
+    return (Decimal("1") / rate).quantize(RATE_QUANTUM) if rate else Decimal("0")
@@ -0,0 +1,105 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from exchange.models import ExchangeOrder, OrderEvent
+from exchange.services.stats import orders_status_changed
+
+# Допустимые переходы: исходный статус -> статусы, в которые можно перейти.
+# completed, cancelled и failed - конечные (их же переносит в архив archive_orders).
+ORDER_TRANSITIONS = {
+    "pending": ("processing", "completed", "cancelled", "failed"),
+    "processing": ("completed", "cancelled", "failed"),
+    "completed": (),
+    "cancelled": (),
+    "failed": (),
+}
+
+# Поля, которые нужны для перехода: статус, счетчики PoolStats
+TRANSITION_FIELDS = ("id", "status", "pool_id", "give_token_id", "give_amount")
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+class TransitionConflict(Exception):
+    """Заявки изменились между блокировкой и UPDATE; переход откатывается"""
+
+
+def can_transition(source, target):
+    return target in ORDER_TRANSITIONS.get(source, ())
+
+
+def _apply_transition(orders, targets, status, actor=None, note=""):
+    """
+    Перевести заблокированные заявки orders (в прежних статусах) в status.
+    targets - их pk: список или подзапрос. На каждый исходный статус один
+    UPDATE ... WHERE status = <исходный>, затем счетчики PoolStats и события
+    одним bulk_create.
+    """
+    by_source = defaultdict(int)
+    for order in orders:
+        if not can_transition(order.status, status):
+            raise InvalidTransition(f"{order.status} -> {status}")
+        by_source[order.status] += 1
+
+    now = timezone.now()
+    for source, count in by_source.items():
+        updated = ExchangeOrder.objects.filter(pk__in=targets, status=source).update(
+            status=status, updated_at=now
+        )
+        if updated != count:
+            raise TransitionConflict(
+                f"Expected {count} {source} orders to change, got {updated}"
+            )
+
+    orders_status_changed(orders, status)
+    OrderEvent.objects.bulk_create(
+        OrderEvent(
+            order_id=order.pk,
+            from_status=order.status,
+            to_status=status,
+            actor=actor,
+            note=note,
+            created_at=now,
+        )
+        for order in orders
+    )
+
+    for order in orders:
+        order.status = status
+
+
+def transition_orders(orders, status, actor=None, note=""):
+    """
+    Перевести заявки queryset orders в status, соблюдая ORDER_TRANSITIONS.
+    Заявки, для которых переход недопустим (или которые уже в status),
+    пропускаются. Запросов - SELECT, по UPDATE на исходный статус, счетчики
+    по пулам и пакетная вставка событий, а не по запросу на заявку.
+    Возвращает (переведено, пропущено).
+    """
+    with transaction.atomic():
+        locked = list(
+            orders.select_related(None).select_for_update().only(*TRANSITION_FIELDS)
+        )
+        allowed = [order for order in locked if can_transition(order.status, status)]
+        if allowed:
+            _apply_transition(
+                allowed, orders.order_by().values("pk"), status, actor, note
+            )
+
+    return len(allowed), len(locked) - len(allowed)
+
+
+def transition_locked_orders(orders, status, actor=None, note=""):
+    """
+    Переход уже заблокированных вызывающим заявок (например, пачки воркера
+    расчетов). Недопустимый переход - InvalidTransition.
+    """
+    _apply_transition(orders, [order.pk for order in orders], status, actor, note)
+
+
+def order_history(order_id):
+    return OrderEvent.objects.filter(order_id=order_id).select_related("actor")
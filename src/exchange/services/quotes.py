@@ -0,0 +1,124 @@
+from decimal import Decimal, InvalidOperation
+
+from exchange.services.amm import to_base_units
+from exchange.services.registry import pool_registry
+from exchange.services.routing import EXACT_IN, EXACT_OUT, find_best_route
+
+QUOTE_SIDES = (EXACT_IN, EXACT_OUT)
+
+
+# Суммы заявок хранятся в DecimalField(max_digits=15, decimal_places=2)
+MAX_AMOUNT = Decimal(10) ** 13
+
+
+class QuoteError(Exception):
+    pass
+
+
+def parse_amount(amount):
+    try:
+        amount = Decimal(str(amount or 0))
+    except InvalidOperation:
+        raise QuoteError("Некорректная сумма")
+
+    # NaN, Infinity и 1e999999 иначе упали бы при переводе в целые единицы
+    if not amount.is_finite():
+        raise QuoteError("Некорректная сумма")
+    if amount >= MAX_AMOUNT:
+        raise QuoteError("Слишком большая сумма")
+    return amount
+
+
+def resolve_tokens(give_token_id, receive_token_id, snapshot=None):
+    """
+    Токены пары из реестра. Async-код передает снимок, полученный из
+    asnapshot(), чтобы не обращаться к реестру повторно.
+    """
+    if not give_token_id or not receive_token_id:
+        raise QuoteError("Токены не выбраны")
+
+    if give_token_id == receive_token_id:
+        raise QuoteError("Выберите разные токены")
+
+    tokens = (snapshot or pool_registry.snapshot()).tokens
+    give_token = tokens.get(str(give_token_id))
+    receive_token = tokens.get(str(receive_token_id))
+
+    if give_token is None or receive_token is None:
+        raise QuoteError("Токен не найден")
+
+    return give_token, receive_token
+
+
+def find_route(give_token, receive_token, amount, side=EXACT_IN):
+    if side not in QUOTE_SIDES:
+        raise QuoteError("Неизвестный тип котировки")
+
+    token = give_token if side == EXACT_IN else receive_token
+    if to_base_units(amount, token.decimals) <= 0:
+        raise QuoteError(f"Сумма меньше минимальной единицы {token.short_name}")
+
+    route = find_best_route(give_token, receive_token, amount, side)
+    if route is None:
+        if side == EXACT_OUT and pool_registry.get_pool(give_token, receive_token):
+            raise QuoteError("Недостаточно ликвидности в пуле")
+        raise QuoteError(
+            f"Пул {give_token.short_name}/{receive_token.short_name} не найден"
+        )
+
+    return route
+
+
+def quote_pair(give_token, receive_token, amount, side=EXACT_IN):
+    route = find_route(give_token, receive_token, amount, side)
+    give_amount = route.amount_in
+    receive_amount = route.amount_out
+
+    effective_rate = receive_amount / give_amount if give_amount > 0 else Decimal("0")
+
+    return {
+        "side": side,
+        "input_amount": str(give_amount),
+        "output_amount": str(receive_amount),
+        "effective_rate": str(effective_rate),
+        "give_token_name": give_token.short_name,
+        "receive_token_name": receive_token.short_name,
+        "fee_percentage": str(route.fee_percentage),
+        "route": [token.short_name for token in route.tokens],
+    }
+
+
+def quote_batch(rows):
+    """
+    Котировки для списка запросов; токены каждой пары разрешаются один раз,
+    маршруты строятся по графу пулов из реестра без обращения к БД
+    """
+    pairs = {}
+    results = []
+
+    for row in rows:
+        give_token_id = row.get("give_token_id")
+        receive_token_id = row.get("receive_token_id")
+        side = row.get("side", EXACT_IN)
+
+        try:
+            amount = parse_amount(row.get("amount"))
+            if amount <= 0:
+                raise QuoteError("Введите сумму > 0")
+
+            key = (give_token_id, receive_token_id)
+            if key not in pairs:
+                try:
+                    pairs[key] = resolve_tokens(give_token_id, receive_token_id)
+                except QuoteError as e:
+                    pairs[key] = e
+
+            pair = pairs[key]
+            if isinstance(pair, QuoteError):
+                raise pair
+
+            results.append({"success": True, **quote_pair(*pair, amount, side)})
+        except QuoteError as e:
+            results.append({"success": False, "error": str(e)})
+
+    return results
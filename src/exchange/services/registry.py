@@ -0,0 +1,260 @@
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, field, replace
+
+from django.conf import settings
+from django.dispatch import Signal
+
+from exchange.models import Pool, Token
+
+# Sent after the registry sees a pool appear, change or disappear;
+# kwargs: pair_key, pool (None when the pool left the registry)
+pool_changed = Signal()
+
+
+def _in_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+@dataclass(frozen=True)
+class RegistrySnapshot:
+    tokens: dict = field(default_factory=dict)
+    pools: dict = field(default_factory=dict)
+    graph: dict = field(default_factory=dict)
+    loaded_at: float = 0.0
+
+
+class PoolRegistry:
+    """
+    Process-local cache of active tokens and pools.
+
+    Tokens are keyed by their id, pools by ``Pool.pair_key``, and
+    ``graph`` maps every token id to its neighbours and the pool connecting them.
+    The snapshot is loaded lazily, patched or dropped by the model signals in
+    ``exchange.services.signals`` and, as a safety net for writes made by other
+    processes, reloaded after ``EXCHANGE_REGISTRY_TTL`` seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._versions = {}
+
+    @staticmethod
+    def pair_key(token_a, token_b):
+        return Pool.build_pair_key(token_a, token_b)
+
+    @staticmethod
+    def _ttl():
+        return getattr(settings, "EXCHANGE_REGISTRY_TTL", 60)
+
+    def _is_fresh(self, snapshot):
+        return (
+            snapshot is not None and time.monotonic() - snapshot.loaded_at < self._ttl()
+        )
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot):
+            return snapshot
+
+        if _in_event_loop():
+            # Async callers refresh through asnapshot(); never block the loop here
+            if snapshot is None:
+                raise RuntimeError(
+                    "Pool registry is not loaded; await pool_registry.asnapshot() "
+                    "before using it from async code"
+                )
+            return snapshot
+
+        changes = []
+        with self._lock:
+            if not self._is_fresh(self._snapshot):
+                changes = self._replace(
+                    self._build(
+                        Token.objects.filter(is_active=True).select_related("network"),
+                        Pool.objects.filter(is_active=True).order_by("-created_at"),
+                    )
+                )
+            snapshot = self._snapshot
+
+        self._notify(changes)
+        return snapshot
+
+    async def asnapshot(self):
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot):
+            return snapshot
+
+        tokens = [
+            token
+            async for token in Token.objects.filter(is_active=True).select_related(
+                "network"
+            )
+        ]
+        pools = [
+            pool
+            async for pool in Pool.objects.filter(is_active=True).order_by(
+                "-created_at"
+            )
+        ]
+
+        with self._lock:
+            changes = self._replace(self._build(tokens, pools))
+            snapshot = self._snapshot
+
+        self._notify(changes)
+        return snapshot
+
+    def _replace(self, snapshot):
+        """
+        Install a new snapshot and return the pools whose version changed since
+        the last installed one, including pools that are gone.
+        """
+        self._snapshot = snapshot
+        if snapshot is None:
+            return []
+
+        versions = {
+            key: (pool.pk, pool.version) for key, pool in snapshot.pools.items()
+        }
+        changes = [
+            (key, snapshot.pools[key])
+            for key, version in versions.items()
+            if self._versions.get(key) != version
+        ]
+        changes += [(key, None) for key in self._versions.keys() - versions.keys()]
+
+        self._versions = versions
+        return changes
+
+    @staticmethod
+    def _notify(changes):
+        for pair_key, pool in changes:
+            pool_changed.send(sender=PoolRegistry, pair_key=pair_key, pool=pool)
+
+    @staticmethod
+    def _link(graph, pool):
+        token1_id, token2_id = str(pool.token1_id), str(pool.token2_id)
+        graph[token1_id] = {**graph.get(token1_id, {}), token2_id: pool}
+        graph[token2_id] = {**graph.get(token2_id, {}), token1_id: pool}
+
+    @staticmethod
+    def _build(tokens, pools):
+        tokens = {str(token.pk): token for token in tokens}
+
+        pools_by_pair = {}
+        graph = {}
+        for pool in pools:
+            token1 = tokens.get(str(pool.token1_id))
+            token2 = tokens.get(str(pool.token2_id))
+            if token1 is None or token2 is None:
+                continue
+
+            key = PoolRegistry.pair_key(token1, token2)
+            if key in pools_by_pair:
+                continue
+
+            pool.token1 = token1
+            pool.token2 = token2
+            pools_by_pair[key] = pool
+            PoolRegistry._link(graph, pool)
+
+        return RegistrySnapshot(
+            tokens=tokens, pools=pools_by_pair, graph=graph, loaded_at=time.monotonic()
+        )
+
+    @staticmethod
+    def _patch(snapshot, pool_id, pool):
+        """
+        Replace one pool in the snapshot. Returns None when the change cannot be
+        applied in place (a pool disappeared or moved to another pair) and the
+        snapshot has to be reloaded.
+        """
+        old_key = next(
+            (
+                key
+                for key, item in snapshot.pools.items()
+                if str(item.pk) == str(pool_id)
+            ),
+            None,
+        )
+
+        if pool is not None:
+            token1 = snapshot.tokens.get(str(pool.token1_id))
+            token2 = snapshot.tokens.get(str(pool.token2_id))
+            if token1 is None or token2 is None:
+                pool = None
+
+        if pool is None:
+            return snapshot if old_key is None else None
+
+        new_key = PoolRegistry.pair_key(token1, token2)
+        if old_key != new_key and (old_key is not None or new_key in snapshot.pools):
+            return None
+
+        pool.token1 = token1
+        pool.token2 = token2
+
+        pools = {**snapshot.pools, new_key: pool}
+        graph = dict(snapshot.graph)
+        PoolRegistry._link(graph, pool)
+
+        return RegistrySnapshot(
+            tokens=snapshot.tokens,
+            pools=pools,
+            graph=graph,
+            loaded_at=snapshot.loaded_at,
+        )
+
+    def refresh_pool(self, pool_id):
+        if self._snapshot is None:
+            return
+
+        pool = Pool.objects.filter(pk=pool_id, is_active=True).first()
+
+        changes = []
+        with self._lock:
+            if self._snapshot is not None:
+                patched = self._patch(self._snapshot, pool_id, pool)
+                if patched is None:
+                    self._expire()
+                else:
+                    changes = self._replace(patched)
+
+        self._notify(changes)
+
+    def _expire(self):
+        """
+        Mark the snapshot stale instead of dropping it: sync callers reload it
+        on the next access, async ones keep using it until asnapshot() runs.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None:
+            self._snapshot = replace(snapshot, loaded_at=float("-inf"))
+
+    def invalidate(self):
+        self._expire()
+
+    def get_token(self, token_id):
+        return self.snapshot().tokens.get(str(token_id))
+
+    def get_pool(self, token_a, token_b):
+        return self.snapshot().pools.get(self.pair_key(token_a, token_b))
+
+    def neighbours(self, token):
+        return self.snapshot().graph.get(str(getattr(token, "pk", token)), {})
+
+    def tokens(self):
+        return list(self.snapshot().tokens.values())
+
+    def pools(self):
+        return list(self.snapshot().pools.values())
+
+
+pool_registry = PoolRegistry()
@@ -0,0 +1,149 @@
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.conf import settings
+
+from exchange.services.amm import from_base_units, to_base_units
+from exchange.services.registry import pool_registry
+
+EXACT_IN = "exact_in"
+EXACT_OUT = "exact_out"
+
+
+@dataclass(frozen=True)
+class RouteHop:
+    pool: object
+    token_in: object
+    token_out: object
+    amount_in_units: int
+    amount_out_units: int
+
+    @property
+    def amount_in(self):
+        return from_base_units(self.amount_in_units, self.token_in.decimals)
+
+    @property
+    def amount_out(self):
+        return from_base_units(self.amount_out_units, self.token_out.decimals)
+
+    def as_dict(self):
+        return {
+            "pool": str(self.pool.pk),
+            "token_in": str(self.token_in.pk),
+            "token_out": str(self.token_out.pk),
+            "amount_in": str(self.amount_in),
+            "amount_out": str(self.amount_out),
+        }
+
+
+@dataclass(frozen=True)
+class Route:
+    hops: tuple
+
+    @property
+    def amount_in(self):
+        return self.hops[0].amount_in
+
+    @property
+    def amount_out(self):
+        return self.hops[-1].amount_out
+
+    @property
+    def pool(self):
+        return self.hops[0].pool
+
+    @property
+    def tokens(self):
+        return [self.hops[0].token_in] + [hop.token_out for hop in self.hops]
+
+    @property
+    def fee_percentage(self):
+        """Совокупная комиссия маршрута: 100 - Π(100 - fee_i) / 100^(n-1)"""
+        remaining = Decimal("1")
+        for hop in self.hops:
+            remaining *= (Decimal("100") - hop.pool.fee_percentage) / Decimal("100")
+        return Decimal("100") - remaining * Decimal("100")
+
+    def as_list(self):
+        return [hop.as_dict() for hop in self.hops]
+
+
+def _max_hops(max_hops):
+    return max_hops or getattr(settings, "EXCHANGE_MAX_ROUTE_HOPS", 3)
+
+
+def _walk_exact_in(token, target, amount, max_hops, visited, hops):
+    if token.pk == target.pk:
+        yield tuple(hops)
+        return
+
+    if len(hops) == max_hops:
+        return
+
+    for neighbour_id, pool in pool_registry.neighbours(token).items():
+        if neighbour_id in visited:
+            continue
+
+        token_out = pool.token2 if pool.token1_id == token.pk else pool.token1
+        amount_out = pool.amm_state.get_output_amount(token.pk, amount)
+        if amount_out <= 0:
+            continue
+
+        hops.append(RouteHop(pool, token, token_out, amount, amount_out))
+        visited.add(neighbour_id)
+        yield from _walk_exact_in(
+            token_out, target, amount_out, max_hops, visited, hops
+        )
+        visited.discard(neighbour_id)
+        hops.pop()
+
+
+def _walk_exact_out(token, source, amount, max_hops, visited, hops):
+    if token.pk == source.pk:
+        yield tuple(reversed(hops))
+        return
+
+    if len(hops) == max_hops:
+        return
+
+    for neighbour_id, pool in pool_registry.neighbours(token).items():
+        if neighbour_id in visited:
+            continue
+
+        token_in = pool.token2 if pool.token1_id == token.pk else pool.token1
+        try:
+            amount_in = pool.amm_state.get_input_amount(token.pk, amount)
+        except ValueError:
+            continue
+        if amount_in <= 0:
+            continue
+
+        hops.append(RouteHop(pool, token_in, token, amount_in, amount))
+        visited.add(neighbour_id)
+        yield from _walk_exact_out(token_in, source, amount_in, max_hops, visited, hops)
+        visited.discard(neighbour_id)
+        hops.pop()
+
+
+def find_best_route(give_token, receive_token, amount, side=EXACT_IN, max_hops=None):
+    """
+    Лучший маршрут обмена через граф активных пулов (не длиннее max_hops).
+    Для exact_in выбирается максимальный выход, для exact_out - минимальный вход.
+    Суммы по маршруту считаются в целых минимальных единицах (Token.decimals).
+    """
+    max_hops = _max_hops(max_hops)
+
+    if side == EXACT_IN:
+        units = to_base_units(amount, give_token.decimals)
+        paths = _walk_exact_in(
+            give_token, receive_token, units, max_hops, {str(give_token.pk)}, []
+        )
+        best = max(paths, key=lambda hops: hops[-1].amount_out_units, default=None)
+    else:
+        units = to_base_units(amount, receive_token.decimals)
+        paths = _walk_exact_out(
+            receive_token, give_token, units, max_hops, {str(receive_token.pk)}, []
+        )
+        best = min(paths, key=lambda hops: hops[0].amount_in_units, default=None)
+
+    return Route(best) if best else None
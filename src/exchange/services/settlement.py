@@ -0,0 +1,185 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import BooleanField, F
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from exchange.models import OPEN_ORDER_STATUSES, ExchangeOrder, Pool
+from exchange.services.history import record_snapshot
+from exchange.services.registry import pool_registry
+from exchange.services.orders import TransitionConflict, transition_locked_orders
+
+SETTLEABLE_STATUSES = OPEN_ORDER_STATUSES
+
+
+class SettlementError(Exception):
+    pass
+
+
+def settleable_orders():
+    """
+    Заявки, ожидающие расчета. Условие записано литералами, как в частичном
+    индексе exchange_order_open_created: SQLite не применяет частичный индекс
+    к условию с параметрами.
+    """
+    column = "%s.%s" % (
+        connection.ops.quote_name(ExchangeOrder._meta.db_table),
+        connection.ops.quote_name(ExchangeOrder._meta.get_field("status").column),
+    )
+    statuses = ", ".join(f"'{status}'" for status in SETTLEABLE_STATUSES)
+    return ExchangeOrder.objects.filter(
+        RawSQL(f"{column} IN ({statuses})", [], output_field=BooleanField())
+    )
+
+
+def order_legs(order):
+    """
+    Свопы заявки: (pool_id, token_in_id, amount_in, token_out_id, amount_out).
+    Для маршрутных заявок берутся плечи из ExchangeOrder.route.
+    """
+    if order.route:
+        return [
+            (
+                leg["pool"],
+                leg["token_in"],
+                Decimal(leg["amount_in"]),
+                leg["token_out"],
+                Decimal(leg["amount_out"]),
+            )
+            for leg in order.route
+        ]
+
+    return [
+        (
+            order.pool_id,
+            order.give_token_id,
+            order.give_amount,
+            order.receive_token_id,
+            order.receive_amount,
+        )
+    ]
+
+
+def order_deltas(orders):
+    """Суммарное изменение резервов по пулам: {pool_id: {token_id: delta}}"""
+    deltas = defaultdict(lambda: defaultdict(Decimal))
+    for order in orders:
+        for pool_id, token_in, amount_in, token_out, amount_out in order_legs(order):
+            deltas[str(pool_id)][str(token_in)] += amount_in
+            deltas[str(pool_id)][str(token_out)] -= amount_out
+    return deltas
+
+
+def apply_pool_delta(pool_id, delta, max_retries=None):
+    """
+    Сдвинуть резервы пула на delta ({token_id: amount}) через compare-and-swap
+    по Pool.version. Строка не блокируется на время расчета: при конфликте
+    резервы перечитываются и попытка повторяется.
+    """
+    max_retries = max_retries or settings.EXCHANGE_SETTLEMENT_MAX_RETRIES
+
+    for _ in range(max_retries):
+        row = (
+            Pool.objects.filter(pk=pool_id)
+            .values(
+                "token1_id", "token2_id", "token1_amount", "token2_amount", "version"
+            )
+            .first()
+        )
+        if row is None:
+            raise SettlementError(f"Пул {pool_id} не найден")
+
+        unknown = set(delta) - {str(row["token1_id"]), str(row["token2_id"])}
+        if unknown:
+            raise SettlementError(f"Токен не принадлежит пулу {pool_id}")
+
+        token1_amount = row["token1_amount"] + delta.get(str(row["token1_id"]), 0)
+        token2_amount = row["token2_amount"] + delta.get(str(row["token2_id"]), 0)
+        if token1_amount < 0 or token2_amount < 0:
+            raise SettlementError(f"Недостаточно резерва в пуле {pool_id}")
+
+        updated = Pool.objects.filter(pk=pool_id, version=row["version"]).update(
+            token1_amount=token1_amount,
+            token2_amount=token2_amount,
+            version=F("version") + 1,
+            updated_at=timezone.now(),
+        )
+        if updated:
+            record_snapshot(pool_id, token1_amount, token2_amount, row["version"] + 1)
+            pool_id = str(pool_id)
+            transaction.on_commit(lambda: pool_registry.refresh_pool(pool_id))
+            return row["version"] + 1
+
+    raise SettlementError(f"Пул {pool_id} изменяется слишком часто, повторите позже")
+
+
+def settle_batch(orders, actor=None):
+    """
+    Завершить пачку заявок одной транзакцией: встречные потоки по каждому пулу
+    взаимозачитываются, и резервы пула обновляются одним CAS на всю пачку.
+    Заявки, которые уже завершил кто-то другой, пропускаются.
+    Возвращает (завершенные заявки, число записей в пулы).
+    """
+    ids = [order.pk for order in orders]
+
+    with transaction.atomic():
+        claimed = list(
+            ExchangeOrder.objects.select_for_update(skip_locked=True)
+            .filter(pk__in=ids, status__in=SETTLEABLE_STATUSES)
+            .only(
+                "id",
+                "status",
+                "pool_id",
+                "give_token_id",
+                "give_amount",
+                "receive_token_id",
+                "receive_amount",
+                "route",
+            )
+        )
+        if not claimed:
+            return [], 0
+
+        transition_locked_orders(claimed, "completed", actor=actor, note="Settled")
+
+        pool_writes = 0
+        for pool_id, delta in sorted(order_deltas(claimed).items()):
+            if any(delta.values()):
+                apply_pool_delta(pool_id, delta)
+                pool_writes += 1
+
+    return claimed, pool_writes
+
+
+def settle_orders(orders, actor=None):
+    """
+    Завершить заявки пачками по пулам (settle_batch): резервы каждого пула
+    обновляются один раз на пачку. Если пачка не проходит (конфликт или
+    нехватка резерва, или заявки изменились под блокировкой), ее заявки
+    завершаются по одной, чтобы отсеять проблемные.
+    Возвращает (завершено, [(заявка, ошибка)]).
+    """
+    by_pool = defaultdict(list)
+    for order in orders:
+        by_pool[order.pool_id].append(order)
+
+    settled = 0
+    errors = []
+    for batch in by_pool.values():
+        try:
+            claimed, _ = settle_batch(batch, actor=actor)
+            settled += len(claimed)
+            continue
+        except (SettlementError, TransitionConflict):
+            pass
+
+        for order in batch:
+            try:
+                claimed, _ = settle_batch([order], actor=actor)
+                settled += len(claimed)
+            except (SettlementError, TransitionConflict) as e:
+                errors.append((order, e))
+    return settled, errors
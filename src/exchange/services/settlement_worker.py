@@ -0,0 +1,128 @@
+import logging
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from exchange.services.settlement import (
+    SettlementError,
+    settle_batch,
+    settleable_orders,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SettlementStats:
+    orders: int = 0
+    batches: int = 0
+    pool_writes: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+
+    @property
+    def throughput(self):
+        return self.orders / self.seconds if self.seconds > 0 else 0.0
+
+    def add(self, other):
+        self.orders += other.orders
+        self.batches += other.batches
+        self.pool_writes += other.pool_writes
+        self.failed += other.failed
+        self.seconds += other.seconds
+
+    def __str__(self):
+        return (
+            f"{self.orders} orders in {self.batches} batches, "
+            f"{self.pool_writes} pool writes, {self.failed} failed, "
+            f"{self.throughput:.1f} orders/s"
+        )
+
+
+class SettlementWorker:
+    """
+    Завершает ожидающие заявки пачками по пулам.
+
+    Пачка пула отправляется, когда в ней набралось batch_size заявок или самая
+    старая из них ждет дольше max_latency секунд. Если пачка не проходит
+    (например, в пуле не хватает резерва), ее заявки завершаются по одной,
+    чтобы отсеять проблемные.
+    """
+
+    def __init__(self, batch_size=None, max_latency=None, scan_limit=None):
+        self.batch_size = batch_size or settings.EXCHANGE_SETTLEMENT_BATCH_SIZE
+        self.max_latency = (
+            max_latency
+            if max_latency is not None
+            else settings.EXCHANGE_SETTLEMENT_MAX_LATENCY
+        )
+        self.scan_limit = scan_limit or self.batch_size * 20
+
+    def _pending_batches(self):
+        orders = (
+            settleable_orders()
+            .order_by("created_at")
+            .only("id", "pool_id", "created_at")[: self.scan_limit]
+        )
+
+        by_pool = defaultdict(list)
+        for order in orders:
+            by_pool[order.pool_id].append(order)
+
+        deadline = timezone.now() - timedelta(seconds=self.max_latency)
+        for pool_orders in by_pool.values():
+            for start in range(0, len(pool_orders), self.batch_size):
+                end = start + self.batch_size
+                batch = pool_orders[start:end]
+                if len(batch) == self.batch_size or batch[0].created_at <= deadline:
+                    yield batch
+
+    def _settle_one_by_one(self, batch, stats):
+        for order in batch:
+            try:
+                settled, pool_writes = settle_batch([order])
+                stats.orders += len(settled)
+                stats.pool_writes += pool_writes
+            except SettlementError as e:
+                stats.failed += 1
+                logger.warning("Order %s was not settled: %s", order.pk, e)
+
+    def run_once(self):
+        stats = SettlementStats()
+        started = time.monotonic()
+
+        for batch in self._pending_batches():
+            stats.batches += 1
+            try:
+                settled, pool_writes = settle_batch(batch)
+                stats.orders += len(settled)
+                stats.pool_writes += pool_writes
+            except SettlementError as e:
+                logger.warning(
+                    "Batch of %s orders failed (%s), retrying one by one", len(batch), e
+                )
+                self._settle_one_by_one(batch, stats)
+
+        stats.seconds = time.monotonic() - started
+        return stats
+
+    def run(self, poll_interval=1.0, iterations=None, report=None):
+        total = SettlementStats()
+        iteration = 0
+
+        while iterations is None or iteration < iterations:
+            stats = self.run_once()
+            total.add(stats)
+            iteration += 1
+
+            if report and stats.batches:
+                report(stats, total)
+
+            if not stats.batches:
+                time.sleep(poll_interval)
+
+        return total
@@ -0,0 +1,80 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from exchange.models import ExchangeOrder, Network, Pool, Token
+from exchange.services import stats
+from exchange.services.catalog import bump_catalog_version
+from exchange.services.history import record_snapshot
+from exchange.services.registry import pool_changed, pool_registry
+from exchange.services.stream import pool_publisher
+
+
+@receiver(post_save, sender=Network)
+@receiver(post_delete, sender=Network)
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_pool_registry(sender, **kwargs):
+    transaction.on_commit(pool_registry.invalidate)
+
+
+@receiver(post_save, sender=Network)
+@receiver(post_delete, sender=Network)
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_catalog_fragments(sender, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Pool)
+@receiver(post_delete, sender=Pool)
+def refresh_registry_pool(sender, instance, **kwargs):
+    pool_id = instance.pk
+    transaction.on_commit(lambda: pool_registry.refresh_pool(pool_id))
+
+
+@receiver(post_save, sender=Pool)
+def record_pool_snapshot(sender, instance, created, **kwargs):
+    if created or instance.reserves_changed:
+        record_snapshot(
+            instance.pk,
+            instance.token1_amount,
+            instance.token2_amount,
+            instance.version,
+        )
+    instance._loaded_reserves = (instance.token1_amount, instance.token2_amount)
+
+
+@receiver(pool_changed)
+def publish_pool_change(sender, pair_key, pool, **kwargs):
+    pool_publisher.publish(pair_key, pool)
+
+
+@receiver(post_save, sender=Network)
+def update_network_stats(sender, instance, created, **kwargs):
+    stats.network_saved(instance, created)
+
+
+@receiver(post_save, sender=Token)
+def update_token_stats(sender, instance, created, **kwargs):
+    stats.token_saved(instance, created)
+
+
+@receiver(post_save, sender=Pool)
+def update_pool_stats(sender, instance, created, **kwargs):
+    stats.pool_saved(instance, created)
+
+
+@receiver(post_delete, sender=Pool)
+def release_pool_stats(sender, instance, **kwargs):
+    stats.pool_deleted(instance)
+
+
+@receiver(post_save, sender=ExchangeOrder)
+def update_order_stats(sender, instance, created, **kwargs):
+    stats.order_saved(instance, created)
+
+
+@receiver(post_delete, sender=ExchangeOrder)
+def release_order_stats(sender, instance, **kwargs):
+    stats.order_deleted(instance)
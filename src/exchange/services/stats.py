@@ -0,0 +1,252 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from exchange.models import (
+    Network,
+    NetworkStats,
+    Pool,
+    PoolStats,
+    Token,
+    TokenStats,
+)
+from exchange.services.archive import ORDER_MODELS
+
+
+def _increment(model, pk, create=True, **deltas):
+    """Сдвинуть счетчики одной строки UPDATE ... SET f = f + delta"""
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if not changes:
+        return
+
+    if model.objects.filter(pk=pk).update(**changes) or not create:
+        return
+
+    model.objects.get_or_create(pk=pk)
+    model.objects.filter(pk=pk).update(**changes)
+
+
+def order_counters(status, give_token_id, give_amount, token1_id):
+    """Вклад одной заявки в счетчики PoolStats ее пула"""
+    counters = {"orders_total": 1, f"orders_{status}": 1}
+    if status == "completed":
+        direction = "1" if str(give_token_id) == str(token1_id) else "2"
+        counters[f"volume_token{direction}_in"] = give_amount
+    return counters
+
+
+def apply_order_changes(removed=(), added=()):
+    """
+    Убрать из счетчиков заявки в состояниях removed и добавить added.
+    Состояние - ExchangeOrder.stats_state: (pool_id, status, give_token_id,
+    give_amount). На каждый затронутый пул приходится один UPDATE.
+    """
+    rows = [(state, -1) for state in removed] + [(state, 1) for state in added]
+    if not rows:
+        return
+
+    token1_ids = dict(
+        Pool.objects.filter(pk__in={state[0] for state, _ in rows}).values_list(
+            "pk", "token1_id"
+        )
+    )
+
+    deltas = defaultdict(Counter)
+    for (pool_id, status, give_token_id, give_amount), sign in rows:
+        if pool_id not in token1_ids:
+            continue
+        counters = order_counters(
+            status, give_token_id, give_amount, token1_ids[pool_id]
+        )
+        for field, value in counters.items():
+            deltas[pool_id][field] += sign * value
+
+    for pool_id in sorted(deltas):
+        _increment(PoolStats, pool_id, **deltas[pool_id])
+
+
+def order_saved(order, created):
+    new_state = order.stats_state
+    old_state = getattr(order, "_loaded_stats_state", None)
+
+    if created:
+        apply_order_changes(added=[new_state])
+    elif old_state is not None and old_state != new_state:
+        apply_order_changes(removed=[old_state], added=[new_state])
+
+    order._loaded_stats_state = new_state
+
+
+def order_deleted(order):
+    apply_order_changes(
+        removed=[getattr(order, "_loaded_stats_state", order.stats_state)]
+    )
+
+
+def orders_status_changed(orders, status):
+    """Массовая смена статуса: orders - заявки со статусом до изменения"""
+    removed = [order.stats_state for order in orders]
+    added = [(pool_id, status, token, amount) for pool_id, _, token, amount in removed]
+    apply_order_changes(removed=removed, added=added)
+
+
+def _adjust_pools_count(token_ids, sign):
+    token_ids = {token_id for token_id in token_ids if token_id is not None}
+    network_ids = set(
+        Token.objects.filter(pk__in=token_ids).values_list("network_id", flat=True)
+    )
+
+    for token_id in sorted(token_ids):
+        _increment(TokenStats, token_id, create=sign > 0, pools_count=sign)
+    for network_id in sorted(network_ids):
+        _increment(NetworkStats, network_id, create=sign > 0, pools_count=sign)
+
+
+def pool_saved(pool, created):
+    new_tokens = (pool.token1_id, pool.token2_id)
+    old_tokens = getattr(pool, "_loaded_tokens", None)
+
+    if created:
+        PoolStats.objects.get_or_create(pool_id=pool.pk)
+        _adjust_pools_count(new_tokens, 1)
+    elif old_tokens is not None and set(old_tokens) != set(new_tokens):
+        _adjust_pools_count(old_tokens, -1)
+        _adjust_pools_count(new_tokens, 1)
+
+    pool._loaded_tokens = new_tokens
+
+
+def pool_deleted(pool):
+    _adjust_pools_count(
+        getattr(pool, "_loaded_tokens", (pool.token1_id, pool.token2_id)), -1
+    )
+
+
+def _move_token_network(token, old_network_id):
+    """
+    Токен перешел из old_network_id в другую сеть. Пул учитывается в каждой
+    сети своих токенов один раз, поэтому вклад пула зависит от сети второго
+    токена; читаются только пулы этого токена.
+    """
+    others = [
+        *Pool.objects.filter(token1_id=token.pk).values_list(
+            "token2__network_id", flat=True
+        ),
+        *Pool.objects.filter(token2_id=token.pk).values_list(
+            "token1__network_id", flat=True
+        ),
+    ]
+
+    deltas = Counter()
+    for other_network_id in others:
+        old_networks = {old_network_id, other_network_id}
+        new_networks = {token.network_id, other_network_id}
+        deltas.update(dict.fromkeys(new_networks - old_networks, 1))
+        deltas.subtract(dict.fromkeys(old_networks - new_networks, 1))
+
+    for network_id in sorted(deltas, key=str):
+        _increment(NetworkStats, network_id, pools_count=deltas[network_id])
+
+
+def token_saved(token, created):
+    old_network_id = getattr(token, "_loaded_network_id", None)
+
+    if created:
+        TokenStats.objects.get_or_create(token_id=token.pk)
+    elif old_network_id is not None and old_network_id != token.network_id:
+        _move_token_network(token, old_network_id)
+
+    token._loaded_network_id = token.network_id
+
+
+def network_saved(network, created):
+    if created:
+        NetworkStats.objects.get_or_create(network_id=network.pk)
+
+
+def _pool_counts():
+    tokens = Counter()
+    networks = Counter()
+    for token1, token2, network1, network2 in Pool.objects.values_list(
+        "token1_id", "token2_id", "token1__network_id", "token2__network_id"
+    ):
+        tokens.update({token1, token2})
+        networks.update({network1, network2})
+    return tokens, networks
+
+
+def _rebuild_network_stats(networks=None):
+    if networks is None:
+        _, networks = _pool_counts()
+
+    NetworkStats.objects.bulk_create(
+        [
+            NetworkStats(network_id=network_id, pools_count=networks[network_id])
+            for network_id in Network.objects.values_list("pk", flat=True)
+        ],
+        update_conflicts=True,
+        unique_fields=["network"],
+        update_fields=["pools_count"],
+    )
+
+
+@transaction.atomic
+def rebuild_stats():
+    """Пересчитать все счетчики с нуля (первичное заполнение, починка расхождений)"""
+    tokens, networks = _pool_counts()
+
+    TokenStats.objects.bulk_create(
+        [
+            TokenStats(token_id=token_id, pools_count=tokens[token_id])
+            for token_id in Token.objects.values_list("pk", flat=True)
+        ],
+        update_conflicts=True,
+        unique_fields=["token"],
+        update_fields=["pools_count"],
+    )
+    _rebuild_network_stats(networks)
+
+    pools = {
+        pool_id: PoolStats(pool_id=pool_id)
+        for pool_id in Pool.objects.values_list("pk", flat=True)
+    }
+    # Архивные заявки остаются в счетчиках: архивация их не уменьшает
+    for model in ORDER_MODELS:
+        orders = model.objects.order_by()
+        for pool_id, status, count in orders.values_list("pool_id", "status").annotate(
+            count=Count("id")
+        ):
+            stats = pools[pool_id]
+            stats.orders_total += count
+            field = f"orders_{status}"
+            setattr(stats, field, getattr(stats, field) + count)
+
+        for pool_id, give_token_id, token1_id, volume in (
+            orders.filter(status="completed")
+            .values_list("pool_id", "give_token_id", "pool__token1_id")
+            .annotate(volume=Sum("give_amount"))
+        ):
+            counters = order_counters("completed", give_token_id, volume, token1_id)
+            for field in ("volume_token1_in", "volume_token2_in"):
+                setattr(
+                    pools[pool_id],
+                    field,
+                    getattr(pools[pool_id], field) + counters.get(field, 0),
+                )
+
+    PoolStats.objects.bulk_create(
+        pools.values(),
+        update_conflicts=True,
+        unique_fields=["pool"],
+        update_fields=[
+            "orders_total",
+            "orders_pending",
+            "orders_processing",
+            "orders_completed",
+            "orders_cancelled",
+            "orders_failed",
+            "volume_token1_in",
+            "volume_token2_in",
+        ],
+    )
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+
+from exchange.services.registry import pool_registry
+
+
+def pool_payload(pair_key, pool):
+    """Состояние пула, достаточное для расчета котировки на клиенте"""
+    if pool is None:
+        return {"pair_key": pair_key, "active": False}
+
+    return {
+        "pair_key": pair_key,
+        "active": True,
+        "pool": str(pool.pk),
+        "version": pool.version,
+        "token1": str(pool.token1_id),
+        "token2": str(pool.token2_id),
+        "token1_amount": str(pool.token1_amount),
+        "token2_amount": str(pool.token2_amount),
+        "token1_decimals": pool.token1.decimals,
+        "token2_decimals": pool.token2.decimals,
+        "fee_percentage": str(pool.fee_percentage),
+    }
+
+
+def streaming_supported(request):
+    """
+    SSE держит соединение открытым, пока клиент не уйдет. Под WSGI Django
+    дочитывает async-итератор до конца перед ответом и занимает воркер
+    навсегда, поэтому поток отдается только под ASGI (uvicorn config.asgi).
+    """
+    return settings.EXCHANGE_STREAM_ENABLED and isinstance(request, ASGIRequest)
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class PoolPublisher:
+    """
+    Один на процесс: раздает изменения пулов подписанным SSE-клиентам.
+
+    Изменения приходят из сигнала pool_changed реестра (в любом потоке) и
+    кладутся в очереди подписчиков через call_soon_threadsafe их event loop.
+    Медленный клиент теряет самые старые события, а не тормозит остальных.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, pair_keys):
+        queue = asyncio.Queue(maxsize=settings.EXCHANGE_STREAM_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[queue] = (
+                asyncio.get_running_loop(),
+                frozenset(pair_keys),
+            )
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    @property
+    def subscribers_count(self):
+        return len(self._subscribers)
+
+    @staticmethod
+    def _put(queue, payload):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(payload)
+
+    def publish(self, pair_key, pool):
+        with self._lock:
+            targets = [
+                (queue, loop)
+                for queue, (loop, pair_keys) in self._subscribers.items()
+                if pair_key in pair_keys
+            ]
+        if not targets:
+            return
+
+        payload = pool_payload(pair_key, pool)
+        for queue, loop in targets:
+            try:
+                loop.call_soon_threadsafe(self._put, queue, payload)
+            except RuntimeError:
+                self.unsubscribe(queue)
+
+    async def events(self, pair_keys):
+        """
+        Генератор SSE: сначала текущее состояние пулов, затем их изменения.
+        Пока изменений нет, шлется heartbeat, и заодно обновляется реестр,
+        чтобы увидеть записи других процессов (например, воркера расчетов).
+        """
+        queue = self.subscribe(pair_keys)
+        try:
+            snapshot = await pool_registry.asnapshot()
+            for pair_key in pair_keys:
+                yield format_event(
+                    "pool", pool_payload(pair_key, snapshot.pools.get(pair_key))
+                )
+
+            while True:
+                try:
+                    payload = await asyncio.wait_for(
+                        queue.get(), timeout=settings.EXCHANGE_STREAM_HEARTBEAT
+                    )
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    await pool_registry.asnapshot()
+                    continue
+
+                yield format_event("pool", payload)
+        finally:
+            self.unsubscribe(queue)
+
+
+pool_publisher = PoolPublisher()
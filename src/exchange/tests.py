@@ -1,3 +1,956 @@
-from django.test import TestCase
+import gzip
+import os
+import tempfile
+import threading
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.contrib.messages import constants
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import close_old_connections, connection
+from django.db.models.signals import post_save
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from exchange.models import (
+    ExchangeOrder,
+    ExportJob,
+    ExportStorage,
+    Network,
+    NetworkStats,
+    Pool,
+    PoolSnapshot,
+    PoolStats,
+    PoolVersionConflict,
+    Token,
+    TokenStats,
+)
+from exchange.services.export import csv_header
+from exchange.services.export_jobs import claim_job, run_job
+from exchange.services.orders import TransitionConflict
+from exchange.services.registry import pool_registry
+from exchange.services.settlement import (
+    SettlementError,
+    apply_pool_delta,
+    settle_orders,
+)
+from exchange.services.settlement_worker import SettlementWorker
+from exchange.services.stats import rebuild_stats
+
+
+class SettlementConcurrencyTests(TransactionTestCase):
+    """
+    Потоки завершают заявки параллельно. На SQLite записи сериализуются самой
+    базой (IMMEDIATE-транзакции), на Postgres их упорядочивают блокировки строк:
+    DATABASE_URL=postgres://... python -m django test exchange
+    """
+
+    threads = 8
+    orders_per_pool = 40
+
+    def setUp(self):
+        network = Network.objects.create(name="TON", short_name="TON")
+        self.usdt = Token.objects.create(
+            name="Tether", short_name="USDT", network=network
+        )
+        self.ton = Token.objects.create(
+            name="Toncoin", short_name="TON", network=network
+        )
+        self.pools = [
+            Pool.objects.create(
+                name=f"USDT/TON {i}",
+                token1=(
+                    self.usdt
+                    if i == 0
+                    else Token.objects.create(
+                        name=f"Token {i}", short_name=f"T{i}", network=network
+                    )
+                ),
+                token2=self.ton,
+                token1_amount=Decimal("30000.00"),
+                token2_amount=Decimal("10000.00"),
+            )
+            for i in range(3)
+        ]
+
+    def _create_orders(self, pool):
+        return [
+            ExchangeOrder.objects.create(
+                email="user@example.com",
+                give_token=pool.token1,
+                give_amount=Decimal("3.00"),
+                receive_token=pool.token2,
+                receive_amount=Decimal("1.00"),
+                exchange_rate=Decimal("0.33"),
+                fee_percentage=pool.fee_percentage,
+                pool=pool,
+            )
+            for _ in range(self.orders_per_pool)
+        ]
+
+    def _settle_concurrently(self, orders):
+        errors = []
+        barrier = threading.Barrier(self.threads)
+
+        def worker(chunk):
+            barrier.wait()
+            try:
+                for order in chunk:
+                    _, failed = settle_orders([order])
+                    errors.extend(error for _, error in failed)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                close_old_connections()
+
+        step = self.threads
+        workers = [
+            threading.Thread(target=worker, args=(orders[i::step],))
+            for i in range(step)
+        ]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        return errors
+
+    def test_concurrent_settlements_on_one_pool_keep_reserves_consistent(self):
+        pool = self.pools[0]
+        orders = self._create_orders(pool)
+
+        errors = self._settle_concurrently(orders + orders)
+
+        self.assertEqual(errors, [])
+        pool.refresh_from_db()
+        self.assertEqual(pool.version, self.orders_per_pool)
+        self.assertEqual(
+            pool.token1_amount, Decimal("30000.00") + 3 * self.orders_per_pool
+        )
+        self.assertEqual(pool.token2_amount, Decimal("10000.00") - self.orders_per_pool)
+        self.assertFalse(ExchangeOrder.objects.exclude(status="completed").exists())
+
+    def test_concurrent_settlements_on_different_pools(self):
+        orders = [order for pool in self.pools for order in self._create_orders(pool)]
+
+        errors = self._settle_concurrently(orders)
+
+        self.assertEqual(errors, [])
+        for pool in self.pools:
+            pool.refresh_from_db()
+            self.assertEqual(pool.version, self.orders_per_pool)
+            self.assertEqual(
+                pool.token2_amount, Decimal("10000.00") - self.orders_per_pool
+            )
+
+    def test_settlement_is_rejected_when_reserve_runs_out(self):
+        pool = self.pools[0]
+        order = self._create_orders(pool)[0]
+        order.receive_amount = Decimal("20000.00")
+        order.save()
+
+        settled, failed = settle_orders([order])
+        self.assertEqual(settled, 0)
+        self.assertEqual([type(error) for _, error in failed], [SettlementError])
+
+        order.refresh_from_db()
+        pool.refresh_from_db()
+        self.assertEqual(order.status, "pending")
+        self.assertEqual(pool.version, 0)
+
+
+class SettlementWorkerTests(TransactionTestCase):
+    def setUp(self):
+        network = Network.objects.create(name="TON", short_name="TON")
+        self.usdt = Token.objects.create(
+            name="Tether", short_name="USDT", network=network
+        )
+        self.ton = Token.objects.create(
+            name="Toncoin", short_name="TON", network=network
+        )
+        self.pool = Pool.objects.create(
+            name="USDT/TON",
+            token1=self.usdt,
+            token2=self.ton,
+            token1_amount=Decimal("30000.00"),
+            token2_amount=Decimal("10000.00"),
+        )
+
+    def _order(self, give_token, give_amount, receive_token, receive_amount):
+        return ExchangeOrder.objects.create(
+            email="user@example.com",
+            give_token=give_token,
+            give_amount=give_amount,
+            receive_token=receive_token,
+            receive_amount=receive_amount,
+            exchange_rate=receive_amount / give_amount,
+            fee_percentage=self.pool.fee_percentage,
+            pool=self.pool,
+        )
+
+    def test_batch_nets_opposite_flows_into_one_pool_write(self):
+        for _ in range(5):
+            self._order(self.usdt, Decimal("30.00"), self.ton, Decimal("9.00"))
+            self._order(self.ton, Decimal("10.00"), self.usdt, Decimal("29.00"))
+
+        stats = SettlementWorker(batch_size=10, max_latency=60).run_once()
+
+        self.assertEqual((stats.orders, stats.batches, stats.pool_writes), (10, 1, 1))
+        self.pool.refresh_from_db()
+        self.assertEqual(self.pool.version, 1)
+        self.assertEqual(self.pool.token1_amount, Decimal("30005.00"))
+        self.assertEqual(self.pool.token2_amount, Decimal("10005.00"))
+
+    def test_partial_batch_waits_for_max_latency(self):
+        self._order(self.usdt, Decimal("30.00"), self.ton, Decimal("9.00"))
+
+        self.assertEqual(
+            SettlementWorker(batch_size=10, max_latency=60).run_once().orders, 0
+        )
+        self.assertEqual(
+            SettlementWorker(batch_size=10, max_latency=0).run_once().orders, 1
+        )
+
+
+class PoolVersionTests(TestCase):
+    """Правка пула, загруженного до расчета, не перезаписывает его резервы"""
+
+    def setUp(self):
+        network = Network.objects.create(name="TON", short_name="TON")
+        self.usdt = Token.objects.create(
+            name="Tether", short_name="USDT", network=network
+        )
+        self.ton = Token.objects.create(
+            name="Toncoin", short_name="TON", network=network
+        )
+        self.pool = Pool.objects.create(
+            name="USDT/TON",
+            token1=self.usdt,
+            token2=self.ton,
+            token1_amount=Decimal("30000.00"),
+            token2_amount=Decimal("10000.00"),
+        )
+
+    def _settle(self):
+        apply_pool_delta(
+            self.pool.pk,
+            {str(self.usdt.pk): Decimal("30.00"), str(self.ton.pk): Decimal("-9.00")},
+        )
+
+    def _assert_settled_reserves(self):
+        pool = Pool.objects.get()
+        self.assertEqual(pool.version, 1)
+        self.assertEqual(pool.token1_amount, Decimal("30030.00"))
+        self.assertEqual(pool.token2_amount, Decimal("9991.00"))
+
+    def test_stale_instance_is_not_saved(self):
+        pool = Pool.objects.get()
+        self._settle()
+
+        pool.token1_amount = Decimal("1.00")
+        with self.assertRaises(PoolVersionConflict):
+            pool.save()
+
+        self.assertEqual(pool.version, 0)
+        self._assert_settled_reserves()
+
+    def test_stale_admin_form_is_rejected(self):
+        user = get_user_model().objects.create_superuser(
+            email="admin@example.com", username="admin", password="admin"
+        )
+        self.client.force_login(user)
+        url = reverse("admin:exchange_pool_change", args=[self.pool.pk])
+
+        def form_data():
+            form = self.client.get(url).context["adminform"].form
+            data = {name: form[name].value() for name in form.fields}
+            data["token1_amount"] = "1.00"
+            return {key: value for key, value in data.items() if value is not None}
+
+        stale = form_data()
+        self._settle()
+
+        response = self.client.post(url, stale)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["adminform"].form.non_field_errors())
+        self._assert_settled_reserves()
+
+        response = self.client.post(url, form_data())
+        self.assertEqual(response.status_code, 302)
+        pool = Pool.objects.get()
+        self.assertEqual(pool.version, 2)
+        self.assertEqual(pool.token1_amount, Decimal("1.00"))
+
+
+class AdminChangelistQueryTests(TestCase):
+    """Число запросов списка в админке не зависит от числа строк на странице"""
+
+    changelists = (
+        "admin:exchange_network_changelist",
+        "admin:exchange_token_changelist",
+        "admin:exchange_pool_changelist",
+        "admin:exchange_exchangeorder_changelist",
+    )
+
+    def setUp(self):
+        user = get_user_model().objects.create_superuser(
+            email="admin@example.com", username="admin", password="admin"
+        )
+        self.client.force_login(user)
+        self.created = 0
+
+    def _add_rows(self, count):
+        for _ in range(count):
+            i = self.created = self.created + 1
+            network = Network.objects.create(name=f"Network {i}", short_name=f"N{i}")
+            token1 = Token.objects.create(
+                name=f"Token A{i}", short_name=f"A{i}", network=network
+            )
+            token2 = Token.objects.create(
+                name=f"Token B{i}", short_name=f"B{i}", network=network
+            )
+            pool = Pool.objects.create(
+                name=f"A{i}/B{i}",
+                token1=token1,
+                token2=token2,
+                token1_amount=Decimal("1000.00"),
+                token2_amount=Decimal("2000.00"),
+            )
+            ExchangeOrder.objects.create(
+                email=f"user{i}@example.com",
+                give_token=token1,
+                give_amount=Decimal("10.00"),
+                receive_token=token2,
+                receive_amount=Decimal("19.00"),
+                exchange_rate=Decimal("1.90"),
+                fee_percentage=pool.fee_percentage,
+                pool=pool,
+            )
+
+    def _count_queries(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_query_count_does_not_depend_on_page_size(self):
+        self._add_rows(2)
+        small = {name: self._count_queries(reverse(name)) for name in self.changelists}
+
+        self._add_rows(20)
+        for name in self.changelists:
+            with self.subTest(changelist=name):
+                self.assertEqual(self._count_queries(reverse(name)), small[name])
+
+    def _vary_rows(self):
+        """
+        Сеть i получает i лишних токенов и пулов с токеном A{i}, чтобы
+        аннотированные колонки различались между строками
+        """
+        for i in range(1, self.created + 1):
+            base = Token.objects.get(short_name=f"A{i}")
+            for j in range(i):
+                token = Token.objects.create(
+                    name=f"Token C{i}-{j}", short_name=f"C{i}{j}", network=base.network
+                )
+                Pool.objects.create(
+                    name=f"A{i}/C{i}{j}",
+                    token1=base,
+                    token2=token,
+                    token1_amount=Decimal(100 * (i + j)),
+                    token2_amount=Decimal("1.00"),
+                )
+
+    def test_annotated_columns_are_sortable(self):
+        self._add_rows(3)
+        self._vary_rows()
+        # Индексы колонок list_display (0 - чекбокс действий) и аннотации под ними
+        for name, column, attr in (
+            ("admin:exchange_network_changelist", 5, "_tokens_count"),
+            ("admin:exchange_network_changelist", 6, "_pools_count"),
+            ("admin:exchange_token_changelist", 6, "_pools_count"),
+            ("admin:exchange_pool_changelist", 7, "_liquidity"),
+            ("admin:exchange_pool_changelist", 8, "_orders_count"),
+        ):
+            for direction in ("", "-"):
+                with self.subTest(changelist=name, column=column, order=direction):
+                    response = self.client.get(
+                        reverse(name), {"o": f"{direction}{column}"}
+                    )
+                    values = [
+                        getattr(obj, attr) for obj in response.context["cl"].result_list
+                    ]
+                    self.assertGreater(len(set(values)), 1)
+                    self.assertEqual(values, sorted(values, reverse=direction == "-"))
+
+
+class AdminOrderActionTests(TestCase):
+    """mark_as_completed завершает заявки пачками: один CAS и снимок на пул"""
+
+    def setUp(self):
+        user = get_user_model().objects.create_superuser(
+            email="admin@example.com", username="admin", password="admin"
+        )
+        self.client.force_login(user)
+        network = Network.objects.create(name="TON", short_name="TON")
+        self.ton = Token.objects.create(
+            name="Toncoin", short_name="TON", network=network
+        )
+        self.pools = [
+            Pool.objects.create(
+                name=f"T{i}/TON",
+                token1=Token.objects.create(
+                    name=f"Token {i}", short_name=f"T{i}", network=network
+                ),
+                token2=self.ton,
+                token1_amount=Decimal("30000.00"),
+                token2_amount=Decimal("10000.00"),
+            )
+            for i in range(2)
+        ]
+
+    def _orders(self, per_pool, receive_amount=Decimal("1.00")):
+        return [
+            ExchangeOrder.objects.create(
+                email="user@example.com",
+                give_token=pool.token1,
+                give_amount=Decimal("3.00"),
+                receive_token=self.ton,
+                receive_amount=receive_amount,
+                exchange_rate=Decimal("0.33"),
+                fee_percentage=pool.fee_percentage,
+                pool=pool,
+            )
+            for pool in self.pools
+            for _ in range(per_pool)
+        ]
+
+    def _complete(self, orders):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse("admin:exchange_exchangeorder_changelist"),
+                {
+                    "action": "mark_as_completed",
+                    "_selected_action": [str(order.pk) for order in orders],
+                },
+            )
+        self.assertEqual(response.status_code, 302)
+        return len(queries)
+
+    def test_query_count_does_not_depend_on_order_count(self):
+        snapshots = PoolSnapshot.objects.count()
+        small = self._complete(self._orders(2))
+        large = self._complete(self._orders(50))
+
+        self.assertEqual(large, small)
+        self.assertEqual(ExchangeOrder.objects.filter(status="completed").count(), 104)
+        for pool in self.pools:
+            pool.refresh_from_db()
+            self.assertEqual(pool.version, 2)
+            self.assertEqual(pool.token1_amount, Decimal("30000.00") + 52 * 3)
+            self.assertEqual(pool.token2_amount, Decimal("10000.00") - 52)
+        # По снимку на пул за каждый вызов действия
+        self.assertEqual(PoolSnapshot.objects.count(), snapshots + 4)
+
+    def test_pool_without_reserve_falls_back_to_one_by_one(self):
+        orders = self._orders(3, receive_amount=Decimal("4000.00"))
+        self._complete(orders)
+
+        # Три заявки не помещаются в резерв пула вместе, две - помещаются
+        for pool in self.pools:
+            pool.refresh_from_db()
+            self.assertEqual(pool.version, 2)
+            self.assertEqual(pool.token2_amount, Decimal("2000.00"))
+        self.assertEqual(ExchangeOrder.objects.filter(status="completed").count(), 4)
+        self.assertEqual(ExchangeOrder.objects.filter(status="pending").count(), 2)
+
+    def _messages(self, action, orders):
+        response = self.client.post(
+            reverse("admin:exchange_exchangeorder_changelist"),
+            {
+                "action": action,
+                "_selected_action": [str(order.pk) for order in orders],
+            },
+            follow=True,
+        )
+        self.assertEqual(response.status_code, 200)
+        return [(m.level, m.message) for m in response.context["messages"]]
+
+    def test_transition_conflict_is_reported_not_raised(self):
+        orders = self._orders(1)
+        conflict = TransitionConflict("Expected 2 pending orders to change, got 3")
+        with mock.patch("exchange.admin.transition_orders", side_effect=conflict):
+            messages = self._messages("mark_as_processing", orders)
+
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0][0], constants.ERROR)
+        self.assertFalse(ExchangeOrder.objects.exclude(status="pending").exists())
+
+    def test_settlement_conflict_is_reported_per_order(self):
+        orders = self._orders(1)
+        conflict = TransitionConflict("Expected 1 pending orders to change, got 0")
+        with mock.patch(
+            "exchange.services.settlement.transition_locked_orders",
+            side_effect=conflict,
+        ):
+            messages = self._messages("mark_as_completed", orders)
+
+        self.assertEqual(messages[0], (constants.INFO, "0 orders marked as completed."))
+        self.assertEqual([level for level, _ in messages[1:]], [constants.WARNING] * 2)
+        self.assertFalse(ExchangeOrder.objects.exclude(status="pending").exists())
+
+
+class HomepageFragmentCacheTests(TestCase):
+    """Список токенов на главной рендерится из кеша до смены каталога"""
+
+    def setUp(self):
+        cache.clear()
+        self.network = Network.objects.create(name="Tron", short_name="TRC20")
+        Token.objects.create(name="Tether", short_name="USDT", network=self.network)
+
+    def _get_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("core:index"))
+        self.assertEqual(response.status_code, 200)
+        token_table = Token._meta.db_table
+        return response, [q for q in queries if token_table in q["sql"]]
+
+    def test_tests_do_not_touch_cache_on_disk(self):
+        # cache.clear() в setUp не должен стирать кеш работающего приложения
+        self.assertIsInstance(caches["shared"], LocMemCache)
+
+    def test_token_selector_is_served_from_cache(self):
+        response, token_queries = self._get_index()
+        self.assertContains(response, "Tether TRC20")
+        self.assertTrue(token_queries)
+
+        response, token_queries = self._get_index()
+        self.assertContains(response, "Tether TRC20")
+        self.assertEqual(token_queries, [])
+
+    def test_catalog_change_invalidates_fragments(self):
+        self._get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            Token.objects.create(name="Toncoin", short_name="TON", network=self.network)
+
+        response, token_queries = self._get_index()
+        self.assertContains(response, "Toncoin TRC20")
+        self.assertTrue(token_queries)
+
+    def test_per_request_parts_are_not_cached(self):
+        self._get_index()
+        user = get_user_model().objects.create_user(
+            email="user@example.com", username="chicken", password="secret"
+        )
+        self.client.force_login(user)
+
+        response, _ = self._get_index()
+        self.assertContains(response, "chicken")
+        self.assertNotEqual(
+            response.context["captcha"]["token"],
+            self._get_index()[0].context["captcha"]["token"],
+        )
+
+
+class QuoteAmountValidationTests(TestCase):
+    """Некорректная сумма - ошибка своей строки, а не всего пакета"""
+
+    def setUp(self):
+        network = Network.objects.create(name="TON", short_name="TON")
+        self.usdt = Token.objects.create(
+            name="Tether", short_name="USDT", network=network
+        )
+        self.ton = Token.objects.create(
+            name="Toncoin", short_name="TON", network=network
+        )
+        Pool.objects.create(
+            name="USDT/TON",
+            token1=self.usdt,
+            token2=self.ton,
+            token1_amount=Decimal("30000.00"),
+            token2_amount=Decimal("10000.00"),
+        )
+        pool_registry.invalidate()
+        self.addCleanup(pool_registry.invalidate)
+
+    def _row(self, amount):
+        return {
+            "give_token_id": str(self.usdt.pk),
+            "receive_token_id": str(self.ton.pk),
+            "amount": amount,
+        }
+
+    def test_non_finite_and_huge_amounts_fail_only_their_row(self):
+        for amount in ("NaN", "Infinity", "-Infinity", "1e999999", "1e13"):
+            with self.subTest(amount=amount):
+                response = self.client.post(
+                    reverse("exchange:calculate_exchange_batch_api"),
+                    {"quotes": [self._row("100"), self._row(amount)]},
+                    content_type="application/json",
+                )
+                data = response.json()
+                self.assertTrue(data["success"])
+                valid, invalid = data["results"]
+                self.assertTrue(valid["success"])
+                self.assertFalse(invalid["success"])
+                self.assertIn("сумма", invalid["error"])
+
+    def test_single_quote_rejects_non_finite_amount(self):
+        for amount in ("NaN", "Infinity", "1e999999"):
+            with self.subTest(amount=amount):
+                response = self.client.post(
+                    reverse("exchange:calculate_exchange_api"),
+                    self._row(amount),
+                    content_type="application/json",
+                )
+                data = response.json()
+                self.assertFalse(data["success"])
+                self.assertIn("сумма", data["error"])
+
+
+class PoolDepthApiTests(TestCase):
+    """Направление кривых глубины выбирается по токену, а не по тикеру"""
+
+    def setUp(self):
+        tron = Network.objects.create(name="Tron", short_name="TRC20")
+        ton = Network.objects.create(name="TON", short_name="TON")
+        self.usdt_tron = Token.objects.create(
+            name="Tether", short_name="USDT", network=tron
+        )
+        self.usdt_ton = Token.objects.create(
+            name="Tether", short_name="USDT", network=ton
+        )
+        Pool.objects.create(
+            name="USDT/USDT",
+            token1=self.usdt_tron,
+            token2=self.usdt_ton,
+            token1_amount=Decimal("30000.00"),
+            token2_amount=Decimal("10000.00"),
+        )
+        pool_registry.invalidate()
+        self.addCleanup(pool_registry.invalidate)
+
+    def test_curves_start_with_give_token_when_tickers_match(self):
+        for give, receive in (
+            (self.usdt_tron, self.usdt_ton),
+            (self.usdt_ton, self.usdt_tron),
+        ):
+            with self.subTest(give=give.network.short_name):
+                response = self.client.get(
+                    reverse("exchange:pool_depth_api"),
+                    {"give_token_id": give.pk, "receive_token_id": receive.pk},
+                )
+                curves = response.json()["curves"]
+                self.assertEqual(
+                    [curve["input_token_id"] for curve in curves],
+                    [str(give.pk), str(receive.pk)],
+                )
+
+
+class PoolRegistryAsyncTests(TestCase):
+    """Async-код не строит снимок реестра синхронным ORM"""
+
+    def setUp(self):
+        network = Network.objects.create(name="TON", short_name="TON")
+        self.usdt = Token.objects.create(
+            name="Tether", short_name="USDT", network=network
+        )
+        self.ton = Token.objects.create(
+            name="Toncoin", short_name="TON", network=network
+        )
+        Pool.objects.create(
+            name="USDT/TON",
+            token1=self.usdt,
+            token2=self.ton,
+            token1_amount=Decimal("30000.00"),
+            token2_amount=Decimal("10000.00"),
+        )
+        pool_registry.invalidate()
+        self.addCleanup(pool_registry.invalidate)
+
+    def test_invalidated_snapshot_stays_usable_in_event_loop(self):
+        loaded = pool_registry.snapshot()
+        pool_registry.invalidate()
+
+        async def read():
+            return pool_registry.snapshot()
+
+        self.assertEqual(async_to_sync(read)().tokens, loaded.tokens)
+        self.assertIsNot(pool_registry.snapshot(), loaded)
+
+    def test_unloaded_registry_raises_clear_error_in_event_loop(self):
+        registry = type(pool_registry)()
+
+        async def read():
+            return registry.snapshot()
+
+        with self.assertRaisesMessage(RuntimeError, "asnapshot"):
+            async_to_sync(read)()
+
+    def test_async_quote_after_invalidate(self):
+        pool_registry.snapshot()
+        pool_registry.invalidate()
+
+        response = self.client.post(
+            reverse("exchange:calculate_exchange_api"),
+            {
+                "give_token_id": str(self.usdt.pk),
+                "receive_token_id": str(self.ton.pk),
+                "amount": "100",
+            },
+            content_type="application/json",
+        )
+        self.assertTrue(response.json()["success"])
+
+
+class PoolStreamTests(TestCase):
+    """SSE отдается только под ASGI; под WSGI поток не открывается"""
+
+    def setUp(self):
+        network = Network.objects.create(name="TON", short_name="TON")
+        self.usdt = Token.objects.create(
+            name="Tether", short_name="USDT", network=network
+        )
+        self.ton = Token.objects.create(
+            name="Toncoin", short_name="TON", network=network
+        )
+        self.url = reverse("exchange:pool_stream")
+        self.pairs = {"pairs": f"{self.usdt.pk}:{self.ton.pk}"}
+        pool_registry.invalidate()
+        self.addCleanup(pool_registry.invalidate)
+
+    def test_wsgi_request_gets_no_content(self):
+        response = self.client.get(self.url, self.pairs)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(response.streaming)
+
+        response = self.client.get(reverse("core:index"))
+        self.assertNotContains(response, "data-pool-stream")
+
+    async def test_asgi_request_streams_pool_state(self):
+        response = await self.async_client.get(self.url, self.pairs)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+
+        events = aiter(response.streaming_content)
+        first = await anext(events)
+        await events.aclose()
+        self.assertTrue(first.startswith(b"event: pool\n"))
+
+        response = await self.async_client.get(reverse("core:index"))
+        self.assertContains(response, f'data-pool-stream="{self.url}"')
+
+
+class TokenNetworkStatsTests(TestCase):
+    """Смена сети токена сдвигает NetworkStats без пересчета по всем пулам"""
+
+    def setUp(self):
+        self.networks = {
+            name: Network.objects.create(name=name, short_name=name)
+            for name in ("A", "B", "C")
+        }
+        self.tokens = {
+            name: Token.objects.create(
+                name=name, short_name=name, network=self.networks[name[0]]
+            )
+            for name in ("A1", "A2", "B1")
+        }
+        for first, second in (("A1", "A2"), ("A1", "B1"), ("A2", "B1")):
+            Pool.objects.create(
+                name=f"{first}/{second}",
+                token1=self.tokens[first],
+                token2=self.tokens[second],
+                token1_amount=Decimal("1.00"),
+                token2_amount=Decimal("1.00"),
+            )
+
+    def _network_stats(self):
+        return {
+            name: NetworkStats.objects.get(network=network).pools_count
+            for name, network in self.networks.items()
+        }
+
+    def test_network_change_matches_full_rebuild(self):
+        token = Token.objects.get(pk=self.tokens["A1"].pk)
+        for network in ("C", "B", "A"):
+            with self.subTest(network=network):
+                token.network = self.networks[network]
+                token.save()
+                incremental = self._network_stats()
+                rebuild_stats()
+                self.assertEqual(self._network_stats(), incremental)
+
+        self.assertEqual(incremental, {"A": 3, "B": 2, "C": 0})
+
+    def test_update_without_network_change_does_not_read_pools(self):
+        token = Token.objects.get(pk=self.tokens["A1"].pk)
+        token.is_active = False
+        with CaptureQueriesContext(connection) as queries:
+            token.save()
+
+        pool_table = Pool._meta.db_table
+        self.assertFalse([q for q in queries if pool_table in q["sql"]])
+        self.assertEqual(self._network_stats(), {"A": 3, "B": 2, "C": 0})
+
+
+class StatsAtomicityTests(TestCase):
+    """Счетчики меняются в одной транзакции с записью и откатываются вместе с ней"""
+
+    def setUp(self):
+        network = Network.objects.create(name="TON", short_name="TON")
+        self.usdt = Token.objects.create(
+            name="Tether", short_name="USDT", network=network
+        )
+        self.ton = Token.objects.create(
+            name="Toncoin", short_name="TON", network=network
+        )
+        self.pool = Pool.objects.create(
+            name="USDT/TON",
+            token1=self.usdt,
+            token2=self.ton,
+            token1_amount=Decimal("30000.00"),
+            token2_amount=Decimal("10000.00"),
+        )
+
+    def _fail_after_save(self, sender):
+        def fail(**kwargs):
+            raise RuntimeError("write failed after the counters were updated")
+
+        post_save.connect(fail, sender=sender, weak=False)
+        self.addCleanup(post_save.disconnect, fail, sender=sender)
+
+    def _stats(self):
+        return PoolStats.objects.values().get(pool=self.pool)
+
+    def test_failed_order_save_leaves_counters_unchanged(self):
+        order = ExchangeOrder.objects.create(
+            email="user@example.com",
+            give_token=self.usdt,
+            give_amount=Decimal("3.00"),
+            receive_token=self.ton,
+            receive_amount=Decimal("1.00"),
+            exchange_rate=Decimal("0.33"),
+            fee_percentage=self.pool.fee_percentage,
+            pool=self.pool,
+        )
+        before = self._stats()
+        self._fail_after_save(ExchangeOrder)
+
+        order.status = "completed"
+        with self.assertRaises(RuntimeError):
+            order.save()
+        with self.assertRaises(RuntimeError):
+            ExchangeOrder.objects.create(
+                email="user@example.com",
+                give_token=self.usdt,
+                give_amount=Decimal("5.00"),
+                receive_token=self.ton,
+                receive_amount=Decimal("1.00"),
+                exchange_rate=Decimal("0.20"),
+                fee_percentage=self.pool.fee_percentage,
+                pool=self.pool,
+            )
+
+        self.assertEqual(self._stats(), before)
+        self.assertEqual(ExchangeOrder.objects.get().status, "pending")
+
+    def test_failed_pool_save_leaves_counters_unchanged(self):
+        notcoin = Token.objects.create(
+            name="Notcoin", short_name="NOT", network=self.usdt.network
+        )
+        self._fail_after_save(Pool)
+        with self.assertRaises(RuntimeError):
+            Pool.objects.create(
+                name="USDT/NOT",
+                token1=self.usdt,
+                token2=notcoin,
+                token1_amount=Decimal("1.00"),
+                token2_amount=Decimal("1.00"),
+            )
+
+        self.assertEqual(TokenStats.objects.get(token=self.usdt).pools_count, 1)
+        self.assertEqual(Pool.objects.count(), 1)
+
+
+class ExportJobDownloadTests(TestCase):
+    """Файл выгрузки не лежит в MEDIA_ROOT и скачивается только через админку"""
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        patcher = mock.patch.object(
+            ExportJob._meta.get_field("file"),
+            "storage",
+            ExportStorage(location=self.root),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        network = Network.objects.create(name="TON", short_name="TON")
+        usdt = Token.objects.create(name="Tether", short_name="USDT", network=network)
+        ton = Token.objects.create(name="Toncoin", short_name="TON", network=network)
+        pool = Pool.objects.create(
+            name="USDT/TON",
+            token1=usdt,
+            token2=ton,
+            token1_amount=Decimal("30000.00"),
+            token2_amount=Decimal("10000.00"),
+        )
+        ExchangeOrder.objects.create(
+            email="user@example.com",
+            give_token=usdt,
+            give_amount=Decimal("3.00"),
+            receive_token=ton,
+            receive_amount=Decimal("1.00"),
+            exchange_rate=Decimal("0.33"),
+            fee_percentage=pool.fee_percentage,
+            pool=pool,
+        )
+
+        today = timezone.localdate()
+        ExportJob.objects.create(date_from=today, date_to=today)
+        self.job = run_job(claim_job())
+        self.url = reverse("admin:exchange_exportjob_download", args=[self.job.pk])
+
+    def _login_staff(self, *permissions):
+        user = get_user_model().objects.create_user(
+            email="staff@example.com",
+            username="staff",
+            password="staff",
+            is_staff=True,
+        )
+        user.user_permissions.set(Permission.objects.filter(codename__in=permissions))
+        self.client.force_login(user)
+
+    def test_file_is_outside_media_root(self):
+        path = os.path.realpath(self.job.file.path)
+        self.assertTrue(path.startswith(os.path.realpath(self.root)))
+        self.assertFalse(path.startswith(os.path.realpath(settings.MEDIA_ROOT)))
+        with self.assertRaises(ValueError):
+            self.job.file.url
+
+    def test_anonymous_user_is_redirected_to_login(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse("admin:login"), response["Location"])
+
+    def test_staff_without_view_permission_cannot_download(self):
+        self._login_staff("view_exchangeorder")
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_staff_with_view_permission_downloads_file(self):
+        self._login_staff("view_exportjob")
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/gzip")
+
+        text = gzip.decompress(b"".join(response.streaming_content)).decode()
+        self.assertTrue(text.startswith(csv_header()))
+        self.assertEqual(len(text.splitlines()), 2)
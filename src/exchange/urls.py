@@ -1,12 +1,24 @@
 from django.urls import path
 from exchange.views import (
     calculate_exchange_api,
+    calculate_exchange_batch_api,
     OrderSuccessView,
+    pool_candles_api,
+    pool_depth_api,
+    pool_stream,
 )
 
 app_name: str = "exchange"
 
 urlpatterns = [
     path("calculate-exchange/", calculate_exchange_api, name="calculate_exchange_api"),
+    path(
+        "calculate-exchange/batch/",
+        calculate_exchange_batch_api,
+        name="calculate_exchange_batch_api",
+    ),
+    path("pool-depth/", pool_depth_api, name="pool_depth_api"),
+    path("pool-candles/", pool_candles_api, name="pool_candles_api"),
+    path("pool-stream/", pool_stream, name="pool_stream"),
     path("order-success/", OrderSuccessView.as_view(), name="order_success"),
 ]
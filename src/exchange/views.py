@@ -1,11 +1,22 @@
 import json
-from decimal import Decimal
+from http import HTTPStatus
 from common.mixins import TitleMixin
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.generic import TemplateView
-from exchange.models import Token, ExchangeOrder, Pool
-from django.db import models
-from .models import Token, Pool
+from django.conf import settings
+from exchange.models import Pool, PoolCandle
+from exchange.services.archive import find_order
+from exchange.services.depth import pool_depth
+from exchange.services.history import get_candles
+from exchange.services.quotes import (
+    QuoteError,
+    parse_amount,
+    quote_batch,
+    quote_pair,
+    resolve_tokens,
+)
+from exchange.services.registry import pool_registry
+from exchange.services.stream import pool_publisher, streaming_supported
 
 
 class OrderSuccessView(TitleMixin, TemplateView):
@@ -17,16 +28,12 @@ class OrderSuccessView(TitleMixin, TemplateView):
 
         order_id = self.request.session.get("order_id")
         if order_id:
-            try:
-                order = ExchangeOrder.objects.get(id=order_id)
-                context["order"] = order
-            except ExchangeOrder.DoesNotExist:
-                pass
+            context["order"] = find_order(order_id)
 
         return context
 
 
-def calculate_exchange_api(request):
+async def calculate_exchange_api(request):
     if request.method != "POST":
         return JsonResponse({"success": False, "error": "Method not allowed"})
 
@@ -34,7 +41,6 @@ def calculate_exchange_api(request):
         data = json.loads(request.body)
         give_token_id = data.get("give_token_id")
         receive_token_id = data.get("receive_token_id")
-        amount = data.get("amount", 0)
 
         if not give_token_id or not receive_token_id:
             return JsonResponse({"success": False, "error": "Токены не выбраны"})
@@ -42,45 +48,186 @@ def calculate_exchange_api(request):
         if give_token_id == receive_token_id:
             return JsonResponse({"success": False, "error": "Выберите разные токены"})
 
-        if not amount or float(amount) <= 0:
+        amount = parse_amount(data.get("amount", 0))
+        if amount <= 0:
             return JsonResponse(
                 {"success": True, "output_amount": "0", "effective_rate": "0"}
             )
 
-        amount = Decimal(str(amount))
+        snapshot = await pool_registry.asnapshot()
+        give_token, receive_token = resolve_tokens(
+            give_token_id, receive_token_id, snapshot
+        )
 
-        give_token = Token.objects.get(id=give_token_id, is_active=True)
-        receive_token = Token.objects.get(id=receive_token_id, is_active=True)
+        return JsonResponse(
+            {"success": True, **quote_pair(give_token, receive_token, amount)}
+        )
 
-        pool = Pool.objects.filter(
-            models.Q(token1=give_token, token2=receive_token)
-            | models.Q(token1=receive_token, token2=give_token),
-            is_active=True,
-        ).first()
+    except QuoteError as e:
+        return JsonResponse({"success": False, "error": str(e)})
+    except Exception as e:
+        return JsonResponse({"success": False, "error": f"Ошибка: {str(e)}"})
+
+
+def calculate_exchange_batch_api(request):
+    if request.method != "POST":
+        return JsonResponse({"success": False, "error": "Method not allowed"})
 
-        if not pool:
+    try:
+        data = json.loads(request.body)
+        rows = data.get("quotes")
+
+        if not isinstance(rows, list) or not rows:
+            return JsonResponse({"success": False, "error": "Список котировок пуст"})
+
+        if len(rows) > settings.EXCHANGE_BATCH_QUOTE_LIMIT:
             return JsonResponse(
                 {
                     "success": False,
-                    "error": f"Пул {give_token.short_name}/{receive_token.short_name} не найден",
+                    "error": f"Не больше {settings.EXCHANGE_BATCH_QUOTE_LIMIT} котировок за запрос",
                 }
             )
 
-        output_amount = pool.get_output_amount(give_token, amount)
-        effective_rate = output_amount / amount if amount > 0 else Decimal("0")
+        if not all(isinstance(row, dict) for row in rows):
+            return JsonResponse(
+                {"success": False, "error": "Некорректный формат котировки"}
+            )
+
+        return JsonResponse({"success": True, "results": quote_batch(rows)})
+
+    except Exception as e:
+        return JsonResponse({"success": False, "error": f"Ошибка: {str(e)}"})
+
+
+def pool_depth_api(request):
+    if request.method != "GET":
+        return JsonResponse({"success": False, "error": "Method not allowed"})
+
+    try:
+        give_token, receive_token = resolve_tokens(
+            request.GET.get("give_token_id"), request.GET.get("receive_token_id")
+        )
+
+        pool = pool_registry.get_pool(give_token, receive_token)
+        if pool is None:
+            raise QuoteError(
+                f"Пул {give_token.short_name}/{receive_token.short_name} не найден"
+            )
+
+        max_points = settings.EXCHANGE_DEPTH_MAX_POINTS
+        amounts = request.GET.get("amounts")
+        if amounts:
+            amounts = [float(amount) for amount in amounts.split(",")][:max_points]
+        else:
+            amounts = None
+        points = min(int(request.GET.get("points", 20)), max_points)
+
+        # Кривые идут в порядке token1, token2; short_name у токенов разных
+        # сетей может совпадать, поэтому сравниваются pk
+        curves = pool_depth(pool, amounts, points)
+        if pool.token1_id != give_token.pk:
+            curves.reverse()
 
         return JsonResponse(
             {
                 "success": True,
-                "output_amount": str(output_amount),
-                "effective_rate": str(effective_rate),
+                "fee_percentage": str(pool.fee_percentage),
+                "curves": curves,
+            }
+        )
+
+    except QuoteError as e:
+        return JsonResponse({"success": False, "error": str(e)})
+    except Exception as e:
+        return JsonResponse({"success": False, "error": f"Ошибка: {str(e)}"})
+
+
+def pool_candles_api(request):
+    if request.method != "GET":
+        return JsonResponse({"success": False, "error": "Method not allowed"})
+
+    try:
+        give_token, receive_token = resolve_tokens(
+            request.GET.get("give_token_id"), request.GET.get("receive_token_id")
+        )
+
+        pool = pool_registry.get_pool(give_token, receive_token)
+        if pool is None:
+            raise QuoteError(
+                f"Пул {give_token.short_name}/{receive_token.short_name} не найден"
+            )
+
+        interval = request.GET.get("interval", "1h")
+        if interval not in dict(PoolCandle.INTERVAL_CHOICES):
+            raise QuoteError(f"Неизвестный интервал {interval}")
+
+        limit = min(
+            int(request.GET.get("limit", 200)), settings.EXCHANGE_CANDLES_MAX_LIMIT
+        )
+
+        # Свечи хранятся как курс token2 за 1 token1
+        candles = get_candles(
+            pool, interval, limit, invert=give_token.pk == pool.token2_id
+        )
+
+        return JsonResponse(
+            {
+                "success": True,
+                "interval": interval,
                 "give_token_name": give_token.short_name,
                 "receive_token_name": receive_token.short_name,
-                "fee_percentage": str(pool.fee_percentage),
+                "candles": [
+                    {
+                        "time": candle["bucket_start"].isoformat(),
+                        "open": str(candle["open"]),
+                        "high": str(candle["high"]),
+                        "low": str(candle["low"]),
+                        "close": str(candle["close"]),
+                        "snapshots": candle["snapshots_count"],
+                    }
+                    for candle in candles
+                ],
             }
         )
 
-    except Token.DoesNotExist:
-        return JsonResponse({"success": False, "error": "Токен не найден"})
+    except QuoteError as e:
+        return JsonResponse({"success": False, "error": str(e)})
     except Exception as e:
         return JsonResponse({"success": False, "error": f"Ошибка: {str(e)}"})
+
+
+async def pool_stream(request):
+    if request.method != "GET":
+        return JsonResponse({"success": False, "error": "Method not allowed"})
+
+    if not streaming_supported(request):
+        # 204 - EventSource закрывается и не переподключается
+        return HttpResponse(status=HTTPStatus.NO_CONTENT)
+
+    pair_keys = []
+    for pair in filter(None, request.GET.get("pairs", "").split(",")):
+        token_ids = pair.split(":")
+        if len(token_ids) != 2 or token_ids[0] == token_ids[1]:
+            return JsonResponse(
+                {"success": False, "error": f"Некорректная пара {pair}"}
+            )
+        pair_keys.append(Pool.build_pair_key(*token_ids))
+
+    if not pair_keys:
+        return JsonResponse({"success": False, "error": "Пары не выбраны"})
+
+    if len(pair_keys) > settings.EXCHANGE_STREAM_MAX_PAIRS:
+        return JsonResponse(
+            {
+                "success": False,
+                "error": f"Не больше {settings.EXCHANGE_STREAM_MAX_PAIRS} пар на подписку",
+            }
+        )
+
+    response = StreamingHttpResponse(
+        pool_publisher.events(list(dict.fromkeys(pair_keys))),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -24,11 +24,13 @@ function reloadCaptcha(event) {
             const img2 = document.querySelector('.captcha2') || document.querySelectorAll('img[class*="captcha"]')[1];
             const operation = document.querySelector('.captcha_sym') || document.querySelector('[class*="captcha_sym"]');
             const input = document.getElementById('captcha-input') || document.querySelector('input[name="number"]');
+            const token = document.getElementById('captcha-token') || document.querySelector('input[name="captcha_token"]');
 
             if (img1) img1.src = data.img1;
             if (img2) img2.src = data.img2;
             if (operation) operation.textContent = data.operation;
             if (input) input.value = '';
+            if (token) token.value = data.token;
 
             reloadBtn.innerHTML = originalText;
             reloadBtn.style.animation = '';
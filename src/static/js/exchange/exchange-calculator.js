@@ -1,6 +1,53 @@
 jQuery(function($) {
     let exchangeTimeout;
     let lastCalculationData = {};
+    let poolStream = null;
+    let streamPairKey = null;
+    const poolStates = {};
+    // Сервер отдает адрес потока только под ASGI; иначе котировки через API
+    const poolStreamUrl = $('form.ajax_post_bids').data('pool-stream');
+
+    function pairKey(tokenA, tokenB) {
+        return [tokenA, tokenB].sort().join(':');
+    }
+
+    function subscribeToPair(giveTokenId, receiveTokenId) {
+        if (!poolStreamUrl || !window.EventSource || !giveTokenId || !receiveTokenId || giveTokenId === receiveTokenId) return;
+
+        const key = pairKey(giveTokenId, receiveTokenId);
+        if (key === streamPairKey) return;
+
+        if (poolStream) poolStream.close();
+        streamPairKey = key;
+        poolStream = new EventSource(`${poolStreamUrl}?pairs=${giveTokenId}:${receiveTokenId}`);
+        poolStream.addEventListener('pool', function(event) {
+            const state = JSON.parse(event.data);
+            poolStates[state.pair_key] = state;
+            calculateExchange();
+        });
+    }
+
+    function quoteLocally(state, giveTokenId, amount) {
+        const giveIsToken1 = state.token1 === giveTokenId;
+        const inputReserve = parseFloat(giveIsToken1 ? state.token1_amount : state.token2_amount);
+        const outputReserve = parseFloat(giveIsToken1 ? state.token2_amount : state.token1_amount);
+        const outputDecimals = giveIsToken1 ? state.token2_decimals : state.token1_decimals;
+
+        if (inputReserve <= 0 || outputReserve <= 0) return 0;
+
+        const feeMultiplier = 100 - parseFloat(state.fee_percentage);
+        const output = (amount * feeMultiplier * outputReserve) / (inputReserve * 100 + amount * feeMultiplier);
+        const scale = Math.pow(10, outputDecimals);
+        return Math.floor(output * scale) / scale;
+    }
+
+    function renderQuote(outputField, courseField, outputAmount, effectiveRate, giveName, receiveName) {
+        outputField.val(parseFloat(outputAmount).toFixed(6));
+        courseField.text(`1 ${giveName} = ${parseFloat(effectiveRate).toFixed(6)} ${receiveName}`);
+
+        outputField.addClass('exchange-updated');
+        setTimeout(() => outputField.removeClass('exchange-updated'), 300);
+    }
 
     function calculateExchangeDelayed() {
         clearTimeout(exchangeTimeout);
@@ -12,7 +59,10 @@ jQuery(function($) {
         const receiveTokenId = $('#select_get').val();
         const amount = parseFloat($('input[name="sum1"]').val()) || 0;
 
-        const currentData = { giveTokenId, receiveTokenId, amount };
+        subscribeToPair(giveTokenId, receiveTokenId);
+        const poolState = poolStates[pairKey(giveTokenId, receiveTokenId)];
+
+        const currentData = { giveTokenId, receiveTokenId, amount, version: poolState && poolState.version };
 
         if (JSON.stringify(currentData) === JSON.stringify(lastCalculationData)) return;
         lastCalculationData = currentData;
@@ -38,6 +88,19 @@ jQuery(function($) {
             return;
         }
 
+        if (poolState && poolState.active) {
+            const outputAmount = quoteLocally(poolState, giveTokenId, amount);
+            renderQuote(
+                outputField,
+                courseField,
+                outputAmount,
+                outputAmount / amount,
+                $('#select_give option:selected').data('short-name'),
+                $('#select_get option:selected').data('short-name')
+            );
+            return;
+        }
+
         courseField.text('Расчет...');
 
         $.ajax({
@@ -54,14 +117,14 @@ jQuery(function($) {
             }),
             success: function(data) {
                 if (data.success) {
-                    const formattedAmount = parseFloat(data.output_amount).toFixed(6);
-                    const effectiveRate = parseFloat(data.effective_rate).toFixed(6);
-
-                    outputField.val(formattedAmount);
-                    courseField.text(`1 ${data.give_token_name} = ${effectiveRate} ${data.receive_token_name}`);
-
-                    outputField.addClass('exchange-updated');
-                    setTimeout(() => outputField.removeClass('exchange-updated'), 300);
+                    renderQuote(
+                        outputField,
+                        courseField,
+                        data.output_amount,
+                        data.effective_rate,
+                        data.give_token_name,
+                        data.receive_token_name
+                    );
                 } else {
                     outputField.val('0');
                     courseField.text(data.error);